@@ -1,88 +1,109 @@
-import os
-import json
-import asyncio
-from redis.asyncio import Redis
 from dotenv import load_dotenv
-from anthropic import AsyncAnthropic
+from extension_runtime import Cacheable, decode_inputs, llm, run
+from extension_runtime.progress import current_progress
 
 load_dotenv()
 
-WORKFLOW_INSTANCE_ID = os.getenv('WORKFLOW_INSTANCE_ID')
-WORKFLOW_EXTENSION_ID = os.getenv('WORKFLOW_EXTENSION_ID')
-REDIS_HOST_URL = os.getenv('REDIS_HOST_URL')
-REDIS_USERNAME = os.getenv('REDIS_USERNAME')
-REDIS_PASSWORD = os.getenv('REDIS_PASSWORD')
-REDIS_CHANNEL_IN = os.getenv('REDIS_CHANNEL_IN')
-REDIS_CHANNEL_OUT = os.getenv('REDIS_CHANNEL_OUT')
-REDIS_CHANNEL_READY = os.getenv('REDIS_CHANNEL_READY')
+MODEL = "claude-3-5-sonnet-20240620"
+
+def with_context(prompt, context):
+    # A shared context goes ahead of the prompt, so it is part of the cached prefix
+    return [{"type": "text", "text": context}, {"type": "text", "text": prompt}] if context else prompt
+
+async def process_bulk(prompts, inputs, options, reuse):
+    if inputs.get('useBatchAPI', False):
+        # Half the price, for jobs that can wait for the batch to be processed
+        completions = await llm.complete_batch(MODEL, [with_context(prompt, inputs.get('context')) for prompt in prompts], **options)
+    else:
+        contents = [with_context(prompt, inputs.get('context')) for prompt in prompts]
+        concurrency = int(inputs.get('concurrency', 8))
+        completions = []
+        if options['cache'] and len(contents) > 1:
+            # The first prompt writes the cached prefix, so the others can read it instead of all writing it
+            completions = await llm.complete_many(MODEL, contents[:1], concurrency=1, response_cache=reuse, **options)
+            contents = contents[1:]
+        completions += await llm.complete_many(MODEL, contents, concurrency=concurrency, response_cache=reuse, **options)
+
+    results = []
+    for prompt, completion in zip(prompts, completions):
+        if isinstance(completion, Exception):
+            results.append({"prompt": prompt, "error": str(completion)})
+        else:
+            results.append({
+                "prompt": prompt,
+                "claudeResponse": completion.text,
+                "latency_ms": round(completion.latency * 1000),
+                "cache_read_tokens": completion.cache_read_tokens,
+                "cache_write_tokens": completion.cache_write_tokens,
+                "cache_hit": completion.cached
+            })
+    failed = sum(1 for result in results if 'error' in result)
+    return {
+        "results": results,
+        "total": len(results),
+        "succeeded": len(results) - failed,
+        "failed": failed,
+        "system_prompt": options['system'],
+        "model": MODEL,
+        "response_cache": llm.responses.stats() if llm.responses else None
+    }
 
 async def process_message(message):
-    data = json.loads(message)
-    inputs = data.get('inputs', {})
+    inputs = decode_inputs(message)
     prompt = inputs.get('prompt')
+    prompts = inputs.get('prompts')
     system_prompt = inputs.get('systemPrompt')
     api_key = inputs.get('anthropicAPIKey')
+    options = {
+        "system": system_prompt,
+        "max_tokens": int(inputs.get('maxTokens', 1024)),
+        "temperature": inputs.get('temperature'),
+        "api_keys": {'anthropic': api_key},
+        # The system prompt and context are reused across many messages, so they are cached unless asked otherwise
+        "cache": inputs.get('promptCaching', True)
+    }
+    if not system_prompt or not api_key:
+        raise ValueError("'systemPrompt' and 'anthropicAPIKey' are required in the input")
 
-    if not prompt or not system_prompt or not api_key:
-        raise ValueError("'prompt', 'system_prompt', and 'anthropic_api_key' are required in the input")
+    # Calls with temperature 0 are answered from the local response cache unless bypassed
+    reuse = not inputs.get('bypassCache', False)
 
-    client = AsyncAnthropic(api_key=api_key)
-
-    try:
-        response = await client.messages.create(
-            max_tokens=1024,
-            messages=[
-                {"role": "user", "content": prompt}
-            ],
-            system = system_prompt,
-            model="claude-3-5-sonnet-20240620",
-        )
+    if prompts:
+        return await process_bulk(prompts, inputs, options, reuse)
+    if not prompt:
+        raise ValueError("Either 'prompt' or 'prompts' is required in the input")
 
-        return {
-            "claudeResponse": response.content[0].text,
-            "prompt": prompt,
-            "system_prompt": system_prompt,
-            "model": response.model
-        }
-    finally:
-        await client.close()
+    # With stream, the text is published as `progress` envelopes while it is generated
+    progress = current_progress.get() if inputs.get('stream', False) else None
 
-async def main():
-    redis = Redis.from_url(
-        REDIS_HOST_URL,
-        username=REDIS_USERNAME,
-        password=REDIS_PASSWORD
+    # Pooled client per key, with retries and the key's shared rate limits
+    completion = await llm.complete(
+        MODEL,
+        with_context(prompt, inputs.get('context')),
+        on_text=progress.write if progress is not None else None,
+        response_cache=reuse,
+        **options
     )
 
-    await redis.publish(REDIS_CHANNEL_READY, '')
-
-    pubsub = redis.pubsub()
-    await pubsub.subscribe(REDIS_CHANNEL_IN)
-
-    async for message in pubsub.listen():
-        if message['type'] == 'message':
-            try:
-                result = await process_message(message['data'])
-                output = {
-                    "type": "completed",
-                    "workflowInstanceId": WORKFLOW_INSTANCE_ID,
-                    "workflowExtensionId": WORKFLOW_EXTENSION_ID,
-                    "output": result
-                }
-            except Exception as e:
-                output = {
-                    "type": "failed",
-                    "workflowInstanceId": WORKFLOW_INSTANCE_ID,
-                    "workflowExtensionId": WORKFLOW_EXTENSION_ID,
-                    "error": str(e)
-                }
-            
-            await redis.publish(REDIS_CHANNEL_OUT, json.dumps(output))
-            await redis.close()
-            break
-
-    await pubsub.unsubscribe(REDIS_CHANNEL_IN)
-    await redis.close()
+    return {
+        "claudeResponse": completion.text,
+        "prompt": prompt,
+        "system_prompt": system_prompt,
+        "model": completion.model,
+        "ttft_ms": round(completion.ttft * 1000) if completion.ttft is not None else None,
+        "latency_ms": round(completion.latency * 1000),
+        "cache_read_tokens": completion.cache_read_tokens,
+        "cache_write_tokens": completion.cache_write_tokens,
+        "cache_hit": completion.cached,
+        "response_cache": llm.responses.stats() if llm.responses else None
+    }
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    run(
+        process_message, preload=['anthropic'],
+        cacheable=Cacheable(
+            'claude-api', secret_inputs=['anthropicAPIKey'], bypass_input='bypassCache',
+            # Measured per call, so a cached output leaves them out rather than repeat the original call's
+            volatile_outputs=['ttft_ms', 'latency_ms', 'cache_read_tokens', 'cache_write_tokens', 'cache_hit', 'response_cache']
+        )
+    )
@@ -1,51 +1,29 @@
-import os
-import sys
 import logging
 from dotenv import load_dotenv
-import redis
-import json
-from crewai import Agent, Task, Crew, Process
-from langchain_community.chat_models import ChatOpenAI
-from langchain_anthropic import ChatAnthropic
-
-# Set up logging to output to stdout
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[logging.StreamHandler(sys.stdout)]
-)
+from extension_runtime import Cacheable, decode_inputs, llm, run
+from extension_runtime.logs import verbose
+
 logger = logging.getLogger(__name__)
 
 load_dotenv()
 
-WORKFLOW_INSTANCE_ID = os.getenv('WORKFLOW_INSTANCE_ID')
-WORKFLOW_EXTENSION_ID = os.getenv('WORKFLOW_EXTENSION_ID')
-REDIS_HOST_URL = os.getenv('REDIS_HOST_URL')
-REDIS_USERNAME = os.getenv('REDIS_USERNAME')
-REDIS_PASSWORD = os.getenv('REDIS_PASSWORD')
-REDIS_CHANNEL_IN = os.getenv('REDIS_CHANNEL_IN')
-REDIS_CHANNEL_OUT = os.getenv('REDIS_CHANNEL_OUT')
-REDIS_CHANNEL_READY = os.getenv('REDIS_CHANNEL_READY')
-
-redis_client = redis.Redis.from_url(
-    url=REDIS_HOST_URL,
-    username=REDIS_USERNAME,
-    password=REDIS_PASSWORD,
-    decode_responses=True
-)
-
-def get_llm(model, api_key):
+def get_llm(model, api_keys):
     logger.debug(f"Creating LLM instance for model: {model}")
-    if model.startswith('gpt-'):
-        return ChatOpenAI(model=model, openai_api_key=api_key)
-    elif model.startswith('claude-'):
-        return ChatAnthropic(model=model, anthropic_api_key=api_key)
-    else:
-        raise ValueError(f"Unsupported model: {model}")
+    return llm.langchain_model(model, api_keys)
+
+def warmup():
+    # Runs once before any message (in the zygote with EXTENSION_EXECUTOR=fork), so the
+    # LLM client classes are fully initialized when the first message builds its own
+    logger.debug("Warming up LLM clients")
+    api_keys = {'openai': 'warmup', 'anthropic': 'warmup'}
+    get_llm('gpt-4', api_keys)
+    get_llm('claude-3-5-sonnet-20240620', api_keys)
 
 def process_message(message):
+    from crewai import Agent, Task, Crew, Process
+
     logger.info("Processing incoming message")
-    inputs = json.loads(message)['inputs']
+    inputs = decode_inputs(message)
     topic = inputs.get('topic')
     context = inputs.get('context')
     openai_api_key = inputs.get('openai_api_key')
@@ -69,8 +47,9 @@ def process_message(message):
         logger.error("API keys are missing")
         raise ValueError("Either OpenAI or Anthropic API key is required")
 
-    researcher_llm = get_llm(researcher_model, openai_api_key if researcher_model.startswith('gpt-') else anthropic_api_key)
-    writer_llm = get_llm(writer_model, openai_api_key if writer_model.startswith('gpt-') else anthropic_api_key)
+    api_keys = {'openai': openai_api_key, 'anthropic': anthropic_api_key}
+    researcher_llm = get_llm(researcher_model, api_keys)
+    writer_llm = get_llm(writer_model, api_keys)
 
     logger.debug("Creating Researcher agent")
     researcher = Agent(
@@ -116,7 +95,7 @@ def process_message(message):
     crew = Crew(
         agents=[researcher, writer],
         tasks=[research_task, writing_task],
-        verbose=True,
+        verbose=verbose(),
         process=Process.sequential
     )
     logger.debug("Crew instance created successfully")
@@ -135,44 +114,10 @@ def process_message(message):
         }
     }
 
-def main():
-    logger.info("Starting main function")
-    redis_client.publish(REDIS_CHANNEL_READY, '')
-    logger.info(f"Published ready message to channel: {REDIS_CHANNEL_READY}")
-
-    pubsub = redis_client.pubsub()
-    pubsub.subscribe(REDIS_CHANNEL_IN)
-    logger.info(f"Subscribed to input channel: {REDIS_CHANNEL_IN}")
-
-    for message in pubsub.listen():
-        if message['type'] == 'message':
-            logger.info("Received message from Redis")
-            try:
-                result = process_message(message['data'])
-                output = {
-                    "type": "completed",
-                    "workflowInstanceId": WORKFLOW_INSTANCE_ID,
-                    "workflowExtensionId": WORKFLOW_EXTENSION_ID,
-                    "output": result
-                }
-                redis_client.publish(REDIS_CHANNEL_OUT, json.dumps(output))
-                logger.info(f"Published result to channel: {REDIS_CHANNEL_OUT}")
-            except Exception as e:
-                logger.error(f"Error processing message: {str(e)}", exc_info=True)
-                error_output = {
-                    "type": "failed",
-                    "workflowInstanceId": WORKFLOW_INSTANCE_ID,
-                    "workflowExtensionId": WORKFLOW_EXTENSION_ID,
-                    "error": str(e)
-                }
-                redis_client.publish(REDIS_CHANNEL_OUT, json.dumps(error_output))
-                logger.info(f"Published error to channel: {REDIS_CHANNEL_OUT}")
-            finally:
-                pubsub.unsubscribe(REDIS_CHANNEL_IN)
-                logger.info(f"Unsubscribed from channel: {REDIS_CHANNEL_IN}")
-                break
-
 if __name__ == "__main__":
     logger.info("Script started")
-    main()
-    logger.info("Script finished")
\ No newline at end of file
+    run(
+        process_message, preload=['crewai', 'langchain_openai', 'langchain_anthropic'], warmup=warmup,
+        cacheable=Cacheable('crewai-researcher', secret_inputs=['openai_api_key', 'anthropic_api_key'])
+    )
+    logger.info("Script finished")
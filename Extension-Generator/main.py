@@ -1,47 +1,15 @@
 import os
-import sys
-import json
-import asyncio
-from redis.asyncio import Redis
-from crewai import Agent, Task, Crew, Process, LLM
-from langchain_openai import ChatOpenAI
-from langchain_anthropic import ChatAnthropic
-from crewai_tools import SerperDevTool, GithubSearchTool
-from git import Repo
-from github import Github, GithubException, Auth, GithubIntegration
+import fcntl
+from contextlib import contextmanager
+from extension_runtime import decode_inputs, llm, run
+from extension_runtime.logs import verbose
 import logging
 
-# Set up logging to output to stdout
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[logging.StreamHandler(sys.stdout)]
-)
 logger = logging.getLogger(__name__)
 
-# Load environment variables
-WORKFLOW_INSTANCE_ID = os.getenv('WORKFLOW_INSTANCE_ID')
-WORKFLOW_EXTENSION_ID = os.getenv('WORKFLOW_EXTENSION_ID')
-REDIS_HOST_URL = os.getenv('REDIS_HOST_URL')
-REDIS_USERNAME = os.getenv('REDIS_USERNAME')
-REDIS_PASSWORD = os.getenv('REDIS_PASSWORD')
-REDIS_CHANNEL_IN = os.getenv('REDIS_CHANNEL_IN')
-REDIS_CHANNEL_OUT = os.getenv('REDIS_CHANNEL_OUT')
-REDIS_CHANNEL_READY = os.getenv('REDIS_CHANNEL_READY')
-
-# Validate required environment variables
-required_env_vars = [
-    'WORKFLOW_INSTANCE_ID', 'WORKFLOW_EXTENSION_ID', 'REDIS_HOST_URL',
-    'REDIS_USERNAME', 'REDIS_PASSWORD', 'REDIS_CHANNEL_IN',
-    'REDIS_CHANNEL_OUT', 'REDIS_CHANNEL_READY'
-]
-
-missing_env_vars = [var for var in required_env_vars if not os.getenv(var)]
-
-if missing_env_vars:
-    raise ValueError(f"Missing required environment variables: {', '.join(missing_env_vars)}")
-
 def clone_repo_and_set_guideline():
+    from git import Repo
+
     # Clone the community-extensions repository
     repo_url = "https://github.com/Orchestrate-AI/community-extensions.git"
     repo_path = "./community-extensions"
@@ -74,16 +42,11 @@ def clone_repo_and_set_guideline():
     """
 
 def create_extension(extension_spec, github_app_id, github_private_key, api_keys, model_config, guideline):
+    from crewai import Agent, Task, Crew, Process
+    from crewai_tools import SerperDevTool
+
     # Initialize LLMs
-    claude = ChatAnthropic(anthropic_api_key=api_keys['anthropic'], model="claude-3-5-sonnet-20240620")
-    gpt4 = ChatOpenAI(api_key=api_keys['openai'], model_name="gpt-4", temperature=0.7)
-
-    llm = LLM(
-        model="claude-3-5-sonnet-20240620",
-        temperature=0.7,
-        # base_url="https://api.openai.com/v1",
-        api_key=api_keys['anthropic']
-    )
+    crew_llm = llm.crewai_llm("claude-3-5-sonnet-20240620", api_keys, temperature=0.7)
     
 
     # Create tools
@@ -94,9 +57,9 @@ def create_extension(extension_spec, github_app_id, github_private_key, api_keys
         role='Library Version Checker',
         goal='Ensure the latest versions of libraries are used',
         backstory='You are an expert in software dependencies and library versioning. Your job is to verify and update library versions to the most recent stable releases.',
-        verbose=True,
+        verbose=verbose(),
         allow_delegation=False,
-        llm=llm,
+        llm=crew_llm,
         tools=[search_tool]
     )
 
@@ -104,18 +67,18 @@ def create_extension(extension_spec, github_app_id, github_private_key, api_keys
         role='Developer',
         goal='Create extension code and structure',
         backstory='You are a skilled programmer with expertise in creating modular, efficient code. You will use the most recent LTS version of any language or framework that is most suitable for the extension.',
-        verbose=True,
+        verbose=verbose(),
         allow_delegation=True,
-        llm=llm
+        llm=crew_llm
     )
 
     validator = Agent(
         role='Validator',
         goal='Ensure the extension follows all guidelines and requirements',
         backstory='You are a meticulous reviewer with a keen eye for detail. Your job is to validate that all guidelines and requirements have been followed in the extension creation.',
-        verbose=True,
+        verbose=verbose(),
         allow_delegation=False,
-        llm=llm
+        llm=crew_llm
     )
 
     development_task = Task(
@@ -191,9 +154,9 @@ def create_extension(extension_spec, github_app_id, github_private_key, api_keys
     extension_crew = Crew(
         agents=[developer, validator, library_checker],
         tasks=[development_task, validation_task, library_check_task],
-        verbose=True,
+        verbose=verbose(),
         process=Process.sequential,
-        manager_llm=llm,
+        manager_llm=crew_llm,
         full_output=True
     )
 
@@ -212,10 +175,7 @@ def create_extension(extension_spec, github_app_id, github_private_key, api_keys
     
     new_branch, pr_url = create_branch_and_commit(extension_name, files_to_create, github_app_id, github_private_key)
 
-    # Print created files
-    print("Created files:")
-    for file_name in files_to_create.keys():
-        print(f"- {file_name}")
+    logger.info(f"Created files: {', '.join(files_to_create)}")
 
     # Create the comment
     comment = f"Created new extension '{extension_name}'. Pull request: {pr_url}"
@@ -233,7 +193,9 @@ def parse_result(crew_output):
     current_content = []
 
     for task_output in crew_output.tasks_output:
-        print('task_output: ', task_output)
+        # Whole agent transcripts; only for the messages sampled for verbose traces
+        if verbose():
+            logger.info(f"Task output: {task_output}")
         lines = task_output.raw.split('\n')
         for line in lines:
             if line.startswith("<<<FILE_START>>>"):
@@ -252,9 +214,11 @@ def parse_result(crew_output):
     return files
 
 def create_branch_and_commit(extension_name, files_to_create, github_app_id, github_private_key):
+    from github import Github, Auth, GithubIntegration
+
     try:
         # Authenticate as GitHub App
-        print(f"Attempting to authenticate with GitHub App ID: {github_app_id}")
+        logger.info(f"Attempting to authenticate with GitHub App ID: {github_app_id}")
         auth = Auth.AppAuth(github_app_id, github_private_key)
         gi = GithubIntegration(auth=auth)
         
@@ -300,25 +264,25 @@ def create_branch_and_commit(extension_name, files_to_create, github_app_id, git
         return new_branch, pr.html_url
 
     except Exception as e:
-        print(f"Unexpected error: {e}")
+        logger.error(f"Unexpected error: {e}")
         raise
 
-async def process_message(message, guideline):
+def process_message(message, guideline):
     try:
-        data = json.loads(message)
-        extension_spec = data['inputs']['extension_spec']
-        github_app_id = data['inputs']['github_app_id']
-        github_private_key = data['inputs']['github_private_key']
+        inputs = decode_inputs(message)
+        extension_spec = inputs['extension_spec']
+        github_app_id = inputs['github_app_id']
+        github_private_key = inputs['github_private_key']
         api_keys = {
-            'openai': data['inputs']['openai_api_key'],
-            'anthropic': data['inputs']['anthropic_api_key'],
-            'serper': data['inputs']['serper_api_key']
+            'openai': inputs['openai_api_key'],
+            'anthropic': inputs['anthropic_api_key'],
+            'serper': inputs['serper_api_key']
         }
         model_config = {
-            'ideator': data['inputs'].get('ideator_model', 'claude-2'),
-            'developer': data['inputs'].get('developer_model', 'gpt-4'),
-            'documenter': data['inputs'].get('documenter_model', 'gpt-4'),
-            'reviewer': data['inputs'].get('reviewer_model', 'claude-2')
+            'ideator': inputs.get('ideator_model', 'claude-2'),
+            'developer': inputs.get('developer_model', 'gpt-4'),
+            'documenter': inputs.get('documenter_model', 'gpt-4'),
+            'reviewer': inputs.get('reviewer_model', 'claude-2')
         }
         
         result = create_extension(extension_spec, github_app_id, github_private_key, api_keys, model_config, guideline)
@@ -364,44 +328,27 @@ def run_extension(input_data):
             'message': str(e)
         }
 
-async def main():
-    redis = Redis.from_url(
-        REDIS_HOST_URL,
-        username=REDIS_USERNAME,
-        password=REDIS_PASSWORD
-    )
-
-    await redis.publish(REDIS_CHANNEL_READY, '')
-
-    pubsub = redis.pubsub()
-    await pubsub.subscribe(REDIS_CHANNEL_IN)
-
-    async for message in pubsub.listen():
-        if message['type'] == 'message':
-            try:
-                # Clone repo and set guideline after sending ready message
-                guideline = clone_repo_and_set_guideline()
-                result = await process_message(message['data'], guideline)
-                output = {
-                    "type": "completed",
-                    "workflowInstanceId": WORKFLOW_INSTANCE_ID,
-                    "workflowExtensionId": WORKFLOW_EXTENSION_ID,
-                    "output": result['result']  # Directly use the result object
-                }
-            except Exception as e:
-                output = {
-                    "type": "failed",
-                    "workflowInstanceId": WORKFLOW_INSTANCE_ID,
-                    "workflowExtensionId": WORKFLOW_EXTENSION_ID,
-                    "error": str(e)
-                }
-            
-            await redis.publish(REDIS_CHANNEL_OUT, json.dumps(output))
-            await redis.close()
-            break
-
-    await pubsub.unsubscribe(REDIS_CHANNEL_IN)
-    await redis.close()
+@contextmanager
+def guideline_lock():
+    # Concurrent messages share one checkout of the community-extensions repository. A file
+    # lock also covers the forked workers of EXTENSION_EXECUTOR=fork, not just threads
+    with open('./community-extensions.lock', 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        yield
+
+def warmup():
+    # Runs once before any message (in the zygote with EXTENSION_EXECUTOR=fork): clone the
+    # repository up front so messages only pull, and initialize the LLM client classes
+    with guideline_lock():
+        clone_repo_and_set_guideline()
+    llm.crewai_llm("claude-3-5-sonnet-20240620", {'anthropic': 'warmup'}, temperature=0.7)
+
+def handle_message(message):
+    # Clone repo and set guideline once the extension is ready
+    with guideline_lock():
+        guideline = clone_repo_and_set_guideline()
+    result = process_message(message, guideline)
+    return result['result']
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    run(handle_message, preload=['crewai', 'crewai_tools', 'git', 'github'], warmup=warmup)
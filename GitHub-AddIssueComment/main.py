@@ -1,32 +1,32 @@
-import os
-import json
-import redis
-import requests
-from github import Github
-from github import Auth, GithubIntegration
+from extension_runtime import decode_inputs, run
 import logging
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-# Redis configuration
-REDIS_HOST_URL = os.environ['REDIS_HOST_URL']
-REDIS_USERNAME = os.environ['REDIS_USERNAME']
-REDIS_PASSWORD = os.environ['REDIS_PASSWORD']
-REDIS_CHANNEL_IN = os.environ['REDIS_CHANNEL_IN']
-REDIS_CHANNEL_OUT = os.environ['REDIS_CHANNEL_OUT']
-REDIS_CHANNEL_READY = os.environ['REDIS_CHANNEL_READY']
+def connect_installation(github_app_id, github_private_key, github_installation_id):
+    from github import Github
+    from github import Auth, GithubIntegration
 
-def add_issue_comment(repo_name, issue_number, comment_body, github_app_id, github_private_key, github_installation_id):
+    # Authenticate as GitHub App
+    auth = Auth.AppAuth(github_app_id, github_private_key)
+    gi = GithubIntegration(auth=auth)
+
+    # Get an authenticated Github instance for this installation
+    access_token = gi.get_access_token(github_installation_id).token
+    return Github(access_token)
+
+def add_issue_comment(repo_name, issue_number, comment_body, github_app_id, github_private_key, github_installation_id, connections=None):
     try:
-        # Authenticate as GitHub App
-        auth = Auth.AppAuth(github_app_id, github_private_key)
-        gi = GithubIntegration(auth=auth)
-        
-        # Get an authenticated Github instance for this installation
-        access_token = gi.get_access_token(github_installation_id).token
-        github_connection = Github(access_token)
-        
+        # Within a batch the installation token is shared by all comments
+        key = (github_app_id, github_installation_id)
+        if connections is not None and key in connections:
+            github_connection = connections[key]
+        else:
+            github_connection = connect_installation(github_app_id, github_private_key, github_installation_id)
+            if connections is not None:
+                connections[key] = github_connection
+
         repo = github_connection.get_repo(repo_name)
         issue = repo.get_issue(number=issue_number)
         comment = issue.create_comment(comment_body)
@@ -43,10 +43,9 @@ def add_issue_comment(repo_name, issue_number, comment_body, github_app_id, gith
             "error_message": str(e)
         }
 
-def process_message(message):
+def process_message(message, connections=None):
     try:
-        data = json.loads(message)
-        inputs = data['inputs']
+        inputs = decode_inputs(message)
         
         repo_name = inputs.get('repo_name')
         issue_number = inputs.get('issue_number')
@@ -60,7 +59,7 @@ def process_message(message):
 
         issue_number = int(issue_number)  # Ensure issue_number is an integer
         
-        return add_issue_comment(repo_name, issue_number, comment_body, github_app_id, github_private_key, github_installation_id)
+        return add_issue_comment(repo_name, issue_number, comment_body, github_app_id, github_private_key, github_installation_id, connections)
     except Exception as e:
         logging.error(f"Error processing message: {str(e)}")
         return {
@@ -68,37 +67,11 @@ def process_message(message):
             "error_message": str(e)
         }
 
-def main():
-    publisher = redis.Redis.from_url(REDIS_HOST_URL, username=REDIS_USERNAME, password=REDIS_PASSWORD)
-    subscriber = redis.Redis.from_url(REDIS_HOST_URL, username=REDIS_USERNAME, password=REDIS_PASSWORD)
-
-    pubsub = subscriber.pubsub()
-    pubsub.subscribe(REDIS_CHANNEL_IN)
-
-    publisher.publish(REDIS_CHANNEL_READY, '')
-
-    logging.info("Listening for messages...")
-
-    for message in pubsub.listen():
-        if message['type'] == 'message':
-            result = process_message(message['data'])
-
-            output = {
-                'type': 'completed' if result['status'] == 'success' else 'failed',
-                'workflowInstanceId': os.environ['WORKFLOW_INSTANCE_ID'],
-                'workflowExtensionId': os.environ['WORKFLOW_EXTENSION_ID'],
-                'output': result
-            }
-            publisher.publish(REDIS_CHANNEL_OUT, json.dumps(output))
-
-            if result['status'] == 'error':
-                logging.error(f"Error occurred: {result['error_message']}")
-
-            pubsub.unsubscribe(REDIS_CHANNEL_IN)
-            break
-
-    publisher.close()
-    subscriber.close()
+def process_batch(messages):
+    # Comments are posted one after another: GitHub penalises concurrent content creation
+    # with secondary rate limits, so the win here is authenticating once per installation
+    connections = {}
+    return [process_message(message, connections) for message in messages]
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    run(process_message, failed_when=lambda result: result['status'] != 'success', batch_handler=process_batch, preload=['github'])
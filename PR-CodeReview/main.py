@@ -1,43 +1,44 @@
-import os
-import sys
+import re
+import asyncio
 import logging
-import redis
-import json
-import requests
-from openai import OpenAI
-from anthropic import Anthropic
-
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[logging.StreamHandler(sys.stdout)]
-)
+import msgspec
+from extension_runtime import Cacheable, decode_inputs, llm, run
+from extension_runtime.codec import convert, decode
+from extension_runtime.deadline import remaining
+
 logger = logging.getLogger(__name__)
 
-WORKFLOW_INSTANCE_ID = os.getenv('WORKFLOW_INSTANCE_ID')
-WORKFLOW_EXTENSION_ID = os.getenv('WORKFLOW_EXTENSION_ID')
-REDIS_HOST_URL = os.getenv('REDIS_HOST_URL')
-REDIS_USERNAME = os.getenv('REDIS_USERNAME')
-REDIS_PASSWORD = os.getenv('REDIS_PASSWORD')
-REDIS_CHANNEL_IN = os.getenv('REDIS_CHANNEL_IN')
-REDIS_CHANNEL_OUT = os.getenv('REDIS_CHANNEL_OUT')
-REDIS_CHANNEL_READY = os.getenv('REDIS_CHANNEL_READY')
-
-redis_client = redis.Redis.from_url(
-    url=REDIS_HOST_URL,
-    username=REDIS_USERNAME,
-    password=REDIS_PASSWORD,
-    decode_responses=True
-)
-
-def process_message(message):
+# About 4 characters per token, the same estimate the rate limiter uses
+CHARS_PER_TOKEN = 4
+# Diffs above this many tokens are reviewed in chunks of at most this size
+CHUNK_TOKENS = 6000
+FILE_HEADER = re.compile(r'^diff --git ', re.MULTILINE)
+HUNK_HEADER = re.compile(r'^@@ ', re.MULTILINE)
+SYSTEM_PROMPT = "You are a helpful code reviewer."
+# The reduce pass only merges findings, so by default it runs on the provider's small model
+REDUCE_MODELS = {'openai': 'gpt-4o-mini', 'anthropic': 'claude-3-haiku-20240307'}
+
+# Only the webhook fields the review needs; decoding skips the rest of the (large) payload
+class PullRequest(msgspec.Struct):
+    html_url: str
+    diff_url: str
+
+class PullRequestHook(msgspec.Struct):
+    action: str
+    pull_request: PullRequest
+
+async def process_message(message):
     logger.info("Processing incoming message")
-    inputs = json.loads(message)['inputs']
+    inputs = decode_inputs(message)
     pull_request_hook_body = inputs.get('pull_request_hook_body')
     openai_api_key = inputs.get('openai_api_key')
     anthropic_api_key = inputs.get('anthropic_api_key')
     model = inputs.get('model', 'gpt-4')
+    fallback_model = inputs.get('fallback_model')
+    reduce_model = inputs.get('reduce_model')
     github_token = inputs.get('github_token')
+    chunk_tokens = int(inputs.get('chunk_tokens', CHUNK_TOKENS))
+    concurrency = int(inputs.get('concurrency', 4))
 
     if not pull_request_hook_body:
         raise ValueError("'pull_request_hook_body' is required in the input")
@@ -46,15 +47,15 @@ def process_message(message):
 
     # Handle both string and dict for pull_request_hook_body
     if isinstance(pull_request_hook_body, str):
-        pr_data = json.loads(pull_request_hook_body)
+        pr_data = decode(pull_request_hook_body, PullRequestHook)
     elif isinstance(pull_request_hook_body, dict):
-        pr_data = pull_request_hook_body
+        pr_data = convert(pull_request_hook_body, PullRequestHook)
     else:
         raise ValueError("'pull_request_hook_body' must be either a JSON string or a dictionary")
 
-    pull_request_url = pr_data['pull_request']['html_url']
+    pull_request_url = pr_data.pull_request.html_url
     
-    if pr_data['action'] != 'opened':
+    if pr_data.action != 'opened':
         logger.info("Pull request action is not 'opened'. Skipping review.")
         return {
             "pull_request_url": pull_request_url,
@@ -62,26 +63,109 @@ def process_message(message):
             "model_used": None
         }
 
-    diff_url = pr_data['pull_request']['diff_url']
-    diff_content = fetch_diff(diff_url, github_token)
-    review = generate_review(diff_content, model, openai_api_key, anthropic_api_key)
+    diff_url = pr_data.pull_request.diff_url
+    diff_content = await asyncio.to_thread(fetch_diff, diff_url, github_token)
+    api_keys = {'openai': openai_api_key, 'anthropic': anthropic_api_key}
+    chunks = split_diff(diff_content, chunk_tokens)
+    if len(chunks) == 1:
+        completion = await generate_review(diff_content, model, api_keys, fallback_model)
+        reviews = [(chunks[0][0], completion)]
+    else:
+        reduce_model = reduce_model or REDUCE_MODELS[llm.provider_for(model)]
+        completion, reviews = await generate_chunked_review(chunks, model, reduce_model, api_keys, fallback_model, concurrency)
+    completions = [review for _, review in reviews] + [completion]
 
-    return {
+    result = {
         "pull_request_url": pull_request_url,
-        "review": review,
-        "model_used": model
+        "review": completion.text,
+        "model_used": fallback_model if any(getattr(review, 'fallback', False) for review in completions) else model,
+        "chunks": [chunk_report(files, review) for files, review in reviews]
     }
+    if len(chunks) > 1:
+        result["reduce"] = chunk_report(None, completion)
+    return result
+
+def chunk_report(files, completion):
+    report = {"files": files} if files is not None else {}
+    if isinstance(completion, Exception):
+        return {**report, "error": str(completion)}
+    return {
+        **report,
+        "model": completion.model,
+        "latency_ms": round(completion.latency * 1000),
+        "input_tokens": completion.input_tokens,
+        "output_tokens": completion.output_tokens
+    }
+
+def split_at(text, pattern):
+    starts = [match.start() for match in pattern.finditer(text)]
+    if not starts or starts[0] != 0:
+        starts = [0] + starts
+    return [text[start:end] for start, end in zip(starts, starts[1:] + [len(text)]) if text[start:end]]
+
+def split_lines(text, budget):
+    pieces, current = [], ''
+    for line in text.splitlines(keepends=True):
+        if current and len(current) + len(line) > budget:
+            pieces.append(current)
+            current = ''
+        current += line
+    return pieces + ([current] if current else [])
+
+def split_file(section, budget):
+    # Whole hunks where they fit, otherwise runs of lines; every piece repeats the file's header
+    if len(section) <= budget:
+        return [section]
+    parts = split_at(section, HUNK_HEADER)
+    header, hunks = (parts[0], parts[1:]) if not parts[0].startswith('@@ ') else ('', parts)
+    room = max(budget - len(header), budget // 2)
+    pieces, current = [], ''
+    for hunk in hunks:
+        for part in split_lines(hunk, room) if len(hunk) > room else [hunk]:
+            if current and len(current) + len(part) > room:
+                pieces.append(header + current)
+                current = ''
+            current += part
+    if current:
+        pieces.append(header + current)
+    return pieces
+
+def file_name(section):
+    match = re.match(r'diff --git a/(\S+) b/', section)
+    return match.group(1) if match else section.split('\n', 1)[0][:100]
+
+def split_diff(diff_content, chunk_tokens=CHUNK_TOKENS):
+    """Splits a unified diff into (files, text) chunks of at most `chunk_tokens`.
+
+    Small files are grouped together, large ones are split between hunks.
+    """
+    budget = max(chunk_tokens, 500) * CHARS_PER_TOKEN
+    chunks, files, text = [], [], ''
+    for section in split_at(diff_content, FILE_HEADER):
+        name = file_name(section)
+        for piece in split_file(section, budget):
+            if text and len(text) + len(piece) > budget:
+                chunks.append((files, text))
+                files, text = [], ''
+            text += piece
+            if name not in files:
+                files.append(name)
+    if text or not chunks:
+        chunks.append((files, text))
+    return chunks
 
 def fetch_diff(diff_url, github_token=None):
+    import requests
+
     headers = {}
     if github_token:
         headers['Authorization'] = f'token {github_token}'
     
-    response = requests.get(diff_url, headers=headers)
+    response = requests.get(diff_url, headers=headers, timeout=remaining(30))
     response.raise_for_status()
     return response.text
 
-def generate_review(diff_content, model, openai_api_key, anthropic_api_key):
+async def generate_review(diff_content, model, api_keys, fallback_model=None):
     prompt = f"""You are an experienced software developer. Please review the following code diff and provide a concise, constructive review:
 
 {diff_content}
@@ -91,73 +175,58 @@ Provide your review in the following format:
 2. Key observations (bullet points)
 3. Suggestions for improvement (if any)"""
 
-    if model.startswith('gpt-'):
-        if not openai_api_key:
-            raise ValueError("OpenAI API key is required for GPT models")
-        client = OpenAI(api_key=openai_api_key)
-        response = client.chat.completions.create(
-            model=model,
-            messages=[
-                {"role": "system", "content": "You are a helpful code reviewer."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=2000
-        )
-        return response.choices[0].message.content
-    elif model.startswith('claude-'):
-        if not anthropic_api_key:
-            raise ValueError("Anthropic API key is required for Claude models")
-        client = Anthropic(api_key=anthropic_api_key)
-        response = client.messages.create(
-            model=model,
-            max_tokens=2000,
-            messages=[
-                {"role": "user", "content": prompt}
-            ],
-            system="You are a helpful code reviewer."
-        )
-        return response.content[0].text
-    else:
-        raise ValueError(f"Unsupported model: {model}")
-
-def main():
-    logger.info("Starting main function")
-    redis_client.publish(REDIS_CHANNEL_READY, '')
-    logger.info(f"Published ready message to channel: {REDIS_CHANNEL_READY}")
-
-    pubsub = redis_client.pubsub()
-    pubsub.subscribe(REDIS_CHANNEL_IN)
-    logger.info(f"Subscribed to input channel: {REDIS_CHANNEL_IN}")
-
-    for message in pubsub.listen():
-        if message['type'] == 'message':
-            logger.info("Received message from Redis")
-            try:
-                result = process_message(message['data'])
-                output = {
-                    "type": "completed",
-                    "workflowInstanceId": WORKFLOW_INSTANCE_ID,
-                    "workflowExtensionId": WORKFLOW_EXTENSION_ID,
-                    "output": result
-                }
-                redis_client.publish(REDIS_CHANNEL_OUT, json.dumps(output))
-                logger.info(f"Published result to channel: {REDIS_CHANNEL_OUT}")
-            except Exception as e:
-                logger.error(f"Error processing message: {str(e)}", exc_info=True)
-                error_output = {
-                    "type": "failed",
-                    "workflowInstanceId": WORKFLOW_INSTANCE_ID,
-                    "workflowExtensionId": WORKFLOW_EXTENSION_ID,
-                    "error": str(e)
-                }
-                redis_client.publish(REDIS_CHANNEL_OUT, json.dumps(error_output))
-                logger.info(f"Published error to channel: {REDIS_CHANNEL_OUT}")
-            finally:
-                pubsub.unsubscribe(REDIS_CHANNEL_IN)
-                logger.info(f"Unsubscribed from channel: {REDIS_CHANNEL_IN}")
-                break
+    return await llm.complete(
+        model,
+        prompt,
+        system=SYSTEM_PROMPT,
+        max_tokens=2000,
+        api_keys=api_keys,
+        fallback=fallback_model
+    )
+
+async def generate_chunked_review(chunks, model, reduce_model, api_keys, fallback_model=None, concurrency=4):
+    """Reviews the chunks concurrently, then merges their findings into one review in the usual format."""
+    prompts = [
+        f"""You are an experienced software developer reviewing part {index} of {len(chunks)} of a pull request's diff, covering {', '.join(files)}:
+
+{text}
+
+List your findings on this part as bullet points: issues, risks and suggestions for improvement, each naming its file. Do not summarize the pull request, other reviewers cover the other parts."""
+        for index, (files, text) in enumerate(chunks, start=1)
+    ]
+    completions = await llm.complete_many(
+        model, prompts, concurrency=concurrency, system=SYSTEM_PROMPT, max_tokens=1000,
+        api_keys=api_keys, fallback=fallback_model
+    )
+    reviews = [(files, completion) for (files, _), completion in zip(chunks, completions)]
+    findings = [
+        f"Part {index} ({', '.join(files)}):\n{completion.text}"
+        for index, (files, completion) in enumerate(reviews, start=1) if not isinstance(completion, Exception)
+    ]
+    if not findings:
+        raise completions[0]
+    failed = [file for files, completion in reviews if isinstance(completion, Exception) for file in files]
+    if failed:
+        logger.warning(f"Review of {len(reviews) - len(findings)} of {len(reviews)} chunks failed, the review leaves out {', '.join(failed)}")
+
+    findings = '\n\n'.join(findings)
+    prompt = f"""Several reviewers each reviewed part of the same pull request's diff. These are their findings:
+
+{findings}
+
+Merge them into one concise, constructive review without repeating yourself, in the following format:
+1. Summary (1-2 sentences)
+2. Key observations (bullet points)
+3. Suggestions for improvement (if any)"""
+    completion = await llm.complete(
+        reduce_model, prompt, system=SYSTEM_PROMPT, max_tokens=2000, api_keys=api_keys, fallback=fallback_model
+    )
+    return completion, reviews
 
 if __name__ == "__main__":
     logger.info("Script started")
-    main()
-    logger.info("Script finished")
\ No newline at end of file
+    run(
+        process_message, preload=['requests', 'openai', 'anthropic'],
+        cacheable=Cacheable('pr-code-review', version='2', secret_inputs=['openai_api_key', 'anthropic_api_key', 'github_token'])
+    )
+    logger.info("Script finished")
@@ -1,40 +1,18 @@
-import os
 import json
 import asyncio
-from redis.asyncio import Redis
 from dotenv import load_dotenv
-import requests
-from bs4 import BeautifulSoup
+from extension_runtime import Cacheable, decode_inputs, run
+from extension_runtime.deadline import remaining
 import time
 import random
-from requests.exceptions import RequestException
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
 
 load_dotenv()
 
-WORKFLOW_INSTANCE_ID = os.getenv('WORKFLOW_INSTANCE_ID')
-WORKFLOW_EXTENSION_ID = os.getenv('WORKFLOW_EXTENSION_ID')
-REDIS_HOST_URL = os.getenv('REDIS_HOST_URL')
-REDIS_USERNAME = os.getenv('REDIS_USERNAME')
-REDIS_PASSWORD = os.getenv('REDIS_PASSWORD')
-REDIS_CHANNEL_IN = os.getenv('REDIS_CHANNEL_IN')
-REDIS_CHANNEL_OUT = os.getenv('REDIS_CHANNEL_OUT')
-REDIS_CHANNEL_READY = os.getenv('REDIS_CHANNEL_READY')
-
-def connect_to_redis():
-
-    return Redis.from_url(
-        REDIS_HOST_URL,
-        username=REDIS_USERNAME,
-        password=REDIS_PASSWORD,
-        decode_responses=True
-    )
-
 def scrape_zillow(url):
+    import requests
+    from bs4 import BeautifulSoup
+    from requests.exceptions import RequestException
+
     headers = {
         'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
         'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
@@ -53,7 +31,7 @@ def scrape_zillow(url):
             # Add a random delay between requests
             time.sleep(random.uniform(1, 3))
             
-            response = session.get(url, headers=headers)
+            response = session.get(url, headers=headers, timeout=remaining(30))
             response.raise_for_status()  # Raise an exception for bad status codes
             
             debug_html = response.text
@@ -105,6 +83,12 @@ def scrape_zillow(url):
     return [], "Max retries reached. Unable to fetch data."
 
 def scrape_zillow_with_selenium(zipcode, min_price, max_price):
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
+
     options = Options()
     options.add_argument("--headless")
     options.add_argument("user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36")
@@ -163,13 +147,13 @@ def scrape_zillow_with_selenium(zipcode, min_price, max_price):
     return listings
 
 async def process_message(message):
-    data = json.loads(message)
-    inputs = data['inputs']
+    inputs = decode_inputs(message)
     zipcode = inputs['zipcode']
     min_price = inputs['min_price']
     max_price = inputs['max_price']
 
-    listings, debug_html = scrape_zillow(url=f"https://www.zillow.com/homes/{zipcode}_rb/")
+    # scrape_zillow blocks on requests and sleeps, keep it off the event loop
+    listings, debug_html = await asyncio.to_thread(scrape_zillow, url=f"https://www.zillow.com/homes/{zipcode}_rb/")
 
     return {
         'listings': listings,
@@ -177,42 +161,9 @@ async def process_message(message):
         'debug_html': debug_html
     }
 
-async def main():
-    redis = Redis.from_url(
-        REDIS_HOST_URL,
-        username=REDIS_USERNAME,
-        password=REDIS_PASSWORD
-    )
-
-    await redis.publish(REDIS_CHANNEL_READY, '')
-
-    pubsub = redis.pubsub()
-    await pubsub.subscribe(REDIS_CHANNEL_IN)
-
-    async for message in pubsub.listen():
-        if message['type'] == 'message':
-            try:
-                result = await process_message(message['data'])
-                output = {
-                    "type": "completed",
-                    "workflowInstanceId": WORKFLOW_INSTANCE_ID,
-                    "workflowExtensionId": WORKFLOW_EXTENSION_ID,
-                    "output": result
-                }
-            except Exception as e:
-                output = {
-                    "type": "failed",
-                    "workflowInstanceId": WORKFLOW_INSTANCE_ID,
-                    "workflowExtensionId": WORKFLOW_EXTENSION_ID,
-                    "error": str(e)
-                }
-            
-            await redis.publish(REDIS_CHANNEL_OUT, json.dumps(output))
-            await redis.close()
-            break
-
-    await pubsub.unsubscribe(REDIS_CHANNEL_IN)
-    await redis.close()
-
 if __name__ == "__main__":
-    asyncio.run(main())
+    run(
+        process_message, preload=['requests', 'bs4'], debug_fields=['debug_html'],
+        # An empty result is usually a blocked request rather than an empty market
+        cacheable=Cacheable('zillow-scrape-listings', when=lambda result: result['count'] > 0)
+    )
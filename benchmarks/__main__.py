@@ -0,0 +1,125 @@
+import os
+import sys
+import json
+import argparse
+
+from .cassettes import Cassette
+from .harness import REPO_ROOT, RESULTS_DIR, compare, run_in_tempdir, run_isolated
+from .stubs import EXTENSIONS
+
+CASSETTES_DIR = os.path.join(REPO_ROOT, 'benchmarks', 'cassettes')
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks',
+        description='Benchmark an extension against a fake (or local) Redis with its external APIs stubbed.'
+    )
+    parser.add_argument('extension', nargs='?', choices=sorted(EXTENSIONS), help='Extension folder to benchmark')
+    parser.add_argument('--all', action='store_true', help='Benchmark every extension, each in its own process')
+    parser.add_argument('--messages', type=int, default=200, help='Messages sent at once in the throughput phase')
+    parser.add_argument('--sequential', type=int, default=20, help='Messages sent one by one in the latency phase')
+    parser.add_argument('--concurrency', type=int, default=10, help='EXTENSION_MAX_CONCURRENCY for the extension')
+    parser.add_argument('--transport', choices=['pubsub', 'streams'], default='pubsub')
+    parser.add_argument('--redis-url', help='Use a real Redis server instead of fakeredis')
+    parser.add_argument(
+        '--latency-ms', type=float,
+        help='Latency injected into every stubbed or replayed external call (default: none, or the recorded latency on replay)'
+    )
+    parser.add_argument('--record', nargs='?', const='', metavar='CASSETTE', help='Call the real APIs once and record them')
+    parser.add_argument('--replay', nargs='?', const='', metavar='CASSETTE', help='Serve external calls from a recording instead of stubs')
+    parser.add_argument('--speed', type=float, default=1.0, help='On replay without --latency-ms, divides the recorded latencies')
+    parser.add_argument('--inputs', help='JSON file with the inputs to send instead of the sample inputs')
+    parser.add_argument('--output', help='Result file (default: benchmarks/results/<extension>.json)')
+    parser.add_argument('--baseline', help='Previous result file to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed relative regression against the baseline')
+    args = parser.parse_args(argv)
+    if not args.extension and not args.all:
+        parser.error('an extension name or --all is required')
+    if args.record is not None and args.replay is not None:
+        parser.error('--record and --replay are mutually exclusive')
+    if args.record is not None and (args.all or not args.inputs):
+        # The sample inputs carry stub credentials, which the real APIs would reject
+        parser.error('--record needs a single extension and --inputs with real credentials')
+    if args.transport == 'streams' and not args.redis_url:
+        # fakeredis serves XREADGROUP BLOCK synchronously, which would stall the event loop
+        parser.error('--transport streams requires --redis-url')
+    return args
+
+def main(argv):
+    args = parse_args(argv)
+
+    if args.all:
+        failed = []
+        for name in sorted(EXTENSIONS):
+            forwarded = [
+                '--messages', str(args.messages), '--sequential', str(args.sequential),
+                '--concurrency', str(args.concurrency), '--transport', args.transport,
+                '--tolerance', str(args.tolerance)
+            ]
+            if args.latency_ms is not None:
+                forwarded += ['--latency-ms', str(args.latency_ms)]
+            if args.replay is not None:
+                # With --all, --replay is a directory of cassettes, by default benchmarks/cassettes
+                cassette = os.path.join(args.replay or CASSETTES_DIR, f"{name}.json")
+                if not os.path.exists(cassette):
+                    print(f"Skipping {name}: no cassette at {cassette}")
+                    continue
+                forwarded += ['--replay', cassette, '--speed', str(args.speed)]
+            if args.redis_url:
+                forwarded += ['--redis-url', args.redis_url]
+            # With --all, --baseline and --output are directories holding one <extension>.json each
+            if args.baseline and os.path.exists(os.path.join(args.baseline, f"{name}.json")):
+                forwarded += ['--baseline', os.path.join(args.baseline, f"{name}.json")]
+            if args.output:
+                forwarded += ['--output', os.path.join(args.output, f"{name}.json")]
+            if run_isolated(name, forwarded) != 0:
+                failed.append(name)
+        if failed:
+            print(f"Benchmarks failed or regressed: {', '.join(failed)}")
+        return 1 if failed else 0
+
+    cassette = None
+    if args.record is not None or args.replay is not None:
+        path = os.path.abspath(args.record or args.replay or os.path.join(CASSETTES_DIR, f"{args.extension}.json"))
+        if args.record is not None:
+            cassette = Cassette(path, mode='record')
+        else:
+            cassette = Cassette(path, mode='replay', latency_ms=args.latency_ms, speed=args.speed)
+    inputs = None
+    if args.inputs:
+        with open(args.inputs) as file:
+            inputs = json.load(file)
+
+    report = run_in_tempdir(
+        args.extension,
+        messages=args.messages,
+        sequential=args.sequential,
+        concurrency=args.concurrency,
+        transport=args.transport,
+        redis_url=args.redis_url,
+        latency_ms=args.latency_ms,
+        cassette=cassette,
+        inputs=inputs
+    )
+    if cassette is not None and cassette.mode == 'record':
+        os.makedirs(os.path.dirname(cassette.path), exist_ok=True)
+        cassette.save()
+        print(f"Recorded {len(cassette.interactions)} requests to {cassette.path}")
+
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline) as file:
+            report['regressions'] = compare(report, json.load(file), args.tolerance)
+        exit_code = 1 if report['regressions'] else 0
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{args.extension}.json")
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w') as file:
+        json.dump(report, file, indent=2)
+
+    print(json.dumps(report, indent=2))
+    print(f"Results written to {output}")
+    return exit_code
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
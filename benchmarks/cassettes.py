@@ -0,0 +1,317 @@
+"""Record and replay of the extensions' outbound HTTP.
+
+A cassette is a JSON file of recorded request/response pairs. Recording wraps
+the transport of every HTTP client the extensions use, directly or through SDKs:
+requests (Zillow, PR-CodeReview, PyGithub, Apprise, Azure), httpx (Anthropic,
+OpenAI), aiohttp (CurrencyExchange) and httplib2 (Google APIs). Replay serves
+the recorded responses from the same place, so the real SDKs run end to end
+without a network.
+"""
+import io
+import json
+import time
+import base64
+import asyncio
+import hashlib
+import functools
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+REDACTED = '<redacted>'
+SECRET_HEADERS = {
+    'authorization', 'proxy-authorization', 'cookie', 'set-cookie', 'x-api-key', 'api-key',
+    'x-goog-api-key', 'ocp-apim-subscription-key'
+}
+SECRET_PARAMS = {'key', 'api_key', 'apikey', 'app_id', 'access_token', 'token', 'client_secret', 'sig', 'signature'}
+SECRET_FIELDS = {'token', 'access_token', 'refresh_token', 'id_token', 'client_secret', 'api_key', 'password'}
+# Recorded bodies are already decoded, so these would no longer be true on replay
+STALE_HEADERS = {'content-encoding', 'content-length', 'transfer-encoding'}
+
+class CassetteMiss(LookupError):
+    pass
+
+def redact_url(url):
+    parts = urlsplit(str(url))
+    if not parts.query:
+        return parts.geturl()
+    query = [(name, REDACTED if name.lower() in SECRET_PARAMS else value) for name, value in parse_qsl(parts.query, keep_blank_values=True)]
+    return parts._replace(query=urlencode(query, safe='<>')).geturl()
+
+def redact_fields(value):
+    if isinstance(value, dict):
+        return {key: REDACTED if key.lower() in SECRET_FIELDS else redact_fields(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [redact_fields(item) for item in value]
+    return value
+
+def redact_body(body):
+    try:
+        return json.dumps(redact_fields(json.loads(body))).encode()
+    except ValueError:
+        return body
+
+def as_bytes(body):
+    if body is None:
+        return b''
+    if isinstance(body, str):
+        return body.encode()
+    if isinstance(body, (bytes, bytearray)):
+        return bytes(body)
+    # Streamed uploads cannot be replayed byte for byte; they only match by method and URL
+    return b''
+
+def dump_body(body):
+    try:
+        return {"text": body.decode()}
+    except UnicodeDecodeError:
+        return {"base64": base64.b64encode(body).decode()}
+
+def load_body(body):
+    return base64.b64decode(body['base64']) if 'base64' in body else body['text'].encode()
+
+def response_headers(headers):
+    return [
+        [name, REDACTED if name.lower() in SECRET_HEADERS else value]
+        for name, value in headers if name.lower() not in STALE_HEADERS
+    ]
+
+class Cassette:
+    """Recorded interactions, matched by method, URL (secrets redacted) and request body.
+
+    A request whose body differs from every recording of its method and URL gets
+    the first of those. Requests that were recorded more than once are answered
+    in turn. In replay, each response waits `latency_ms`, or the recorded
+    duration divided by `speed` when `latency_ms` is None.
+    """
+
+    def __init__(self, path, mode='replay', latency_ms=None, speed=1.0):
+        if mode not in ('record', 'replay'):
+            raise ValueError("mode must be either 'record' or 'replay'")
+        self.path = path
+        self.mode = mode
+        self.latency_ms = latency_ms
+        self.speed = speed
+        self.interactions = []
+        self.by_body = {}
+        self.by_url = {}
+        self.turns = {}
+        if mode == 'replay':
+            with open(path) as file:
+                for interaction in json.load(file)['interactions']:
+                    self.add(interaction)
+
+    def keys(self, method, url, body):
+        url_key = (method.upper(), redact_url(url))
+        return url_key + (hashlib.sha256(redact_body(as_bytes(body))).hexdigest(),), url_key
+
+    def add(self, interaction):
+        request = interaction['request']
+        body_key, url_key = self.keys(request['method'], request['url'], load_body(request['body']))
+        self.interactions.append(interaction)
+        self.by_body.setdefault(body_key, []).append(interaction)
+        self.by_url.setdefault(url_key, []).append(interaction)
+
+    def find(self, method, url, body):
+        body_key, url_key = self.keys(method, url, body)
+        candidates = self.by_body.get(body_key) or self.by_url.get(url_key)
+        if not candidates:
+            raise CassetteMiss(f"No recorded response for {method.upper()} {redact_url(url)} in {self.path}")
+        turn = self.turns.get(body_key, 0)
+        self.turns[body_key] = turn + 1
+        return candidates[turn % len(candidates)]
+
+    def delay(self, interaction):
+        if self.latency_ms is not None:
+            return self.latency_ms / 1000
+        return interaction['duration_ms'] / 1000 / self.speed
+
+    def record(self, method, url, body, status, headers, content, started):
+        content = redact_body(content)
+        self.add({
+            "request": {"method": method.upper(), "url": redact_url(url), "body": dump_body(redact_body(as_bytes(body)))},
+            "response": {"status": int(status), "headers": response_headers(headers), "body": dump_body(content)},
+            "duration_ms": round((time.perf_counter() - started) * 1000, 3)
+        })
+
+    def save(self):
+        with open(self.path, 'w') as file:
+            json.dump({"version": 1, "interactions": self.interactions}, file, indent=2)
+            file.write('\n')
+
+    def patches(self):
+        """(module, function) pairs that hook this cassette into each HTTP client once its module is imported."""
+        return [
+            ('requests.adapters', self.patch_requests),
+            ('httpx', self.patch_httpx),
+            ('aiohttp', self.patch_aiohttp),
+            ('httplib2', self.patch_httplib2)
+        ]
+
+    def patch_requests(self, module):
+        from requests.models import Response
+        from requests.structures import CaseInsensitiveDict
+        from requests.utils import get_encoding_from_headers
+
+        original = module.HTTPAdapter.send
+
+        @functools.wraps(original)
+        def send(adapter, request, *args, **kwargs):
+            if self.mode == 'record':
+                started = time.perf_counter()
+                response = original(adapter, request, *args, **kwargs)
+                self.record(request.method, request.url, request.body, response.status_code,
+                            response.headers.items(), response.content, started)
+                return response
+            interaction = self.find(request.method, request.url, request.body)
+            time.sleep(self.delay(interaction))
+            response = Response()
+            response.status_code = interaction['response']['status']
+            response.headers = CaseInsensitiveDict(interaction['response']['headers'])
+            response._content = load_body(interaction['response']['body'])
+            response.raw = io.BytesIO(response._content)
+            response.encoding = get_encoding_from_headers(response.headers)
+            response.url = request.url
+            response.request = request
+            response.connection = adapter
+            return response
+
+        module.HTTPAdapter.send = send
+
+    def patch_httpx(self, module):
+        original_sync = module.HTTPTransport.handle_request
+        original_async = module.AsyncHTTPTransport.handle_async_request
+
+        def replayed(request, interaction):
+            return module.Response(
+                interaction['response']['status'],
+                headers=interaction['response']['headers'],
+                content=load_body(interaction['response']['body']),
+                request=request
+            )
+
+        def recorded(request, response, started):
+            # The body has been read, so the client gets a fresh response holding it
+            self.record(request.method, request.url, request.content, response.status_code,
+                        response.headers.multi_items(), response.content, started)
+            headers = [(name, value) for name, value in response.headers.multi_items() if name.lower() not in STALE_HEADERS]
+            return module.Response(response.status_code, headers=headers, content=response.content, request=request)
+
+        @functools.wraps(original_sync)
+        def handle_request(transport, request):
+            request.read()
+            if self.mode == 'record':
+                started = time.perf_counter()
+                response = original_sync(transport, request)
+                response.read()
+                return recorded(request, response, started)
+            interaction = self.find(request.method, request.url, request.content)
+            time.sleep(self.delay(interaction))
+            return replayed(request, interaction)
+
+        @functools.wraps(original_async)
+        async def handle_async_request(transport, request):
+            await request.aread()
+            if self.mode == 'record':
+                started = time.perf_counter()
+                response = await original_async(transport, request)
+                await response.aread()
+                return recorded(request, response, started)
+            interaction = self.find(request.method, request.url, request.content)
+            await asyncio.sleep(self.delay(interaction))
+            return replayed(request, interaction)
+
+        module.HTTPTransport.handle_request = handle_request
+        module.AsyncHTTPTransport.handle_async_request = handle_async_request
+
+    def patch_aiohttp(self, module):
+        from yarl import URL
+
+        original = module.ClientSession._request
+
+        def describe(url, kwargs):
+            url = URL(str(url))
+            if kwargs.get('params'):
+                url = url.extend_query(kwargs['params'])
+            body = json.dumps(kwargs['json']).encode() if kwargs.get('json') is not None else kwargs.get('data')
+            return str(url), body
+
+        @functools.wraps(original)
+        async def _request(session, method, url, *args, **kwargs):
+            full_url, body = describe(url, kwargs)
+            if self.mode == 'record':
+                started = time.perf_counter()
+                response = await original(session, method, url, *args, **kwargs)
+                # read() keeps the body on the response, so the caller can still read it
+                content = await response.read()
+                self.record(method, full_url, body, response.status, response.headers.items(), content, started)
+                return response
+            interaction = self.find(method, full_url, body)
+            await asyncio.sleep(self.delay(interaction))
+            return ReplayedAiohttpResponse(method, full_url, interaction)
+
+        module.ClientSession._request = _request
+
+    def patch_httplib2(self, module):
+        original = module.Http.request
+
+        @functools.wraps(original)
+        def request(http, uri, method='GET', body=None, headers=None, *args, **kwargs):
+            if self.mode == 'record':
+                started = time.perf_counter()
+                response, content = original(http, uri, method, body, headers, *args, **kwargs)
+                headers_items = [(name, value) for name, value in response.items() if not name.startswith('-') and name != 'status']
+                self.record(method, uri, body, response.status, headers_items, content, started)
+                return response, content
+            interaction = self.find(method, uri, body)
+            time.sleep(self.delay(interaction))
+            info = {name.lower(): value for name, value in interaction['response']['headers']}
+            info['status'] = str(interaction['response']['status'])
+            return module.Response(info), load_body(interaction['response']['body'])
+
+        module.Http.request = request
+
+class ReplayedAiohttpResponse:
+    """What aiohttp's ClientSession._request returns, as far as the extensions use it."""
+
+    def __init__(self, method, url, interaction):
+        from multidict import CIMultiDict
+        from yarl import URL
+
+        self.method = method
+        self.url = URL(url)
+        self.status = interaction['response']['status']
+        self.reason = None
+        self.headers = CIMultiDict(interaction['response']['headers'])
+        self.content_type = self.headers.get('Content-Type', 'application/octet-stream').split(';')[0]
+        self.body = load_body(interaction['response']['body'])
+        self.ok = self.status < 400
+
+    async def read(self):
+        return self.body
+
+    async def text(self, encoding=None, errors='strict'):
+        return self.body.decode(encoding or 'utf-8', errors)
+
+    async def json(self, *, loads=json.loads, **kwargs):
+        return loads(self.body.decode())
+
+    def raise_for_status(self):
+        if not self.ok:
+            from aiohttp import ClientResponseError, RequestInfo
+
+            request_info = RequestInfo(self.url, self.method, self.headers, self.url)
+            raise ClientResponseError(request_info, (), status=self.status, message=self.reason or '', headers=self.headers)
+
+    def release(self):
+        pass
+
+    def close(self):
+        pass
+
+    async def wait_for_close(self):
+        pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass
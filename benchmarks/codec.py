@@ -0,0 +1,94 @@
+"""Microbenchmark of the envelope codec against the stdlib json path it replaced.
+
+Usage: python -m benchmarks.codec [--number N] [--json]
+"""
+import os
+import sys
+import json
+import timeit
+import argparse
+import importlib.util
+
+from extension_runtime.codec import decode, decode_envelope, encode
+from extension_runtime.worker import build_output
+
+from .payloads import github_pull_request_hook, zillow_output
+from .stubs import REPO_ROOT
+
+def load_pr_code_review_types():
+    # PR-CodeReview's folder name is not importable as a package
+    path = os.path.join(REPO_ROOT, 'PR-CodeReview', 'main.py')
+    spec = importlib.util.spec_from_file_location('pr_code_review', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.PullRequestHook
+
+def cases(PullRequestHook):
+    hook = github_pull_request_hook()
+    workflow_ids = {"workflowId": None, "workflowInstanceId": "instance-id", "workflowExtensionId": "extension-id"}
+    review = {"pull_request_url": hook['pull_request']['html_url'], "review": "Looks good. " * 200, "model_used": "gpt-4"}
+
+    pr_message = json.dumps({
+        "workflowInstanceId": "instance-id",
+        "workflowExtensionId": "extension-id",
+        "inputs": {"pull_request_hook_body": json.dumps(hook), "openai_api_key": "sk-...", "model": "gpt-4"}
+    })
+    claude_message = json.dumps({
+        "workflowInstanceId": "instance-id",
+        "workflowExtensionId": "extension-id",
+        "inputs": {"prompt": "Summarize this paragraph. " * 20, "systemPrompt": "You are terse.", "anthropicAPIKey": "sk-..."}
+    })
+    zillow_result = build_output(workflow_ids, result=zillow_output())
+    review_result = build_output(workflow_ids, result=review)
+
+    def stdlib_pr_review():
+        # Before: runtime parsed the message for the workflow ids and the batch check, the
+        # extension once more for its inputs, and then the nested webhook body
+        json.loads(pr_message)
+        json.loads(pr_message)
+        inputs = json.loads(pr_message)['inputs']
+        pr_data = json.loads(inputs['pull_request_hook_body'])
+        pr_data['pull_request']['diff_url']
+        json.dumps(review_result)
+
+    def codec_pr_review():
+        inputs = decode_envelope(pr_message).inputs
+        pr_data = decode(inputs['pull_request_hook_body'], PullRequestHook)
+        pr_data.pull_request.diff_url
+        encode(review_result)
+
+    return {
+        "pr_review_round_trip": (stdlib_pr_review, codec_pr_review),
+        "webhook_body_decode": (
+            lambda: json.loads(json.loads(pr_message)['inputs']['pull_request_hook_body']),
+            lambda: decode(decode_envelope(pr_message).inputs['pull_request_hook_body'], PullRequestHook)
+        ),
+        "small_envelope_decode": (lambda: json.loads(claude_message), lambda: decode_envelope(claude_message)),
+        "listings_output_encode": (lambda: json.dumps(zillow_result), lambda: encode(zillow_result))
+    }
+
+def measure(function, number):
+    # Best of 5 repeats, in microseconds per call
+    return min(timeit.repeat(function, number=number, repeat=5)) / number * 1e6
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.codec', description=__doc__.splitlines()[0])
+    parser.add_argument('--number', type=int, default=2000, help='Calls per repeat')
+    parser.add_argument('--json', action='store_true', help='Print the results as JSON')
+    args = parser.parse_args(argv)
+
+    results = {}
+    for name, (stdlib, codec) in cases(load_pr_code_review_types()).items():
+        stdlib_us, codec_us = measure(stdlib, args.number), measure(codec, args.number)
+        results[name] = {"stdlib_us": round(stdlib_us, 2), "codec_us": round(codec_us, 2), "speedup": round(stdlib_us / codec_us, 2)}
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return 0
+    print(f"{'case':<26}{'stdlib (us)':>14}{'codec (us)':>14}{'speedup':>10}")
+    for name, result in results.items():
+        print(f"{name:<26}{result['stdlib_us']:>14.2f}{result['codec_us']:>14.2f}{result['speedup']:>9.2f}x")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,331 @@
+import os
+import sys
+import json
+import time
+import uuid
+import runpy
+import asyncio
+import logging
+import platform
+import importlib
+import importlib.abc
+import statistics
+import subprocess
+import tempfile
+from types import SimpleNamespace
+from datetime import datetime, timezone
+
+import extension_runtime
+from extension_runtime import ratelimit, worker
+
+from . import stubs
+
+logger = logging.getLogger(__name__)
+
+REPO_ROOT = stubs.REPO_ROOT
+RESULTS_DIR = os.path.join(REPO_ROOT, 'benchmarks', 'results')
+
+# metric -> True when a higher value is better
+TRACKED_METRICS = {
+    'cold_start_ms': False,
+    'sequential.p50_ms': False,
+    'sequential.p99_ms': False,
+    'throughput.messages_per_second': True,
+    'throughput.latency.p99_ms': False
+}
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+def summarize(latencies):
+    latencies_ms = [latency * 1000 for latency in latencies]
+    if not latencies_ms:
+        return {"count": 0}
+    return {
+        "count": len(latencies_ms),
+        "mean_ms": round(statistics.mean(latencies_ms), 3),
+        "p50_ms": round(percentile(latencies_ms, 50), 3),
+        "p90_ms": round(percentile(latencies_ms, 90), 3),
+        "p99_ms": round(percentile(latencies_ms, 99), 3),
+        "max_ms": round(max(latencies_ms), 3)
+    }
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=REPO_ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def redis_factory(redis_url):
+    if redis_url:
+        from redis.asyncio import Redis
+        return lambda: Redis.from_url(redis_url)
+
+    import fakeredis
+    server = fakeredis.FakeServer()
+    # Sync handlers reach the rate limiter through their own client, which must see the same server
+    ratelimit.Redis = SimpleNamespace(from_url=lambda *args, **kwargs: fakeredis.FakeRedis(server=server))
+    return lambda: fakeredis.FakeAsyncRedis(server=server)
+
+class PatchingFinder(importlib.abc.MetaPathFinder):
+    """Patches stubs or cassettes into modules as they get imported.
+
+    Extensions import their heavy libraries lazily, so patching must not import
+    them up front either, or the cold start would include imports that really
+    happen after READY.
+    """
+
+    def __init__(self, patches):
+        self.patches = patches
+
+    def find_spec(self, fullname, path, target=None):
+        if fullname not in self.patches:
+            return None
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, 'find_spec'):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is not None:
+                break
+        else:
+            return None
+        exec_module = spec.loader.exec_module
+
+        def exec_and_patch(module):
+            exec_module(module)
+            for patch in self.patches[fullname]:
+                patch(module)
+
+        spec.loader.exec_module = exec_and_patch
+        return spec
+
+def stub_patches(name):
+    return [
+        (module_name, lambda module, attribute=attribute, fake=fake: setattr(module, attribute, fake))
+        for module_name, attribute, fake in stubs.EXTENSIONS[name]['patches']
+    ]
+
+def apply_patches(patches):
+    """Applies (module, function) patches now to imported modules, and on import to the others."""
+    pending = {}
+    for module_name, patch in patches:
+        if module_name in sys.modules:
+            patch(sys.modules[module_name])
+        else:
+            pending.setdefault(module_name, []).append(patch)
+    if pending:
+        sys.meta_path.insert(0, PatchingFinder(pending))
+
+def load_extension(name):
+    """Executes the extension's main.py as __main__ and captures the arguments it passes to run()."""
+    captured = {}
+
+    def capture_run(handler, **kwargs):
+        captured['handler'] = handler
+        captured['kwargs'] = kwargs
+
+    original_run = extension_runtime.run
+    extension_runtime.run = capture_run
+    try:
+        runpy.run_path(os.path.join(REPO_ROOT, name, 'main.py'), run_name='__main__')
+    finally:
+        extension_runtime.run = original_run
+
+    if 'handler' not in captured:
+        raise RuntimeError(f"{name}/main.py did not call extension_runtime.run()")
+    return captured['handler'], captured['kwargs']
+
+class Observer:
+    """Plays the workflow engine: sends input messages and timestamps their outputs."""
+
+    def __init__(self, redis, channels, transport):
+        self.redis = redis
+        self.channels = channels
+        self.transport = transport
+        self.ready = asyncio.Event()
+        self.ready_at = None
+        self.pending = {}
+        self.sent_at = {}
+        self.received_at = {}
+        self.progress_at = {}
+        self.outputs = {}
+        self.pubsub = None
+        self.task = None
+
+    async def start(self):
+        self.pubsub = self.redis.pubsub()
+        await self.pubsub.subscribe(self.channels['ready'], self.channels['out'])
+        self.task = asyncio.create_task(self.listen())
+
+    async def listen(self):
+        async for message in self.pubsub.listen():
+            if message['type'] != 'message':
+                continue
+            now = time.perf_counter()
+            channel = message['channel'].decode() if isinstance(message['channel'], bytes) else message['channel']
+            if channel == self.channels['ready']:
+                self.ready_at = self.ready_at or now
+                self.ready.set()
+                continue
+            output = json.loads(message['data'])
+            message_id = output.get('workflowInstanceId')
+            if output.get('type') == 'progress':
+                # Streaming extensions: the first partial output, the final one still completes the message
+                self.progress_at.setdefault(message_id, now)
+                continue
+            if message_id in self.pending:
+                self.received_at[message_id] = now
+                self.outputs[message_id] = output
+                self.pending.pop(message_id).set_result(output)
+
+    async def send(self, message_id, inputs, extension_id):
+        envelope = json.dumps({
+            "workflowInstanceId": message_id,
+            "workflowExtensionId": extension_id,
+            "inputs": inputs
+        })
+        self.pending[message_id] = asyncio.get_running_loop().create_future()
+        self.sent_at[message_id] = time.perf_counter()
+        if self.transport == 'streams':
+            await self.redis.xadd(self.channels['in'], {'data': envelope})
+        else:
+            await self.redis.publish(self.channels['in'], envelope)
+        return self.pending[message_id]
+
+    def latencies(self, message_ids):
+        return [self.received_at[i] - self.sent_at[i] for i in message_ids if i in self.received_at]
+
+    def first_progress(self, message_ids):
+        return [self.progress_at[i] - self.sent_at[i] for i in message_ids if i in self.progress_at]
+
+    async def close(self):
+        self.task.cancel()
+        await self.pubsub.unsubscribe()
+
+async def benchmark(name, messages=200, sequential=20, concurrency=10, transport='pubsub',
+                    redis_url=None, latency_ms=None, timeout=300, cassette=None, inputs=None):
+    """Benchmarks `name` against its stubs, or against the recordings of `cassette` when given.
+
+    A cassette in record mode calls the real APIs, so it sends the `inputs` (with
+    real credentials) once and nothing else.
+    """
+    stubs.LATENCY = (latency_ms or 0) / 1000
+    if cassette is not None and cassette.mode == 'record':
+        messages, sequential = 0, 1
+    run_id = uuid.uuid4().hex[:8]
+    channels = {
+        'in': f"bench:{name}:{run_id}:in",
+        'out': f"bench:{name}:{run_id}:out",
+        'ready': f"bench:{name}:{run_id}:ready"
+    }
+    os.environ.update({
+        'WORKFLOW_INSTANCE_ID': f"bench-{run_id}",
+        'WORKFLOW_EXTENSION_ID': name,
+        'REDIS_HOST_URL': redis_url or 'redis://localhost:6379/0',
+        'REDIS_CHANNEL_IN': channels['in'],
+        'REDIS_CHANNEL_OUT': channels['out'],
+        'REDIS_CHANNEL_READY': channels['ready'],
+        'EXTENSION_PERSISTENT': 'true',
+        'EXTENSION_MAX_CONCURRENCY': str(concurrency),
+        'EXTENSION_TRANSPORT': transport
+    })
+    new_client = redis_factory(redis_url)
+    worker.connect_to_redis = lambda settings: new_client()
+
+    observer = Observer(new_client(), channels, transport)
+    await observer.start()
+
+    # Cold start covers importing the extension up to READY; libraries it imports lazily are
+    # patched as they load and count towards the first messages instead
+    started = time.perf_counter()
+    apply_patches(cassette.patches() if cassette is not None else stub_patches(name))
+    handler, kwargs = load_extension(name)
+    imported = time.perf_counter()
+    serve_task = asyncio.create_task(worker.serve(handler, **kwargs))
+    await asyncio.wait_for(observer.ready.wait(), timeout)
+    cold_start = observer.ready_at - started
+
+    inputs = inputs or stubs.EXTENSIONS[name]['inputs']
+    sequential_ids = [f"seq-{i}" for i in range(sequential)]
+    for message_id in sequential_ids:
+        await asyncio.wait_for(await observer.send(message_id, inputs, name), timeout)
+
+    throughput_ids = [f"load-{i}" for i in range(messages)]
+    futures = [await observer.send(message_id, inputs, name) for message_id in throughput_ids]
+    await asyncio.wait_for(asyncio.gather(*futures), timeout)
+    if throughput_ids:
+        elapsed = max(observer.received_at[i] for i in throughput_ids) - min(observer.sent_at[i] for i in throughput_ids)
+    else:
+        elapsed = 0
+
+    serve_task.cancel()
+    await asyncio.gather(serve_task, return_exceptions=True)
+    await observer.close()
+
+    failures = [output for output in observer.outputs.values() if output.get('type') == 'failed']
+    return {
+        "extension": name,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "settings": {
+            "messages": messages,
+            "sequential": sequential,
+            "concurrency": concurrency,
+            "transport": transport,
+            "redis": 'redis-server' if redis_url else 'fakeredis',
+            "external": f"cassette ({cassette.mode})" if cassette is not None else 'stubs',
+            "stub_latency_ms": latency_ms
+        },
+        "cold_start_ms": round(cold_start * 1000, 3),
+        "import_ms": round((imported - started) * 1000, 3),
+        "sequential": summarize(observer.latencies(sequential_ids)),
+        "first_progress": summarize(observer.first_progress(sequential_ids)),
+        "throughput": {
+            "elapsed_s": round(elapsed, 3),
+            "messages_per_second": round(messages / elapsed, 2) if elapsed else None,
+            "latency": summarize(observer.latencies(throughput_ids))
+        },
+        "failed": len(failures),
+        "errors": sorted({str(output.get('error') or output.get('output')) for output in failures})[:5]
+    }
+
+def lookup(report, metric):
+    value = report
+    for key in metric.split('.'):
+        if not isinstance(value, dict) or key not in value:
+            return None
+        value = value[key]
+    return value
+
+def compare(report, baseline, tolerance):
+    """Returns the tracked metrics that got worse than the baseline by more than `tolerance`."""
+    regressions = []
+    for metric, higher_is_better in TRACKED_METRICS.items():
+        current, previous = lookup(report, metric), lookup(baseline, metric)
+        if not current or not previous:
+            continue
+        change = (current - previous) / previous
+        if (change < -tolerance) if higher_is_better else (change > tolerance):
+            regressions.append({"metric": metric, "baseline": previous, "current": current, "change": round(change, 3)})
+    return regressions
+
+def run_isolated(name, args):
+    # Each extension runs in a fresh interpreter so its cold start really is cold
+    command = [sys.executable, '-m', 'benchmarks', name] + args
+    return subprocess.run(command, cwd=REPO_ROOT).returncode
+
+def run_in_tempdir(name, **kwargs):
+    # Extensions may write to their working directory (Extension-Generator clones a repository)
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        try:
+            return asyncio.run(benchmark(name, **kwargs))
+        finally:
+            os.chdir(cwd)
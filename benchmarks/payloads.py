@@ -0,0 +1,109 @@
+"""Realistic message payloads shared by the benchmarks."""
+
+API = 'https://api.github.com'
+
+def github_user(login, user_id):
+    url = f"{API}/users/{login}"
+    return {
+        "login": login, "id": user_id, "node_id": f"MDQ6VXNlcj{user_id}",
+        "avatar_url": f"https://avatars.githubusercontent.com/u/{user_id}?v=4", "gravatar_id": "",
+        "url": url, "html_url": f"https://github.com/{login}",
+        "followers_url": f"{url}/followers", "following_url": f"{url}/following{{/other_user}}",
+        "gists_url": f"{url}/gists{{/gist_id}}", "starred_url": f"{url}/starred{{/owner}}{{/repo}}",
+        "subscriptions_url": f"{url}/subscriptions", "organizations_url": f"{url}/orgs",
+        "repos_url": f"{url}/repos", "events_url": f"{url}/events{{/privacy}}",
+        "received_events_url": f"{url}/received_events", "type": "User", "site_admin": False
+    }
+
+def github_repository(full_name, repo_id, owner):
+    url = f"{API}/repos/{full_name}"
+    templated = [
+        'assignees{/user}', 'branches{/branch}', 'blobs{/sha}', 'collaborators{/collaborator}',
+        'comments{/number}', 'commits{/sha}', 'compare/{base}...{head}', 'contents/{+path}',
+        'git/commits{/sha}', 'git/refs{/sha}', 'git/tags{/sha}', 'issues/comments{/number}',
+        'issues/events{/number}', 'issues{/number}', 'keys{/key_id}', 'labels{/name}',
+        'milestones{/number}', 'notifications{?since,all,participating}', 'pulls{/number}',
+        'releases{/id}', 'statuses/{sha}', 'git/trees{/sha}', '{archive_format}{/ref}'
+    ]
+    plain = [
+        'forks', 'teams', 'hooks', 'events', 'tags', 'languages', 'stargazers', 'contributors',
+        'subscribers', 'subscription', 'merges', 'downloads', 'deployments'
+    ]
+    repository = {
+        "id": repo_id, "node_id": f"R_kgDO{repo_id}", "name": full_name.split('/')[1],
+        "full_name": full_name, "private": False, "owner": owner,
+        "html_url": f"https://github.com/{full_name}", "description": "Community extensions for workflows",
+        "fork": False, "url": url, "created_at": "2024-06-01T12:00:00Z", "updated_at": "2024-09-01T12:00:00Z",
+        "pushed_at": "2024-09-02T08:30:00Z", "git_url": f"git://github.com/{full_name}.git",
+        "ssh_url": f"git@github.com:{full_name}.git", "clone_url": f"https://github.com/{full_name}.git",
+        "svn_url": f"https://github.com/{full_name}", "homepage": None, "size": 2048,
+        "stargazers_count": 42, "watchers_count": 42, "language": "Python", "has_issues": True,
+        "has_projects": True, "has_downloads": True, "has_wiki": True, "has_pages": False,
+        "has_discussions": False, "forks_count": 7, "mirror_url": None, "archived": False,
+        "disabled": False, "open_issues_count": 3, "license": None, "allow_forking": True,
+        "is_template": False, "web_commit_signoff_required": False, "topics": ["workflows", "extensions"],
+        "visibility": "public", "forks": 7, "open_issues": 3, "watchers": 42, "default_branch": "main",
+        "allow_squash_merge": True, "allow_merge_commit": True, "allow_rebase_merge": True,
+        "allow_auto_merge": False, "delete_branch_on_merge": False, "allow_update_branch": False,
+        "use_squash_pr_title_as_default": False, "squash_merge_commit_message": "COMMIT_MESSAGES",
+        "squash_merge_commit_title": "COMMIT_OR_PR_TITLE", "merge_commit_message": "PR_TITLE",
+        "merge_commit_title": "MERGE_MESSAGE"
+    }
+    for path in templated:
+        repository[f"{path.split('{')[0].strip('/').replace('/', '_') or 'archive'}_url"] = f"{url}/{path}"
+    for path in plain:
+        repository[f"{path}_url"] = f"{url}/{path}"
+    return repository
+
+def github_pull_request_hook(number=1, action='opened', body_paragraphs=20):
+    """A pull_request webhook body shaped like the ones GitHub sends (~28 KB)."""
+    author = github_user('octocat', 583231)
+    owner = github_user('Orchestrate-AI', 170000001)
+    repository = github_repository('Orchestrate-AI/community-extensions', 800000001, owner)
+    pr_url = f"{API}/repos/Orchestrate-AI/community-extensions/pulls/{number}"
+    html_url = f"https://github.com/Orchestrate-AI/community-extensions/pull/{number}"
+    body = "\n\n".join(
+        f"Paragraph {i}: this change updates the extension runtime and its documentation." for i in range(body_paragraphs)
+    )
+    pull_request = {
+        "url": pr_url, "id": 1900000000 + number, "node_id": f"PR_kwDO{number}", "html_url": html_url,
+        "diff_url": f"{html_url}.diff", "patch_url": f"{html_url}.patch",
+        "issue_url": f"{API}/repos/Orchestrate-AI/community-extensions/issues/{number}",
+        "number": number, "state": "open", "locked": False, "title": "Update the extension runtime",
+        "user": author, "body": body, "created_at": "2024-09-02T08:30:00Z", "updated_at": "2024-09-02T08:30:00Z",
+        "closed_at": None, "merged_at": None, "merge_commit_sha": None, "assignee": None, "assignees": [],
+        "requested_reviewers": [github_user(f"reviewer{i}", 1000 + i) for i in range(2)],
+        "requested_teams": [], "labels": [{"id": 1, "name": "enhancement", "color": "a2eeef", "default": True}],
+        "milestone": None, "draft": False,
+        "commits_url": f"{pr_url}/commits", "review_comments_url": f"{pr_url}/comments",
+        "review_comment_url": f"{API}/repos/Orchestrate-AI/community-extensions/pulls/comments{{/number}}",
+        "comments_url": f"{API}/repos/Orchestrate-AI/community-extensions/issues/{number}/comments",
+        "statuses_url": f"{API}/repos/Orchestrate-AI/community-extensions/statuses/0f1e2d3c",
+        "head": {"label": "octocat:runtime", "ref": "runtime", "sha": "0f1e2d3c" * 5, "user": author,
+                 "repo": github_repository('octocat/community-extensions', 800000002, author)},
+        "base": {"label": "Orchestrate-AI:main", "ref": "main", "sha": "4b5a6978" * 5, "user": owner,
+                 "repo": repository},
+        "_links": {name: {"href": f"{pr_url}/{name}"} for name in ('self', 'html', 'issue', 'comments', 'commits', 'statuses')},
+        "author_association": "CONTRIBUTOR", "auto_merge": None, "active_lock_reason": None,
+        "merged": False, "mergeable": None, "rebaseable": None, "mergeable_state": "unknown",
+        "merged_by": None, "comments": 0, "review_comments": 0, "maintainer_can_modify": True,
+        "commits": 3, "additions": 120, "deletions": 40, "changed_files": 6
+    }
+    return {
+        "action": action, "number": number, "pull_request": pull_request,
+        "repository": repository, "sender": author
+    }
+
+def zillow_output(listings=40):
+    return {
+        "listings": [
+            {
+                "address": f"{100 + i} Main St, Springfield, IL 62701",
+                "price": f"${300000 + i * 1000:,}",
+                "details": "3 bds | 2 ba | 1,500 sqft",
+                "link": f"https://www.zillow.com/homedetails/{100 + i}-Main-St/{2000000 + i}_zpid/"
+            }
+            for i in range(listings)
+        ],
+        "count": listings
+    }
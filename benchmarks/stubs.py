@@ -0,0 +1,492 @@
+import os
+import re
+import time
+import json
+import shutil
+import asyncio
+from types import SimpleNamespace
+
+from .payloads import github_pull_request_hook
+
+# Latency injected into every stubbed external call, set by the harness
+LATENCY = 0.0
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def delay():
+    if LATENCY:
+        time.sleep(LATENCY)
+
+async def async_delay():
+    if LATENCY:
+        await asyncio.sleep(LATENCY)
+
+# --- Anthropic / OpenAI ---------------------------------------------------
+
+def anthropic_message(kwargs, text='Stubbed completion'):
+    return SimpleNamespace(
+        content=[SimpleNamespace(type='text', text=text)],
+        model=kwargs.get('model'),
+        stop_reason='end_turn',
+        usage=SimpleNamespace(input_tokens=25, output_tokens=10, cache_read_input_tokens=0, cache_creation_input_tokens=0)
+    )
+
+# Rate limit headers as the providers send them, so the shared limiter learns from the stubs too
+ANTHROPIC_HEADERS = {
+    'anthropic-ratelimit-requests-limit': '4000', 'anthropic-ratelimit-requests-remaining': '3999',
+    'anthropic-ratelimit-tokens-limit': '400000', 'anthropic-ratelimit-tokens-remaining': '399000'
+}
+OPENAI_HEADERS = {
+    'x-ratelimit-limit-requests': '10000', 'x-ratelimit-remaining-requests': '9999',
+    'x-ratelimit-limit-tokens': '2000000', 'x-ratelimit-remaining-tokens': '1999000'
+}
+
+class FakeRawResponse:
+    # What with_raw_response.create returns: the headers, and parse() for the message
+    def __init__(self, parsed, headers):
+        self.parsed = parsed
+        self.headers = headers
+
+    def parse(self):
+        return self.parsed
+
+class FakeAsyncRawResponse(FakeRawResponse):
+    async def parse(self):
+        return self.parsed
+
+class FakeAsyncAnthropicMessages:
+    async def create(self, **kwargs):
+        await async_delay()
+        return anthropic_message(kwargs)
+
+    def stream(self, **kwargs):
+        return FakeAsyncAnthropicStream(kwargs)
+
+    @property
+    def with_raw_response(self):
+        async def create(**kwargs):
+            return FakeAsyncRawResponse(await self.create(**kwargs), ANTHROPIC_HEADERS)
+        return SimpleNamespace(create=create)
+
+class FakeAsyncAnthropicStream:
+    # What messages.stream() returns: text chunks, then the final message
+    def __init__(self, kwargs):
+        self.kwargs = kwargs
+        self.response = SimpleNamespace(headers=ANTHROPIC_HEADERS)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+    @property
+    async def text_stream(self):
+        await async_delay()
+        for word in 'Stubbed completion'.split(' '):
+            yield word + ' '
+
+    async def get_final_message(self):
+        return anthropic_message(self.kwargs)
+
+class FakeAsyncAnthropicBatches:
+    # The Message Batches API: the stub processes a batch as it is created, so it has
+    # ended by the first poll instead of after minutes
+    def __init__(self):
+        self.batches = {}
+
+    async def create(self, requests, **kwargs):
+        await async_delay()
+        batch_id = f"msgbatch_stub_{len(self.batches)}"
+        self.batches[batch_id] = requests
+        return SimpleNamespace(id=batch_id, processing_status='in_progress')
+
+    async def retrieve(self, batch_id, **kwargs):
+        await async_delay()
+        return SimpleNamespace(id=batch_id, processing_status='ended')
+
+    async def cancel(self, batch_id, **kwargs):
+        return SimpleNamespace(id=batch_id, processing_status='canceling')
+
+    async def results(self, batch_id, **kwargs):
+        await async_delay()
+        return self.entries(self.batches.pop(batch_id))
+
+    async def entries(self, requests):
+        for request in requests:
+            if request['params']['messages'][0]['content']:
+                result = SimpleNamespace(type='succeeded', message=anthropic_message(request['params']))
+            else:
+                # What the API answers for an empty prompt
+                error = SimpleNamespace(type='invalid_request_error', message='messages: text content blocks must be non-empty')
+                result = SimpleNamespace(type='errored', error=SimpleNamespace(type='error', error=error))
+            yield SimpleNamespace(custom_id=request['custom_id'], result=result)
+
+class FakeAsyncAnthropic:
+    def __init__(self, **kwargs):
+        self.messages = FakeAsyncAnthropicMessages()
+        self.messages.batches = FakeAsyncAnthropicBatches()
+
+    async def close(self):
+        pass
+
+class FakeAsyncOpenAICompletions:
+    async def create(self, **kwargs):
+        await async_delay()
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=REVIEW_TEXT))],
+            model=kwargs.get('model'),
+            usage=SimpleNamespace(prompt_tokens=25, completion_tokens=10, total_tokens=35)
+        )
+
+    @property
+    def with_raw_response(self):
+        async def create(**kwargs):
+            # The OpenAI SDK's raw response parses synchronously, even on the async client
+            return FakeRawResponse(await self.create(**kwargs), OPENAI_HEADERS)
+        return SimpleNamespace(create=create)
+
+class FakeAsyncOpenAI:
+    def __init__(self, **kwargs):
+        self.chat = SimpleNamespace(completions=FakeAsyncOpenAICompletions())
+
+    async def close(self):
+        pass
+
+REVIEW_TEXT = """1. Summary: Stubbed review.
+2. Key observations:
+- Looks fine
+3. Suggestions for improvement:
+- None"""
+
+# --- HTTP -----------------------------------------------------------------
+
+class FakeAiohttpResponse:
+    def __init__(self, url):
+        self.url = url
+        self.status = 200
+
+    async def __aenter__(self):
+        await async_delay()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+    async def json(self):
+        # Shaped like openexchangerates.org /api/latest.json
+        base = re.search(r'base=([A-Z]+)', self.url)
+        symbols = re.search(r'symbols=([A-Z,]+)', self.url)
+        return {
+            "base": base.group(1) if base else 'USD',
+            "timestamp": 1700000000,
+            "rates": {symbol: 1.0 for symbol in (symbols.group(1).split(',') if symbols else [])}
+        }
+
+class FakeClientSession:
+    def __init__(self, **kwargs):
+        pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+    def get(self, url, **kwargs):
+        return FakeAiohttpResponse(url)
+
+    async def close(self):
+        pass
+
+ZILLOW_HTML = """<html><body><ul class="List-c11n-8-84-3__sc-1smrmqp-0">
+<li class="ListItem-c11n-8-84-3__sc-10e22w8-0"><address>1 Main St</address>
+<span data-test="property-card-price">$300,000</span></li>
+<li class="ListItem-c11n-8-84-3__sc-10e22w8-0"><address>2 Main St</address>
+<span data-test="property-card-price">$350,000</span></li>
+</ul></body></html>"""
+
+DIFF_TEXT = """diff --git a/app.py b/app.py
+--- a/app.py
++++ b/app.py
+@@ -1,2 +1,3 @@
+ import os
++import sys
+ print(os.getcwd())
+"""
+
+class FakeHttpResponse:
+    def __init__(self, text):
+        self.text = text
+        self.content = text.encode()
+        self.status_code = 200
+        self.headers = {}
+
+    def raise_for_status(self):
+        pass
+
+class FakeRequestsSession:
+    def get(self, url, **kwargs):
+        delay()
+        return FakeHttpResponse(ZILLOW_HTML)
+
+def fake_requests_get(url, **kwargs):
+    delay()
+    return FakeHttpResponse(DIFF_TEXT)
+
+# --- Notifications --------------------------------------------------------
+
+class FakeApprise:
+    def __init__(self, *args, **kwargs):
+        self.urls = []
+
+    def add(self, url, **kwargs):
+        self.urls.append(url)
+        return True
+
+    def notify(self, **kwargs):
+        delay()
+        return True
+
+    async def async_notify(self, **kwargs):
+        await async_delay()
+        return True
+
+# --- Google APIs ----------------------------------------------------------
+
+class FakeGoogleRequest:
+    def __init__(self, result):
+        self.result = result
+
+    def execute(self, **kwargs):
+        delay()
+        return self.result
+
+class FakeCommentThreads:
+    def list(self, maxResults=20, **kwargs):
+        items = [{
+            "snippet": {"topLevelComment": {"snippet": {
+                "authorDisplayName": f"Viewer {i}",
+                "textDisplay": "Great video",
+                "publishedAt": "2024-01-01T00:00:00Z",
+                "likeCount": i
+            }}}
+        } for i in range(maxResults)]
+        return FakeGoogleRequest({"items": items})
+
+class FakeEvents:
+    def insert(self, **kwargs):
+        return FakeGoogleRequest({"id": "stub-event"})
+
+class FakeGoogleService:
+    def commentThreads(self):
+        return FakeCommentThreads()
+
+    def events(self):
+        return FakeEvents()
+
+def fake_build(*args, **kwargs):
+    return FakeGoogleService()
+
+# --- GitHub ---------------------------------------------------------------
+
+class FakeAppAuth:
+    def __init__(self, *args, **kwargs):
+        pass
+
+class FakeGithubRepo:
+    full_name = "Orchestrate-AI/community-extensions"
+
+    def get_issue(self, number):
+        return SimpleNamespace(create_comment=lambda body: SimpleNamespace(
+            id=1, html_url=f"https://github.com/{self.full_name}/issues/{number}#issuecomment-1"
+        ))
+
+    def get_branch(self, name):
+        return SimpleNamespace(commit=SimpleNamespace(sha='0' * 40))
+
+    def create_git_ref(self, ref, sha):
+        delay()
+
+    def create_file(self, **kwargs):
+        delay()
+
+    def create_pull(self, **kwargs):
+        delay()
+        return SimpleNamespace(html_url=f"https://github.com/{self.full_name}/pull/1")
+
+class FakeGithubIntegration:
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def get_access_token(self, installation_id):
+        delay()
+        return SimpleNamespace(token='stub-token')
+
+    def get_app(self):
+        return SimpleNamespace(id=1)
+
+    def get_installations(self):
+        return [SimpleNamespace(id=1)]
+
+    def get_app_installation(self, installation_id):
+        return SimpleNamespace(get_repos=lambda: [FakeGithubRepo()])
+
+class FakeGithub:
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def get_repo(self, name):
+        delay()
+        return FakeGithubRepo()
+
+class FakeGitRepo:
+    # Serves the guideline files from this checkout instead of cloning
+    def __init__(self, path):
+        self.remotes = SimpleNamespace(origin=SimpleNamespace(pull=lambda: None))
+
+    @classmethod
+    def clone_from(cls, url, path):
+        os.makedirs(path, exist_ok=True)
+        for filename in ('README.md', 'guide-js.md', 'extension-communication.md'):
+            shutil.copy(os.path.join(REPO_ROOT, filename), os.path.join(path, filename))
+        return cls(path)
+
+# --- CrewAI / LangChain ---------------------------------------------------
+
+GENERATED_EXTENSION = """<<<EXTENSION_NAME_START>>>
+Stub-CreateThing
+<<<EXTENSION_NAME_END>>>
+
+<<<EXTENSION_DESCRIPTION_START>>>
+Stubbed extension
+<<<EXTENSION_DESCRIPTION_END>>>
+
+<<<FILE_START>>>main.py
+print('hello')
+<<<FILE_END>>>"""
+
+class FakeLLM:
+    def __init__(self, *args, **kwargs):
+        self.kwargs = kwargs
+
+class FakeAgent:
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+
+class FakeTask:
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+
+class FakeCrewOutput:
+    def __init__(self, tasks):
+        self.tasks_output = [SimpleNamespace(raw=GENERATED_EXTENSION) for _ in tasks]
+
+    def __str__(self):
+        return GENERATED_EXTENSION
+
+class FakeCrew:
+    def __init__(self, tasks=(), **kwargs):
+        self.tasks = tasks
+
+    def kickoff(self, **kwargs):
+        for _ in self.tasks:
+            delay()
+        return FakeCrewOutput(self.tasks)
+
+class FakeTool:
+    def __init__(self, *args, **kwargs):
+        pass
+
+# --- Registry -------------------------------------------------------------
+
+PR_HOOK_BODY = github_pull_request_hook()
+
+# Per extension: the sample `inputs` of one message and the (module, attribute, fake)
+# patches applied before its main.py is executed
+EXTENSIONS = {
+    'ClaudeAPI': {
+        'inputs': {"prompt": "Say hello", "systemPrompt": "You are terse.", "anthropicAPIKey": "stub-key"},
+        'patches': [
+            ('anthropic', 'AsyncAnthropic', FakeAsyncAnthropic),
+            # Stubbed batches end at once, so "useBatchAPI" messages need not wait out the real poll interval
+            ('extension_runtime.llm', 'BATCH_POLL_INTERVAL', 0)
+        ]
+    },
+    'CurrencyExchange': {
+        'inputs': {"app_id": "stub-app", "target_currencies": "EUR,GBP,JPY"},
+        'patches': [('aiohttp', 'ClientSession', FakeClientSession)]
+    },
+    'Apprise': {
+        'inputs': {"notificationUrl": "json://localhost", "title": "Hello", "body": "World"},
+        'patches': [('apprise', 'Apprise', FakeApprise)]
+    },
+    'Apprise-Azure': {
+        'inputs': {"notificationUrl": "json://localhost", "title": "Hello", "body": "World"},
+        'patches': [('apprise', 'Apprise', FakeApprise)]
+    },
+    'YouTube-CommentsFetcher': {
+        'inputs': {"video_id": "stub-video", "auth_token": "stub-key", "max_comments": 20},
+        'patches': [('googleapiclient.discovery', 'build', fake_build)]
+    },
+    'ZillowScraper-ScrapeListings': {
+        'inputs': {"zipcode": "30307", "min_price": 100000, "max_price": 500000},
+        'patches': [('requests', 'Session', FakeRequestsSession)]
+    },
+    'CrewAI-Researcher': {
+        'inputs': {"topic": "Benchmarks", "openai_api_key": "stub-key", "researcher_model": "gpt-4", "writer_model": "gpt-4"},
+        'patches': [
+            ('crewai', 'Agent', FakeAgent),
+            ('crewai', 'Task', FakeTask),
+            ('crewai', 'Crew', FakeCrew),
+            ('langchain_openai', 'ChatOpenAI', FakeLLM),
+            ('langchain_anthropic', 'ChatAnthropic', FakeLLM)
+        ]
+    },
+    'PR-CodeReview': {
+        'inputs': {"pull_request_hook_body": json.dumps(PR_HOOK_BODY), "openai_api_key": "stub-key", "model": "gpt-4"},
+        'patches': [
+            ('requests', 'get', fake_requests_get),
+            ('openai', 'AsyncOpenAI', FakeAsyncOpenAI),
+            ('anthropic', 'AsyncAnthropic', FakeAsyncAnthropic)
+        ]
+    },
+    'GitHub-AddIssueComment': {
+        'inputs': {
+            "repo_name": "example/repo", "issue_number": "1", "comment": "Hello",
+            "github_app_id": "1", "github_private_key": "stub-key", "github_installation_id": "1"
+        },
+        'patches': [
+            ('github.Auth', 'AppAuth', FakeAppAuth),
+            ('github', 'GithubIntegration', FakeGithubIntegration),
+            ('github', 'Github', FakeGithub)
+        ]
+    },
+    'GoogleCalendar-CreateEvent': {
+        'inputs': {
+            "summary": "Sync", "start_time": "2024-01-01T10:00:00Z", "end_time": "2024-01-01T11:00:00Z",
+            "auth_token": "stub-token"
+        },
+        'patches': [('googleapiclient.discovery', 'build', fake_build)]
+    },
+    'Extension-Generator': {
+        'inputs': {
+            "extension_spec": "<Stub,Creates a thing,Create Thing>", "github_app_id": "1",
+            "github_private_key": "stub-key", "openai_api_key": "stub-key",
+            "anthropic_api_key": "stub-key", "serper_api_key": "stub-key"
+        },
+        'patches': [
+            ('git', 'Repo', FakeGitRepo),
+            ('crewai', 'Agent', FakeAgent),
+            ('crewai', 'Task', FakeTask),
+            ('crewai', 'Crew', FakeCrew),
+            ('crewai', 'LLM', FakeLLM),
+            ('langchain_openai', 'ChatOpenAI', FakeLLM),
+            ('langchain_anthropic', 'ChatAnthropic', FakeLLM),
+            ('crewai_tools', 'SerperDevTool', FakeTool),
+            ('github.Auth', 'AppAuth', FakeAppAuth),
+            ('github', 'GithubIntegration', FakeGithubIntegration),
+            ('github', 'Github', FakeGithub)
+        ]
+    }
+}
@@ -0,0 +1,6 @@
+from .cache import Cacheable
+from .codec import DecodeError, decode_envelope, decode_inputs
+from .config import Settings
+from .worker import run, serve
+
+__all__ = ['Cacheable', 'DecodeError', 'Settings', 'decode_envelope', 'decode_inputs', 'run', 'serve']
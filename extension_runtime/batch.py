@@ -0,0 +1,34 @@
+import msgspec
+
+from .codec import Message, encode
+
+def split_batch(envelope):
+    """Splits a batch envelope ({"inputs": [...]}) into one message per item.
+
+    Returns None for a regular single-item envelope. Each item message keeps the
+    workflow identifiers, so handlers parse it exactly like a normal message.
+    """
+    if not isinstance(envelope.inputs, list):
+        return None
+
+    messages = []
+    for item in envelope.inputs:
+        item_envelope = msgspec.structs.replace(envelope, inputs=item)
+        messages.append(Message(encode(item_envelope).decode(), item_envelope))
+    return messages
+
+def build_item_result(outcome, failed_when=None):
+    if isinstance(outcome, BaseException):
+        return {"type": "failed", "error": str(outcome)}
+    failed = failed_when(outcome) if failed_when else False
+    return {"type": "failed" if failed else "completed", "output": outcome}
+
+def build_batch_output(outcomes, failed_when=None):
+    results = [build_item_result(outcome, failed_when) for outcome in outcomes]
+    failed = sum(1 for result in results if result['type'] == 'failed')
+    return {
+        "results": results,
+        "total": len(results),
+        "succeeded": len(results) - failed,
+        "failed": failed
+    }
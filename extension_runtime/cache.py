@@ -0,0 +1,132 @@
+import time
+import hashlib
+import logging
+from dataclasses import dataclass
+from typing import Callable, Optional, Sequence
+
+import msgspec
+
+logger = logging.getLogger(__name__)
+
+# Sorted keys, so inputs that only differ in key order hash the same
+canonical_encoder = msgspec.json.Encoder(order='sorted')
+
+@dataclass
+class Cacheable:
+    """Declares that an extension's results may be served from the result cache.
+
+    Only extensions without side effects should declare this. `version` is part of
+    the key, so bumping it invalidates earlier results. `secret_inputs` name inputs
+    (API keys, tokens) that must never be stored in the key as they are. `when`
+    optionally decides per result whether it is worth keeping (e.g. not when empty).
+    `bypass_input` names a boolean input that, when true, skips the cache entirely.
+    `volatile_outputs` name result keys that describe one call (latency, cache
+    state) and are left out of the stored result, also in the items of its lists.
+    """
+    name: str
+    version: str = '1'
+    secret_inputs: Sequence[str] = ()
+    ttl: Optional[int] = None
+    when: Optional[Callable] = None
+    bypass_input: Optional[str] = None
+    volatile_outputs: Sequence[str] = ()
+
+def fingerprint(value):
+    return hashlib.sha256(str(value).encode()).hexdigest()[:16]
+
+class ResultCache:
+    """Content-addressed cache of extension results in Redis.
+
+    Entries expire after their TTL. Each extension also has a byte budget: the
+    sizes of its entries are tracked in a sorted set by write time, and the
+    oldest entries are evicted once the total goes over EXTENSION_CACHE_MAX_BYTES.
+    """
+
+    def __init__(self, redis, settings, cacheable):
+        self.redis = redis
+        self.settings = settings
+        self.cacheable = cacheable
+        self.ttl = cacheable.ttl or settings.cache_ttl
+        self.prefix = f"extension:cache:{cacheable.name}"
+        self.index = f"{self.prefix}:index"
+        self.sizes = f"{self.prefix}:sizes"
+        self.total = f"{self.prefix}:bytes"
+
+    def key(self, inputs):
+        normalized = dict(inputs)
+        for name in self.cacheable.secret_inputs:
+            if name not in normalized:
+                continue
+            if self.settings.cache_share_across_keys:
+                # Results are shared by everyone calling with the same non-secret inputs
+                del normalized[name]
+            else:
+                # Results stay scoped to the credential without the credential itself being hashed in
+                normalized[name] = fingerprint(normalized[name])
+        digest = hashlib.sha256(
+            canonical_encoder.encode([self.cacheable.name, self.cacheable.version, normalized])
+        ).hexdigest()
+        return f"{self.prefix}:{digest}"
+
+    def bypassed(self, inputs):
+        return bool(self.cacheable.bypass_input and inputs.get(self.cacheable.bypass_input) in (True, 'true'))
+
+    def storable(self, result):
+        volatile = set(self.cacheable.volatile_outputs)
+        if not volatile or not isinstance(result, dict):
+            return result
+        strip = lambda value: {key: item for key, item in value.items() if key not in volatile}
+        return {
+            key: [strip(item) if isinstance(item, dict) else item for item in value] if isinstance(value, list) else value
+            for key, value in strip(result).items()
+        }
+
+    def keeps(self, result):
+        return self.cacheable.when is None or self.cacheable.when(result)
+
+    async def get(self, key):
+        try:
+            return await self.redis.get(key)
+        except Exception as e:
+            logger.warning(f"Result cache lookup failed: {str(e)}")
+            return None
+
+    async def set(self, key, payload):
+        if len(payload) > self.settings.cache_max_entry_bytes:
+            return
+        try:
+            previous = await self.redis.hget(self.sizes, key)
+            pipeline = self.redis.pipeline(transaction=True)
+            pipeline.set(key, payload, ex=self.ttl)
+            pipeline.zadd(self.index, {key: time.time()})
+            pipeline.hset(self.sizes, key, len(payload))
+            pipeline.incrby(self.total, len(payload) - int(previous or 0))
+            total = (await pipeline.execute())[-1]
+            await self.evict(total)
+        except Exception as e:
+            logger.warning(f"Result cache write failed: {str(e)}")
+
+    async def forget(self, keys):
+        sizes = await self.redis.hmget(self.sizes, keys)
+        freed = sum(int(size or 0) for size in sizes)
+        pipeline = self.redis.pipeline(transaction=True)
+        pipeline.delete(*keys)
+        pipeline.zrem(self.index, *keys)
+        pipeline.hdel(self.sizes, *keys)
+        pipeline.decrby(self.total, freed)
+        return (await pipeline.execute())[-1]
+
+    async def evict(self, total):
+        # Entries that already expired still count until they are dropped from the index
+        expired = await self.redis.zrangebyscore(self.index, '-inf', time.time() - self.ttl)
+        if expired:
+            total = await self.forget(expired)
+        evicted = 0
+        while total > self.settings.cache_max_bytes:
+            oldest = [key for key, _ in await self.redis.zpopmin(self.index)]
+            if not oldest:
+                break
+            total = await self.forget(oldest)
+            evicted += 1
+        if evicted:
+            logger.info(f"Evicted {evicted} entries from the result cache")
@@ -0,0 +1,86 @@
+from typing import Any, Dict, List, Optional, Union
+
+import msgspec
+
+class DecodeError(ValueError):
+    """Raised when a message is not valid JSON or does not match its schema."""
+
+class Envelope(msgspec.Struct):
+    """Input message as published by the workflow engine; `inputs` is a list for batches."""
+    inputs: Union[Dict[str, Any], List[Any]]
+    workflowId: Optional[str] = None
+    workflowInstanceId: Optional[str] = None
+    workflowExtensionId: Optional[str] = None
+    traceparent: Optional[str] = None
+    deadline: Optional[float] = None
+    logLevels: Optional[Dict[str, str]] = None
+
+class OutputEnvelope(msgspec.Struct, omit_defaults=True):
+    """Output message published to REDIS_CHANNEL_OUT, for consumers of the output channel."""
+    type: str
+    workflowInstanceId: Optional[str] = None
+    workflowExtensionId: Optional[str] = None
+    workflowId: Optional[str] = None
+    output: Any = None
+    outputRef: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    traceparent: Optional[str] = None
+
+class Message(str):
+    """The raw input message, carrying the envelope the runtime already decoded.
+
+    Handlers still receive a plain string they can json.loads, but decode_envelope()
+    and decode_inputs() on it cost nothing.
+    """
+
+    def __new__(cls, raw, envelope):
+        message = super().__new__(cls, raw)
+        message.envelope = envelope
+        return message
+
+    def __reduce__(self):
+        # Keeps the decoded envelope when the message is sent to a process or forked worker
+        return (Message, (str(self), self.envelope))
+
+encoder = msgspec.json.Encoder()
+envelope_decoder = msgspec.json.Decoder(Envelope)
+output_decoder = msgspec.json.Decoder(OutputEnvelope)
+decoders = {}
+
+def encode(value):
+    return encoder.encode(value)
+
+def decode(data, type=Any):
+    """Decodes JSON into `type` in a single pass, validating as it goes.
+
+    With a msgspec Struct as `type`, only the declared fields are materialized and
+    the rest of the document is skipped, which is much faster on large payloads.
+    """
+    if type not in decoders:
+        decoders[type] = msgspec.json.Decoder(type)
+    try:
+        return decoders[type].decode(data)
+    except msgspec.DecodeError as e:
+        raise DecodeError(str(e))
+
+def convert(value, type):
+    """Validates an already decoded value (e.g. a nested object) against `type`."""
+    try:
+        return msgspec.convert(value, type)
+    except msgspec.ValidationError as e:
+        raise DecodeError(str(e))
+
+def decode_envelope(message):
+    envelope = getattr(message, 'envelope', None)
+    if envelope is not None:
+        return envelope
+    try:
+        return envelope_decoder.decode(message)
+    except msgspec.DecodeError as e:
+        raise DecodeError(f"Invalid input message: {str(e)}")
+
+def decode_inputs(message):
+    return decode_envelope(message).inputs
+
+def decode_output(data):
+    return output_decoder.decode(data)
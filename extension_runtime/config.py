@@ -0,0 +1,177 @@
+import os
+import socket
+from dataclasses import dataclass
+from typing import Optional
+
+from .logs import parse_level, parse_levels
+
+REQUIRED_ENV_VARS = [
+    'REDIS_HOST_URL', 'REDIS_CHANNEL_IN', 'REDIS_CHANNEL_OUT', 'REDIS_CHANNEL_READY'
+]
+
+def env_flag(name, default=False):
+    return os.getenv(name, 'true' if default else 'false').lower() == 'true'
+
+def env_int(name, default):
+    value = os.getenv(name)
+    if not value:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"Environment variable {name} must be an integer, got {value!r}")
+
+def env_float(name, default):
+    value = os.getenv(name)
+    if not value:
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        raise ValueError(f"Environment variable {name} must be a number, got {value!r}")
+
+@dataclass
+class Settings:
+    workflow_id: Optional[str]
+    workflow_instance_id: Optional[str]
+    workflow_extension_id: Optional[str]
+    redis_host_url: str
+    redis_username: Optional[str]
+    redis_password: Optional[str]
+    channel_in: str
+    channel_out: str
+    channel_ready: str
+    persistent: bool
+    max_concurrency: int
+    batch_concurrency: int
+    executor: str
+    transport: str
+    stream_group: str
+    stream_consumer: str
+    stream_claim_idle_ms: int
+    stream_max_deliveries: int
+    offload_threshold: int
+    offload_ttl: int
+    offload_store: str
+    offload_dir: str
+    include_debug: bool
+    metrics_port: int
+    metrics_key: Optional[str]
+    output_timings: bool
+    service_name: str
+    trace_file: Optional[str]
+    trace_endpoint: Optional[str]
+    cache: bool
+    cache_ttl: int
+    cache_max_bytes: int
+    cache_max_entry_bytes: int
+    cache_share_across_keys: bool
+    result_ttl: int
+    rate_limit: bool
+    rate_limit_rpm: int
+    rate_limit_tpm: int
+    timeout: int
+    llm_retries: int
+    llm_latency_budget_ms: int
+    llm_hedge: bool
+    log_format: str
+    log_level: int
+    log_levels: dict
+    log_queue_size: int
+    log_max_message_length: int
+    verbose_sample_rate: float
+    verbose_per_minute: int
+    validate_inputs: bool
+    progress_interval_ms: int
+    response_cache: bool
+    response_cache_max_bytes: int
+    response_cache_path: Optional[str]
+    response_cache_ttl: int
+    response_cache_disk_max_bytes: int
+
+    @classmethod
+    def from_env(cls, channel_prefix=''):
+        # Read at startup rather than import time so extensions can load_dotenv() first.
+        # The host gives every extension its own channels, e.g. CLAUDEAPI_REDIS_CHANNEL_IN
+        required = [channel_prefix + var if var.startswith('REDIS_CHANNEL') else var for var in REQUIRED_ENV_VARS]
+        missing_env_vars = [var for var in required if not os.getenv(var)]
+        if missing_env_vars:
+            raise ValueError(f"Missing required environment variables: {', '.join(missing_env_vars)}")
+
+        executor = os.getenv('EXTENSION_EXECUTOR', 'thread').lower()
+        if executor not in ('thread', 'process', 'fork'):
+            raise ValueError("EXTENSION_EXECUTOR must be 'thread', 'process' or 'fork'")
+
+        transport = os.getenv('EXTENSION_TRANSPORT', 'pubsub').lower()
+        if transport not in ('pubsub', 'streams'):
+            raise ValueError("EXTENSION_TRANSPORT must be either 'pubsub' or 'streams'")
+
+        offload_store = os.getenv('EXTENSION_OFFLOAD_STORE', 'redis').lower()
+        if offload_store not in ('redis', 'file'):
+            raise ValueError("EXTENSION_OFFLOAD_STORE must be either 'redis' or 'file'")
+
+        log_format = os.getenv('EXTENSION_LOG_FORMAT', 'json').lower()
+        if log_format not in ('json', 'text'):
+            raise ValueError("EXTENSION_LOG_FORMAT must be either 'json' or 'text'")
+        log_level = parse_level(os.getenv('EXTENSION_LOG_LEVEL', 'INFO'))
+        if log_level is None:
+            raise ValueError("EXTENSION_LOG_LEVEL must be a level name such as 'INFO' or 'DEBUG'")
+
+        return cls(
+            workflow_id=os.getenv('WORKFLOW_ID'),
+            workflow_instance_id=os.getenv('WORKFLOW_INSTANCE_ID'),
+            workflow_extension_id=os.getenv('WORKFLOW_EXTENSION_ID'),
+            redis_host_url=os.getenv('REDIS_HOST_URL'),
+            redis_username=os.getenv('REDIS_USERNAME'),
+            redis_password=os.getenv('REDIS_PASSWORD'),
+            channel_in=os.getenv(f'{channel_prefix}REDIS_CHANNEL_IN'),
+            channel_out=os.getenv(f'{channel_prefix}REDIS_CHANNEL_OUT'),
+            channel_ready=os.getenv(f'{channel_prefix}REDIS_CHANNEL_READY'),
+            persistent=env_flag('EXTENSION_PERSISTENT'),
+            max_concurrency=max(1, env_int('EXTENSION_MAX_CONCURRENCY', 10)),
+            batch_concurrency=max(1, env_int('EXTENSION_BATCH_CONCURRENCY', 10)),
+            executor=executor,
+            transport=transport,
+            stream_group=os.getenv('EXTENSION_STREAM_GROUP', 'workers'),
+            stream_consumer=os.getenv('EXTENSION_STREAM_CONSUMER') or f"{socket.gethostname()}-{os.getpid()}",
+            stream_claim_idle_ms=env_int('EXTENSION_STREAM_CLAIM_IDLE_MS', 60000),
+            stream_max_deliveries=env_int('EXTENSION_STREAM_MAX_DELIVERIES', 5),
+            offload_threshold=env_int('EXTENSION_OFFLOAD_THRESHOLD', 0),
+            offload_ttl=env_int('EXTENSION_OFFLOAD_TTL', 3600),
+            offload_store=offload_store,
+            offload_dir=os.getenv('EXTENSION_OFFLOAD_DIR', '/tmp/extension-outputs'),
+            include_debug=env_flag('EXTENSION_INCLUDE_DEBUG'),
+            metrics_port=env_int('EXTENSION_METRICS_PORT', 0),
+            metrics_key=os.getenv('EXTENSION_METRICS_KEY'),
+            output_timings=env_flag('EXTENSION_OUTPUT_TIMINGS'),
+            service_name=os.getenv('EXTENSION_SERVICE_NAME') or os.getenv('WORKFLOW_EXTENSION_ID') or 'extension',
+            trace_file=os.getenv('EXTENSION_TRACE_FILE'),
+            trace_endpoint=os.getenv('EXTENSION_TRACE_ENDPOINT'),
+            cache=env_flag('EXTENSION_CACHE'),
+            cache_ttl=env_int('EXTENSION_CACHE_TTL', 3600),
+            cache_max_bytes=env_int('EXTENSION_CACHE_MAX_BYTES', 67108864),
+            cache_max_entry_bytes=env_int('EXTENSION_CACHE_MAX_ENTRY_BYTES', 1048576),
+            cache_share_across_keys=env_flag('EXTENSION_CACHE_SHARE_ACROSS_KEYS'),
+            result_ttl=env_int('EXTENSION_RESULT_TTL', 86400),
+            rate_limit=env_flag('EXTENSION_RATE_LIMIT', default=True),
+            rate_limit_rpm=env_int('EXTENSION_RATE_LIMIT_RPM', 0),
+            rate_limit_tpm=env_int('EXTENSION_RATE_LIMIT_TPM', 0),
+            timeout=env_int('EXTENSION_TIMEOUT', 0),
+            llm_retries=max(0, env_int('EXTENSION_LLM_RETRIES', 2)),
+            llm_latency_budget_ms=env_int('EXTENSION_LLM_LATENCY_BUDGET_MS', 0),
+            llm_hedge=env_flag('EXTENSION_LLM_HEDGE'),
+            log_format=log_format,
+            log_level=log_level,
+            log_levels=parse_levels(os.getenv('EXTENSION_LOG_LEVELS')),
+            log_queue_size=max(1, env_int('EXTENSION_LOG_QUEUE_SIZE', 10000)),
+            log_max_message_length=env_int('EXTENSION_LOG_MAX_MESSAGE_LENGTH', 16384),
+            verbose_sample_rate=env_float('EXTENSION_VERBOSE_SAMPLE_RATE', 0.05),
+            verbose_per_minute=env_int('EXTENSION_VERBOSE_PER_MINUTE', 2),
+            validate_inputs=env_flag('EXTENSION_VALIDATE_INPUTS', default=True),
+            progress_interval_ms=max(0, env_int('EXTENSION_PROGRESS_INTERVAL_MS', 100)),
+            response_cache=env_flag('EXTENSION_RESPONSE_CACHE'),
+            response_cache_max_bytes=env_int('EXTENSION_RESPONSE_CACHE_MAX_BYTES', 33554432),
+            response_cache_path=os.getenv('EXTENSION_RESPONSE_CACHE_PATH'),
+            response_cache_ttl=env_int('EXTENSION_RESPONSE_CACHE_TTL', 604800),
+            response_cache_disk_max_bytes=env_int('EXTENSION_RESPONSE_CACHE_DISK_MAX_BYTES', 536870912)
+        )
@@ -0,0 +1,43 @@
+import time
+import asyncio
+import contextvars
+
+# time.monotonic() by which the current message must be done, or None
+current_deadline = contextvars.ContextVar('current_deadline', default=None)
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+def resolve_deadline(envelope, settings):
+    """Turns the envelope's `deadline` (Unix time in ms) or EXTENSION_TIMEOUT into a monotonic deadline."""
+    deadlines = []
+    if getattr(envelope, 'deadline', None) is not None:
+        deadlines.append(time.monotonic() + envelope.deadline / 1000 - time.time())
+    if settings.timeout:
+        deadlines.append(time.monotonic() + settings.timeout)
+    return min(deadlines) if deadlines else None
+
+def remaining(default=None):
+    """Seconds left until the message's deadline, at most `default`.
+
+    Meant as the timeout of outbound calls, e.g. `requests.get(url, timeout=remaining(30))`,
+    so that calls the runtime cannot cancel (on threads) still end by the deadline.
+    """
+    deadline = current_deadline.get()
+    if deadline is None:
+        return default
+    # Never 0: some clients read a zero timeout as non-blocking or as no timeout at all
+    left = max(0.001, deadline - time.monotonic())
+    return left if default is None else min(default, left)
+
+async def until_deadline(awaitable, deadline):
+    """Awaits `awaitable`, cancelling it and raising DeadlineExceeded once `deadline` passes."""
+    if deadline is None:
+        return await awaitable
+    try:
+        return await asyncio.wait_for(awaitable, max(0.0, deadline - time.monotonic()))
+    except asyncio.TimeoutError:
+        if time.monotonic() < deadline:
+            # Raised by the handler itself, e.g. an HTTP client timeout
+            raise
+        raise DeadlineExceeded("Deadline exceeded")
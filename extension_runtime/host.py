@@ -0,0 +1,167 @@
+"""Runs several extensions in one process, sharing the event loop, Redis and the LLM clients.
+
+Usage: python -m extension_runtime.host Apprise ClaudeAPI CurrencyExchange GitHub-AddIssueComment
+
+Every extension keeps its own channels, read from <NAME>_REDIS_CHANNEL_IN,
+<NAME>_REDIS_CHANNEL_OUT and <NAME>_REDIS_CHANNEL_READY (e.g. CLAUDEAPI_REDIS_CHANNEL_IN).
+All other settings are shared, and the rate limiter and LLM layer are installed once
+for all of them.
+"""
+import sys
+import asyncio
+import logging
+import argparse
+import dataclasses
+
+from . import llm, logs, ratelimit
+from .config import Settings
+from .metrics import MetricsServer
+from .registry import env_prefix, load_extension
+from .startup import elapsed_ms, preload_modules
+from .tracing import install_log_context
+from .transport import create_transport
+from .worker import Dispatcher, connect_to_redis, consume
+
+logger = logging.getLogger(__name__)
+
+class RoutedTransport:
+    """Input of one hosted extension, fed by the host's shared subscription."""
+
+    def __init__(self):
+        self.queue = asyncio.Queue()
+
+    async def start(self):
+        pass
+
+    async def messages(self):
+        while True:
+            yield None, await self.queue.get()
+
+    async def ack(self, message_id):
+        pass
+
+    def release(self, message_id):
+        pass
+
+    async def close(self):
+        pass
+
+class ChannelRouter:
+    """Subscribes to the input channels of every hosted extension on a single connection.
+
+    Each message is queued for the extension that owns its channel, so a busy
+    extension never holds up the others.
+    """
+
+    def __init__(self, redis):
+        self.redis = redis
+        self.routes = {}
+        self.pubsub = None
+
+    def route(self, channel):
+        self.routes[channel] = RoutedTransport()
+        return self.routes[channel]
+
+    async def start(self):
+        self.pubsub = self.redis.pubsub()
+        await self.pubsub.subscribe(*self.routes)
+        logger.info(f"Subscribed to input channels: {', '.join(self.routes)}")
+
+    async def run(self):
+        async for message in self.pubsub.listen():
+            if message['type'] == 'message':
+                channel = message['channel']
+                self.routes[channel.decode() if isinstance(channel, bytes) else channel].queue.put_nowait(message['data'])
+
+    async def close(self):
+        if self.pubsub is not None:
+            await self.pubsub.unsubscribe()
+            await self.pubsub.close()
+
+def hosted_settings(name):
+    settings = Settings.from_env(channel_prefix=env_prefix(name))
+    return dataclasses.replace(
+        settings,
+        service_name=name,
+        # The host is long-lived by nature, and handlers loaded from several main.py files
+        # cannot be pickled into a process pool or zygote
+        persistent=True,
+        executor='thread',
+        metrics_key=f"{settings.metrics_key}:{name}" if settings.metrics_key else None
+    )
+
+async def serve_host(directories):
+    registrations = [load_extension(directory) for directory in directories]
+    settings = {registration.name: hosted_settings(registration.name) for registration in registrations}
+    first = settings[registrations[0].name]
+    # One writer for all extensions; the host never forks, so it can start right away
+    logs.install(first)
+    logs.start()
+    redis = connect_to_redis(first)
+    # Process-wide, so installed once: everything but the channels comes from the same variables anyway
+    ratelimit.install(first, redis)
+    llm.install(first)
+    router = ChannelRouter(redis)
+
+    dispatchers, transports = [], []
+    for registration in registrations:
+        extension_settings = settings[registration.name]
+        if extension_settings.transport == 'streams':
+            transport = create_transport(redis, extension_settings)
+        else:
+            transport = router.route(extension_settings.channel_in)
+        transports.append(transport)
+        dispatchers.append(Dispatcher(registration.handler, redis, transport, extension_settings, **registration.options))
+
+    # One /metrics endpoint for all extensions, labelled by service
+    metrics_server = None
+    if first.metrics_port:
+        metrics_server = MetricsServer(first.metrics_port, [dispatcher.metrics for dispatcher in dispatchers])
+        await metrics_server.start()
+    install_log_context()
+    if router.routes:
+        await router.start()
+    for transport in transports:
+        await transport.start()
+    for dispatcher in dispatchers:
+        await redis.publish(dispatcher.settings.channel_ready, '')
+    logger.info(f"Published READY for {len(dispatchers)} extensions {elapsed_ms()} ms after startup")
+
+    async def preload():
+        for registration in registrations:
+            await preload_modules(registration.options['preload'], registration.options['warmup'])
+
+    tasks = [asyncio.create_task(preload())]
+    if router.routes:
+        tasks.append(asyncio.create_task(router.run()))
+    tasks += [
+        asyncio.create_task(consume(dispatcher, transport, persistent=True))
+        for dispatcher, transport in zip(dispatchers, transports)
+    ]
+    try:
+        # The consumers only return when their transport fails
+        await asyncio.gather(*tasks[1:])
+    finally:
+        for task in tasks:
+            task.cancel()
+        for dispatcher in dispatchers:
+            await dispatcher.drain()
+        if metrics_server is not None:
+            await metrics_server.close()
+        for transport in transports:
+            await transport.close()
+        await router.close()
+        await redis.close()
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog='python -m extension_runtime.host', description=__doc__.splitlines()[0])
+    parser.add_argument('directories', nargs='+', help='Extension folders, each with a main.py')
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve_host(args.directories))
+    finally:
+        logs.stop()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
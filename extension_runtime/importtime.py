@@ -0,0 +1,74 @@
+import sys
+import json
+import argparse
+import subprocess
+
+def parse_importtime(output):
+    # Lines look like: "import time:       self [us] |  cumulative | imported package"
+    imports = []
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        imports.append({
+            "module": name.strip(),
+            "depth": (len(name) - len(name.lstrip())) // 2,
+            "self_ms": int(self_us) / 1000,
+            "cumulative_ms": int(cumulative_us) / 1000
+        })
+    return imports
+
+def import_report(path, top=20, preload=()):
+    """Runs `python -X importtime` on an extension's main.py (without starting it) and
+    returns the modules that dominate its startup."""
+    code = (
+        "import runpy, importlib, sys\n"
+        f"runpy.run_path({path!r}, run_name='extension_import_report')\n"
+        f"for module in {list(preload)!r}: importlib.import_module(module)\n"
+    )
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], capture_output=True, text=True)
+    imports = parse_importtime(result.stderr)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else 'import failed')
+
+    # Packages can lazily import their submodules after their own import has finished,
+    # which shows up as further depth 0 entries, so those are grouped by package
+    packages = {}
+    for entry in imports:
+        if entry['depth'] == 0:
+            package = entry['module'].split('.')[0]
+            packages[package] = packages.get(package, 0) + entry['cumulative_ms']
+    top_level = [{"module": package, "cumulative_ms": round(ms, 3)} for package, ms in packages.items()]
+    return {
+        "path": path,
+        "total_ms": round(sum(packages.values()), 1),
+        "top_level": sorted(top_level, key=lambda entry: entry['cumulative_ms'], reverse=True)[:top],
+        "self": sorted(imports, key=lambda entry: entry['self_ms'], reverse=True)[:top]
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m extension_runtime.importtime',
+        description="Report which imports dominate an extension's startup."
+    )
+    parser.add_argument('path', help="Path to the extension's main.py")
+    parser.add_argument('--top', type=int, default=20)
+    parser.add_argument('--preload', nargs='*', default=[], help='Also import these modules, e.g. the ones preloaded after READY')
+    parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+    args = parser.parse_args(argv)
+
+    report = import_report(args.path, args.top, args.preload)
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"Import time of {report['path']}: {report['total_ms']} ms")
+    print("\nPackages by cumulative time:")
+    for entry in report['top_level']:
+        print(f"  {entry['cumulative_ms']:>10.1f} ms  {entry['module']}")
+    print("\nModules by self time:")
+    for entry in report['self']:
+        print(f"  {entry['self_ms']:>10.1f} ms  {entry['module']}")
+
+if __name__ == "__main__":
+    main()
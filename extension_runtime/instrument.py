@@ -0,0 +1,101 @@
+import sys
+import time
+import functools
+from urllib.parse import urlsplit
+
+from .metrics import record_external
+from .tracing import KIND_CLIENT, current_span
+
+# Each describer returns (method, url) from the arguments of the wrapped method
+def describe_send(client, request, *args, **kwargs):
+    return request.method, str(request.url)
+
+def describe_aiohttp(session, method, url, *args, **kwargs):
+    return method, str(url)
+
+def describe_httplib2(http, uri, method='GET', *args, **kwargs):
+    return method, uri
+
+def response_status(response):
+    # httplib2 returns (response, content); the others return the response
+    if isinstance(response, tuple) and response:
+        response = response[0]
+    return getattr(response, 'status_code', None) or getattr(response, 'status', None)
+
+def start_span(describe, args, kwargs):
+    parent = current_span.get()
+    if parent is None:
+        return None
+    try:
+        method, url = describe(*args, **kwargs)
+    except Exception:
+        method, url = 'GET', ''
+    parts = urlsplit(url)
+    return parent.child(f"HTTP {method} {parts.hostname or ''}".strip(), KIND_CLIENT, {
+        "http.request.method": method,
+        "server.address": parts.hostname,
+        "url.full": parts._replace(query='', fragment='').geturl()
+    })
+
+def finish_span(span, started, response=None, error=None):
+    record_external(time.perf_counter() - started)
+    if span is None:
+        return
+    status = response_status(response) if response is not None else None
+    if status is not None:
+        span.attributes["http.response.status_code"] = int(status)
+    if error is None and status is not None and int(status) >= 400:
+        error = f"HTTP {status}"
+    span.finish(error=error)
+
+def instrumented_sync(function, describe):
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        started, span = time.perf_counter(), start_span(describe, args, kwargs)
+        try:
+            response = function(*args, **kwargs)
+        except BaseException as e:
+            finish_span(span, started, error=str(e) or type(e).__name__)
+            raise
+        finish_span(span, started, response)
+        return response
+    wrapper.extension_instrumented = True
+    return wrapper
+
+def instrumented_async(function, describe):
+    @functools.wraps(function)
+    async def wrapper(*args, **kwargs):
+        started, span = time.perf_counter(), start_span(describe, args, kwargs)
+        try:
+            response = await function(*args, **kwargs)
+        except BaseException as e:
+            finish_span(span, started, error=str(e) or type(e).__name__)
+            raise
+        finish_span(span, started, response)
+        return response
+    wrapper.extension_instrumented = True
+    return wrapper
+
+# (module, class, method, wrapper, describer) for the HTTP clients the extensions use,
+# directly or through SDKs: anthropic/openai use httpx, googleapiclient uses httplib2
+HTTP_CLIENTS = [
+    ('requests', 'Session', 'send', instrumented_sync, describe_send),
+    ('httpx', 'Client', 'send', instrumented_sync, describe_send),
+    ('httpx', 'AsyncClient', 'send', instrumented_async, describe_send),
+    ('aiohttp', 'ClientSession', '_request', instrumented_async, describe_aiohttp),
+    ('httplib2', 'Http', 'request', instrumented_sync, describe_httplib2)
+]
+
+def instrument_http():
+    """Wraps the send method of every HTTP client library that has been imported so far.
+
+    Each call is timed as the message's `external` phase and recorded as a client
+    span. Extensions import their libraries lazily, so this runs again before every
+    message; already wrapped methods are left alone.
+    """
+    for module_name, class_name, method_name, wrap, describe in HTTP_CLIENTS:
+        module = sys.modules.get(module_name)
+        cls = getattr(module, class_name, None) if module else None
+        method = getattr(cls, method_name, None) if cls else None
+        if method is not None and not getattr(method, 'extension_instrumented', False):
+            setattr(cls, method_name, wrap(method, describe))
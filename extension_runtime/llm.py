@@ -0,0 +1,454 @@
+import time
+import random
+import asyncio
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+from .deadline import remaining
+from .ratelimit import estimate_tokens, langchain_rate_limiter, limit_async
+from .responses import ResponseCache
+
+logger = logging.getLogger(__name__)
+
+# Timeouts, conflicts, rate limits and server errors (529 is Anthropic's "overloaded")
+RETRY_STATUSES = {408, 409, 429, 500, 502, 503, 504, 529}
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 8.0
+# Without a deadline, no single request may take longer than this
+REQUEST_TIMEOUT = 600
+MAX_CLIENTS = 64
+# Anthropic prompt caching; the prefix up to a marked block is kept for five minutes after its last use
+EPHEMERAL = {"type": "ephemeral"}
+# Bulk prompts: further attempts of a prompt that is still rate limited after call_model's retries
+BULK_RETRIES = 5
+# Message Batches take minutes to hours; they are polled at this interval (seconds)
+BATCH_POLL_INTERVAL = 30
+# After this many failures in a row, a model with a fallback is skipped for COOLDOWN seconds
+FAILURE_THRESHOLD = 3
+COOLDOWN = 30
+
+@dataclass
+class Completion:
+    text: str
+    model: str
+    provider: str
+    input_tokens: int = 0
+    output_tokens: int = 0
+    latency: float = 0.0
+    # Seconds to the first streamed chunk
+    ttft: Optional[float] = None
+    attempts: int = 1
+    fallback: bool = False
+    # Prompt tokens read from and written to the provider's prompt cache
+    cache_read_tokens: int = 0
+    cache_write_tokens: int = 0
+    # 'memory' or 'disk' when answered from the response cache
+    cached: Optional[str] = None
+
+# Installed by the runtime at startup
+settings = None
+responses = None
+clients = OrderedDict()
+failures = {}
+
+def install(runtime_settings):
+    global settings, responses
+    settings = runtime_settings
+    responses = ResponseCache(runtime_settings) if runtime_settings.response_cache else None
+
+def provider_for(model):
+    if model.startswith('claude-'):
+        return 'anthropic'
+    if model.startswith(('gpt-', 'o1', 'o3', 'chatgpt-')):
+        return 'openai'
+    raise ValueError(f"Unsupported model: {model}")
+
+def api_key_for(model, api_keys):
+    provider = provider_for(model)
+    api_key = (api_keys or {}).get(provider)
+    if not api_key:
+        raise ValueError(f"{'Anthropic' if provider == 'anthropic' else 'OpenAI'} API key is required for {model}")
+    return provider, api_key
+
+def get_client(provider, api_key):
+    """Returns the pooled async client for the provider and key, creating it on first use.
+
+    The client keeps its HTTP connections open from one message to the next. It
+    belongs to the event loop it was created on, so the loop is part of the key.
+    Retries are left to `complete`.
+    """
+    loop = asyncio.get_running_loop()
+    key = (provider, api_key, loop)
+    client = clients.get(key)
+    if client is not None:
+        clients.move_to_end(key)
+        return client
+    if provider == 'anthropic':
+        from anthropic import AsyncAnthropic
+        client = AsyncAnthropic(api_key=api_key, max_retries=0)
+    else:
+        from openai import AsyncOpenAI
+        client = AsyncOpenAI(api_key=api_key, max_retries=0)
+    clients[key] = client
+    if len(clients) > MAX_CLIENTS:
+        (_, _, evicted_loop), evicted = clients.popitem(last=False)
+        if evicted_loop is loop:
+            loop.create_task(evicted.close())
+    return client
+
+def retryable(error):
+    status = getattr(error, 'status_code', None)
+    if status is not None:
+        return status in RETRY_STATUSES
+    # APIConnectionError and APITimeoutError carry no status in either SDK
+    return any(cls.__name__ == 'APIConnectionError' for cls in type(error).__mro__)
+
+class Request:
+    """One completion request, with the streaming state shared by its attempts."""
+
+    def __init__(self, system, messages, max_tokens, temperature, on_text, cache=False):
+        self.system = system
+        self.messages = messages
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+        self.on_text = on_text
+        self.cache = cache
+        self.started = time.perf_counter()
+        self.ttft = None
+
+    @property
+    def streamed(self):
+        return self.ttft is not None
+
+    async def emit(self, text):
+        if self.ttft is None:
+            self.ttft = time.perf_counter() - self.started
+        result = self.on_text(text)
+        if asyncio.iscoroutine(result):
+            await result
+
+    def tokens(self):
+        text = (self.system or '') + ''.join(content_text(message.get('content', '')) for message in self.messages)
+        return estimate_tokens(text, self.max_tokens)
+
+def content_text(content):
+    if isinstance(content, str):
+        return content
+    return ''.join(block.get('text', '') for block in content)
+
+def as_blocks(content):
+    return [{"type": "text", "text": content}] if isinstance(content, str) else [dict(block) for block in content]
+
+def mark_prefix(messages):
+    """Copies `messages` with a cache breakpoint on the block before the last one.
+
+    Everything up to that block (e.g. a shared document ahead of the question,
+    or the earlier turns of a conversation) is the prefix that repeats across
+    requests; only the last block is new.
+    """
+    messages = [{**message, "content": as_blocks(message['content'])} for message in messages]
+    if len(messages[-1]['content']) > 1:
+        messages[-1]['content'][-2]['cache_control'] = EPHEMERAL
+    elif len(messages) > 1:
+        messages[-2]['content'][-1]['cache_control'] = EPHEMERAL
+    return messages
+
+def anthropic_params(model, request):
+    params = {
+        "model": model,
+        "max_tokens": request.max_tokens,
+        "messages": mark_prefix(request.messages) if request.cache else request.messages
+    }
+    if request.system and request.cache:
+        params["system"] = [{"type": "text", "text": request.system, "cache_control": EPHEMERAL}]
+    elif request.system:
+        params["system"] = request.system
+    if request.temperature is not None:
+        params["temperature"] = request.temperature
+    return params
+
+def anthropic_completion(message):
+    text = ''.join(block.text for block in message.content if block.type == 'text')
+    completion = Completion(text, message.model, 'anthropic', message.usage.input_tokens, message.usage.output_tokens)
+    # Older SDKs and responses without caching leave these out or None
+    completion.cache_read_tokens = getattr(message.usage, 'cache_read_input_tokens', None) or 0
+    completion.cache_write_tokens = getattr(message.usage, 'cache_creation_input_tokens', None) or 0
+    return completion
+
+async def request_anthropic(client, model, request):
+    kwargs = {**anthropic_params(model, request), "timeout": remaining(REQUEST_TIMEOUT)}
+    if request.on_text is None:
+        raw_response = await client.messages.with_raw_response.create(**kwargs)
+        message, headers = await raw_response.parse(), raw_response.headers
+    else:
+        async with client.messages.stream(**kwargs) as stream:
+            async for text in stream.text_stream:
+                await request.emit(text)
+            message, headers = await stream.get_final_message(), stream.response.headers
+    return anthropic_completion(message), headers
+
+async def request_openai(client, model, request):
+    kwargs = {
+        "model": model,
+        "max_tokens": request.max_tokens,
+        "messages": ([{"role": "system", "content": request.system}] if request.system else []) + request.messages,
+        "timeout": remaining(REQUEST_TIMEOUT)
+    }
+    if request.temperature is not None:
+        kwargs["temperature"] = request.temperature
+    if request.on_text is None:
+        raw_response = await client.chat.completions.with_raw_response.create(**kwargs)
+        # Unlike Anthropic's, the OpenAI SDK's raw response parses synchronously, even on the async client
+        response, headers = raw_response.parse(), raw_response.headers
+        text, usage, response_model = response.choices[0].message.content or '', response.usage, response.model
+    else:
+        stream = await client.chat.completions.create(**kwargs, stream=True, stream_options={"include_usage": True})
+        parts, usage, response_model = [], None, model
+        async for chunk in stream:
+            response_model = chunk.model or response_model
+            if chunk.choices and chunk.choices[0].delta.content:
+                parts.append(chunk.choices[0].delta.content)
+                await request.emit(chunk.choices[0].delta.content)
+            if chunk.usage is not None:
+                usage = chunk.usage
+        text, headers = ''.join(parts), stream.response.headers
+    input_tokens, output_tokens = (usage.prompt_tokens, usage.completion_tokens) if usage else (0, 0)
+    completion = Completion(text, response_model, 'openai', input_tokens, output_tokens)
+    # OpenAI caches long prompt prefixes on its own and only reports the hits
+    details = getattr(usage, 'prompt_tokens_details', None)
+    completion.cache_read_tokens = getattr(details, 'cached_tokens', None) or 0
+    return completion, headers
+
+REQUESTS = {'anthropic': request_anthropic, 'openai': request_openai}
+
+async def call_model(model, api_keys, request):
+    """Calls one model, retrying retryable errors with full-jitter exponential backoff."""
+    provider, api_key = api_key_for(model, api_keys)
+    client = get_client(provider, api_key)
+    retries = settings.llm_retries if settings else 2
+    for attempt in range(retries + 1):
+        try:
+            async with limit_async(api_key, model, request.tokens()) as lease:
+                completion, headers = await REQUESTS[provider](client, model, request)
+                lease.record(headers, completion.input_tokens + completion.output_tokens)
+            completion.attempts = attempt + 1
+            failures.pop(model, None)
+            return completion
+        except Exception as e:
+            # Once text has been streamed, another attempt would repeat it
+            if attempt == retries or request.streamed or not retryable(e):
+                record_failure(model)
+                raise
+            delay = remaining(random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt)))
+            logger.warning(f"{model} request failed ({type(e).__name__}: {str(e)}), retrying in {delay:.2f} s")
+            await asyncio.sleep(delay)
+
+def record_failure(model):
+    count, _ = failures.get(model, (0, 0))
+    failures[model] = (count + 1, time.monotonic() + COOLDOWN)
+
+def cooling_down(model):
+    count, until = failures.get(model, (0, 0))
+    return count >= FAILURE_THRESHOLD and time.monotonic() < until
+
+async def first_successful(tasks):
+    # Hedged requests: the first to succeed wins, the others are cancelled
+    pending, error = set(tasks), None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task
+                error = task.exception()
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
+
+async def complete(model, prompt=None, *, system=None, messages=None, max_tokens=1024, temperature=None,
+                   api_keys=None, fallback=None, on_text=None, cache=False, response_cache=True):
+    """Runs a completion on `model`, falling back to the `fallback` model if it fails or is too slow.
+
+    `api_keys` maps 'anthropic' and/or 'openai' to the keys to use. `prompt` is a
+    single user message; `messages` a whole conversation. With `on_text`, the
+    response is streamed and every chunk of text is passed to it as it arrives.
+    With `cache`, Anthropic requests mark the system prompt and the shared prefix
+    of the messages (see mark_prefix) for prompt caching.
+
+    Calls with temperature 0 are deterministic enough to be answered from the
+    response cache, unless `response_cache` is False. Only the model's own
+    answers are stored, never the fallback's.
+
+    The fallback takes over when the primary model fails after its retries, has
+    failed repeatedly in the last COOLDOWN seconds, or has not answered (or
+    started streaming) within EXTENSION_LLM_LATENCY_BUDGET_MS. With
+    EXTENSION_LLM_HEDGE=true, an unstreamed request keeps running past the budget
+    and races the fallback instead.
+    """
+    request = Request(system, messages or [{"role": "user", "content": prompt}], max_tokens, temperature, on_text, cache)
+    budget = settings.llm_latency_budget_ms / 1000 if settings and settings.llm_latency_budget_ms else None
+    hedge = settings.llm_hedge if settings else False
+
+    key = None
+    if responses is not None and response_cache and temperature == 0:
+        provider, api_key = api_key_for(model, api_keys)
+        key = responses.key(provider, model, api_key, request)
+        completion = await responses.get(key, Completion)
+        if completion is not None:
+            if on_text is not None:
+                await request.emit(completion.text)
+            completion.latency = time.perf_counter() - request.started
+            completion.ttft = request.ttft
+            return completion
+
+    if fallback is None:
+        completion = await call_model(model, api_keys, request)
+    elif cooling_down(model):
+        logger.warning(f"{model} keeps failing, using {fallback} for now")
+        completion = await call_model(fallback, api_keys, request)
+        completion.fallback = True
+    else:
+        primary = asyncio.create_task(call_model(model, api_keys, request))
+        try:
+            if budget is not None:
+                await asyncio.wait({primary}, timeout=budget)
+        except asyncio.CancelledError:
+            primary.cancel()
+            raise
+        if primary.done() or budget is None or request.streamed:
+            try:
+                completion = await primary
+            except Exception as e:
+                if request.streamed:
+                    raise
+                logger.warning(f"{model} failed ({type(e).__name__}: {str(e)}), falling back to {fallback}")
+                completion = await call_model(fallback, api_keys, request)
+                completion.fallback = True
+        elif hedge and on_text is None:
+            logger.warning(f"{model} exceeded its {budget} s latency budget, hedging with {fallback}")
+            secondary = asyncio.create_task(call_model(fallback, api_keys, request))
+            winner = await first_successful([primary, secondary])
+            completion = winner.result()
+            completion.fallback = winner is secondary
+        else:
+            primary.cancel()
+            record_failure(model)
+            logger.warning(f"{model} exceeded its {budget} s latency budget, falling back to {fallback}")
+            completion = await call_model(fallback, api_keys, request)
+            completion.fallback = True
+    completion.latency = time.perf_counter() - request.started
+    completion.ttft = request.ttft
+    if key is not None and not completion.fallback:
+        await responses.set(key, completion)
+    return completion
+
+class AdaptiveLimit:
+    """Bounds the requests in flight: a 429 halves the bound, each success raises it by one up to `limit`."""
+
+    def __init__(self, limit):
+        self.max = self.limit = max(1, limit)
+        self.active = 0
+        self.condition = asyncio.Condition()
+
+    async def __aenter__(self):
+        async with self.condition:
+            await self.condition.wait_for(lambda: self.active < self.limit)
+            self.active += 1
+
+    async def __aexit__(self, exc_type, exc, traceback):
+        async with self.condition:
+            self.active -= 1
+            if exc_type is None and self.limit < self.max:
+                self.limit += 1
+            self.condition.notify_all()
+
+    def throttle(self):
+        self.limit = max(1, self.limit // 2)
+
+async def complete_many(model, prompts, *, concurrency=8, **kwargs):
+    """Runs complete() for every prompt, at most `concurrency` at a time, and returns the results in order.
+
+    A failed prompt gets its exception in place of its Completion. Prompts that are
+    still rate limited after their retries back off and try again, and the
+    number in flight shrinks until the provider stops answering 429.
+    """
+    limit = AdaptiveLimit(concurrency)
+
+    async def complete_one(prompt):
+        for attempt in range(BULK_RETRIES + 1):
+            try:
+                async with limit:
+                    return await complete(model, prompt, **kwargs)
+            except Exception as e:
+                if getattr(e, 'status_code', None) != 429 or attempt == BULK_RETRIES:
+                    raise
+                limit.throttle()
+            await asyncio.sleep(remaining(random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** (attempt + 1)))))
+
+    return await asyncio.gather(*(complete_one(prompt) for prompt in prompts), return_exceptions=True)
+
+async def complete_batch(model, prompts, *, system=None, max_tokens=1024, temperature=None, api_keys=None,
+                         cache=False, poll_interval=None):
+    """Runs the prompts through Anthropic's Message Batches API and polls until the batch has ended.
+
+    Half the price of complete_many(), for jobs that can wait: a batch may take
+    up to 24 hours. Returns a Completion or an exception per prompt, in order. If
+    the message is cancelled (e.g. at its deadline), so is the batch.
+    """
+    poll_interval = BATCH_POLL_INTERVAL if poll_interval is None else poll_interval
+    provider, api_key = api_key_for(model, api_keys)
+    if provider != 'anthropic':
+        raise ValueError(f"The Message Batches API is only used for Anthropic models, not {model}")
+    client = get_client(provider, api_key)
+    requests = [
+        {"custom_id": str(index), "params": anthropic_params(model, Request(
+            system, [{"role": "user", "content": prompt}], max_tokens, temperature, None, cache
+        ))}
+        for index, prompt in enumerate(prompts)
+    ]
+    started = time.perf_counter()
+    batch = await client.messages.batches.create(requests=requests, timeout=remaining(REQUEST_TIMEOUT))
+    logger.info(f"Submitted {len(requests)} prompts as message batch {batch.id}")
+    try:
+        while batch.processing_status != 'ended':
+            await asyncio.sleep(remaining(poll_interval))
+            batch = await client.messages.batches.retrieve(batch.id, timeout=remaining(REQUEST_TIMEOUT))
+    except asyncio.CancelledError:
+        logger.warning(f"Cancelling message batch {batch.id}")
+        await asyncio.shield(client.messages.batches.cancel(batch.id))
+        raise
+
+    results = [RuntimeError(f"No result for request {request['custom_id']} in message batch {batch.id}") for request in requests]
+    async for entry in await client.messages.batches.results(batch.id, timeout=remaining(REQUEST_TIMEOUT)):
+        if entry.result.type == 'succeeded':
+            completion = anthropic_completion(entry.result.message)
+            completion.latency = time.perf_counter() - started
+            results[int(entry.custom_id)] = completion
+        elif entry.result.type == 'errored':
+            results[int(entry.custom_id)] = RuntimeError(f"Batch request {entry.custom_id} failed: {entry.result.error.error.message}")
+        else:
+            results[int(entry.custom_id)] = RuntimeError(f"Batch request {entry.custom_id} {entry.result.type}")
+    return results
+
+def langchain_model(model, api_keys, **kwargs):
+    """LangChain chat model for CrewAI agents, sharing the rate limits and the message's deadline."""
+    provider, api_key = api_key_for(model, api_keys)
+    limiter = langchain_rate_limiter(api_key, model)
+    if provider == 'anthropic':
+        from langchain_anthropic import ChatAnthropic
+        return ChatAnthropic(
+            model=model, anthropic_api_key=api_key, rate_limiter=limiter,
+            default_request_timeout=remaining(REQUEST_TIMEOUT), **kwargs
+        )
+    from langchain_openai import ChatOpenAI
+    return ChatOpenAI(model=model, api_key=api_key, rate_limiter=limiter, timeout=remaining(REQUEST_TIMEOUT), **kwargs)
+
+def crewai_llm(model, api_keys, **kwargs):
+    """CrewAI's own LLM (LiteLLM underneath) for `model`, with the key of its provider."""
+    from crewai import LLM
+
+    _, api_key = api_key_for(model, api_keys)
+    return LLM(model=model, api_key=api_key, timeout=remaining(REQUEST_TIMEOUT), **kwargs)
@@ -0,0 +1,274 @@
+import os
+import sys
+import time
+import queue
+import atexit
+import random
+import logging
+import threading
+import contextvars
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+from .codec import encode
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Levels the current message's envelope asked for, by logger name ('' is the root logger)
+current_levels = contextvars.ContextVar('current_log_levels', default=None)
+# Whether the current message was sampled for verbose agent traces
+current_verbose = contextvars.ContextVar('current_verbose', default=False)
+
+def parse_level(value):
+    if isinstance(value, int):
+        return value
+    level = logging.getLevelName(str(value).upper())
+    return level if isinstance(level, int) else None
+
+def parse_levels(value):
+    """Parses EXTENSION_LOG_LEVELS, e.g. 'crewai=WARNING,httpx=WARNING'."""
+    levels = {}
+    for item in (value or '').split(','):
+        if not item.strip():
+            continue
+        name, _, level = item.partition('=')
+        if parse_level(level.strip()) is None:
+            raise ValueError(f"Invalid level in EXTENSION_LOG_LEVELS: {item.strip()!r}")
+        levels[name.strip()] = parse_level(level.strip())
+    return levels
+
+def logger_name(name):
+    return '' if name in ('', 'root') else name
+
+def lookup(levels, name):
+    # The most specific setting wins: 'crewai.agent', then 'crewai', then the root logger
+    while True:
+        if name in levels:
+            return levels[name]
+        if not name:
+            return None
+        name = name.rpartition('.')[0]
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, with the message's trace and workflow instance when there is one."""
+
+    def __init__(self, max_message_length=0):
+        super().__init__()
+        self.max_message_length = max_message_length
+
+    def format(self, record):
+        message = record.getMessage()
+        if 0 < self.max_message_length < len(message):
+            message = f"{message[:self.max_message_length]}... ({len(message)} characters)"
+        line = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": message
+        }
+        for field in ('trace_id', 'workflow_instance_id'):
+            if getattr(record, field, ''):
+                line[field] = getattr(record, field)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            line["exception"] = record.exc_text
+        return encode(line).decode()
+
+class LogHandler(QueueHandler):
+    """Hands records to a background writer so logging never blocks the event loop or a handler.
+
+    Records are dropped, and counted, when the writer cannot keep up. In a forked
+    process (a zygote worker) there is no writer thread, so records are written
+    directly; blocking there does not hold up the runtime.
+    """
+
+    def __init__(self, target, queue_size):
+        super().__init__(queue.Queue(maxsize=queue_size))
+        self.target = target
+        self.pid = os.getpid()
+        self.dropped = 0
+        self.listener = QueueListener(self.queue, target, respect_handler_level=True)
+        self.started = False
+
+    def start(self):
+        if not self.started:
+            self.listener.start()
+            self.started = True
+
+    def stop(self):
+        if self.started and self.pid == os.getpid():
+            self.listener.stop()
+            self.started = False
+
+    def prepare(self, record):
+        # Formatted here, while the arguments still hold the values they had when logging
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = self.target.formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            if self.dropped:
+                dropped = logging.makeLogRecord({
+                    "name": __name__, "levelno": logging.WARNING, "levelname": 'WARNING',
+                    "msg": f"Dropped {self.dropped} log records, the log writer could not keep up"
+                })
+                self.queue.put_nowait(dropped)
+                self.dropped = 0
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def emit(self, record):
+        if self.pid != os.getpid():
+            self.target.handle(record)
+            return
+        super().emit(record)
+
+class Levels(logging.Filter):
+    """Applies the per-logger levels of EXTENSION_LOG_LEVELS and of each message's envelope.
+
+    A message asking for a more verbose level lowers the logger's level while it
+    runs, and this filter keeps the extra records of other messages out.
+    """
+
+    def __init__(self, default, configured):
+        super().__init__()
+        self.configured = {'': default, **configured}
+        self.active = Counter()
+        self.lock = threading.Lock()
+
+    def apply(self, name):
+        levels = [self.configured[name]] if name in self.configured else []
+        levels += [level for (active_name, level), count in self.active.items() if active_name == name and count]
+        logging.getLogger(name or None).setLevel(min(levels) if levels else logging.NOTSET)
+
+    def configure(self):
+        for name in self.configured:
+            self.apply(name)
+
+    @contextmanager
+    def override(self, levels):
+        items = list(levels.items())
+        with self.lock:
+            for item in items:
+                self.active[item] += 1
+                self.apply(item[0])
+        try:
+            yield
+        finally:
+            with self.lock:
+                for item in items:
+                    self.active[item] -= 1
+                    if not self.active[item]:
+                        del self.active[item]
+                    self.apply(item[0])
+
+    def filter(self, record):
+        if not self.active:
+            return True
+        level = lookup(current_levels.get() or {}, record.name)
+        if level is None:
+            level = lookup(self.configured, record.name)
+        return record.levelno >= level
+
+class VerboseSampler:
+    """Picks the messages whose agents run verbose: a fraction of them, at most `per_minute`."""
+
+    def __init__(self, rate, per_minute):
+        self.rate = rate
+        self.per_minute = per_minute
+        self.window = 0
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def sample(self):
+        if self.rate <= 0 or random.random() >= self.rate:
+            return False
+        with self.lock:
+            window = int(time.monotonic() // 60)
+            if window != self.window:
+                self.window, self.count = window, 0
+            if self.per_minute and self.count >= self.per_minute:
+                return False
+            self.count += 1
+            return True
+
+# Installed by the runtime at startup
+handler = None
+levels = None
+sampler = None
+
+def install(settings):
+    """Replaces the root logger's handlers, including any an extension set up with basicConfig."""
+    global handler, levels, sampler
+    target = logging.StreamHandler(sys.stdout)
+    if settings.log_format == 'json':
+        target.setFormatter(JsonFormatter(settings.log_max_message_length))
+    else:
+        target.setFormatter(logging.Formatter(TEXT_FORMAT))
+    levels = Levels(settings.log_level, settings.log_levels)
+    sampler = VerboseSampler(settings.verbose_sample_rate, settings.verbose_per_minute)
+    if handler is not None:
+        handler.stop()
+    handler = LogHandler(target, settings.log_queue_size)
+    handler.addFilter(levels)
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    levels.configure()
+
+def start():
+    """Starts the background writer; until then records wait in the queue.
+
+    Called once the zygote has been forked, so it never inherits a thread that
+    was holding stdout.
+    """
+    if handler is not None:
+        handler.start()
+        atexit.register(handler.stop)
+
+def stop():
+    if handler is not None:
+        handler.stop()
+
+def capture():
+    """The current message's logging context, to carry into a forked worker."""
+    return current_levels.get(), current_verbose.get()
+
+@contextmanager
+def message_context(envelope=None, context=None):
+    """Applies the envelope's `logLevels` and decides on verbose traces for one message.
+
+    `context` is a captured context, in a worker that runs part of the message.
+    """
+    if context is not None:
+        requested, verbose = context
+    else:
+        requested = {}
+        for name, value in (getattr(envelope, 'logLevels', None) or {}).items():
+            level = parse_level(value)
+            if level is None:
+                logging.getLogger(__name__).warning(f"Ignoring invalid log level {value!r} for {name!r}")
+            else:
+                requested[logger_name(name)] = level
+        # Asking for DEBUG on the root logger is asking for the whole transcript
+        verbose = requested.get('', logging.INFO) <= logging.DEBUG or (sampler is not None and sampler.sample())
+    current_levels.set(requested or None)
+    current_verbose.set(verbose)
+    if not requested or levels is None:
+        yield
+        return
+    with levels.override(requested):
+        yield
+
+def verbose():
+    """Whether the current message's agents should run verbose, e.g. `Agent(..., verbose=verbose())`."""
+    return current_verbose.get()
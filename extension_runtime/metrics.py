@@ -0,0 +1,157 @@
+import time
+import asyncio
+import logging
+import contextvars
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# wait: idle until the message arrived; queue: waiting for a free concurrency slot;
+# external: HTTP calls made by the handler (part of handler); total: arrival to publish
+PHASES = ('wait', 'queue', 'decode', 'handler', 'external', 'encode', 'publish', 'total')
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+current_timings = contextvars.ContextVar('current_timings', default=None)
+
+class Timings:
+    """Phase durations of one message, in seconds."""
+
+    def __init__(self, wait=0.0):
+        self.received = time.perf_counter()
+        self.phases = {'wait': wait}
+
+    def add(self, phase, seconds):
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    @contextmanager
+    def phase(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - started)
+
+    def finish(self):
+        self.phases['total'] = time.perf_counter() - self.received
+
+    def as_dict(self):
+        return {f"{phase}_ms": round(self.phases[phase] * 1000, 3) for phase in PHASES if phase in self.phases}
+
+def record_external(seconds):
+    timings = current_timings.get()
+    if timings is not None:
+        timings.add('external', seconds)
+
+class Metrics:
+    """Aggregates message timings for the Prometheus endpoint and the Redis metrics hash."""
+
+    def __init__(self, settings):
+        self.settings = settings
+        self.startup = {}
+        self.messages = {}
+        self.sums = {phase: 0.0 for phase in PHASES}
+        self.counts = {phase: 0 for phase in PHASES}
+        self.buckets = {phase: [0] * len(BUCKETS) for phase in PHASES}
+        self.server = None
+
+    def observe(self, timings, output_type):
+        self.messages[output_type] = self.messages.get(output_type, 0) + 1
+        for phase, seconds in timings.phases.items():
+            self.sums[phase] += seconds
+            self.counts[phase] += 1
+            for index, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    self.buckets[phase][index] += 1
+
+    async def record(self, redis, timings, output_type):
+        self.observe(timings, output_type)
+        if not self.settings.metrics_key:
+            return
+        try:
+            pipeline = redis.pipeline(transaction=False)
+            pipeline.hincrby(self.settings.metrics_key, f"messages_{output_type}", 1)
+            for phase, seconds in timings.phases.items():
+                pipeline.hincrbyfloat(self.settings.metrics_key, f"{phase}_ms_sum", round(seconds * 1000, 3))
+                pipeline.hincrby(self.settings.metrics_key, f"{phase}_count", 1)
+            await pipeline.execute()
+        except Exception as e:
+            logger.warning(f"Failed to update metrics hash {self.settings.metrics_key}: {str(e)}")
+
+    def render(self):
+        return render_metrics([self])
+
+    async def start(self):
+        if self.settings.metrics_port:
+            self.server = MetricsServer(self.settings.metrics_port, [self])
+            await self.server.start()
+
+    async def close(self):
+        if self.server is not None:
+            await self.server.close()
+
+def render_metrics(metrics):
+    """Prometheus text format for one or more extensions, labelled by service."""
+    lines = [
+        '# HELP extension_startup_seconds Time spent in each startup phase.',
+        '# TYPE extension_startup_seconds gauge'
+    ]
+    for entry in metrics:
+        service = entry.settings.service_name
+        for phase, seconds in entry.startup.items():
+            lines.append(f'extension_startup_seconds{{service="{service}",phase="{phase}"}} {seconds:.6f}')
+    lines += [
+        '# HELP extension_messages_total Messages processed, by output type.',
+        '# TYPE extension_messages_total counter'
+    ]
+    for entry in metrics:
+        service = entry.settings.service_name
+        for output_type, count in entry.messages.items():
+            lines.append(f'extension_messages_total{{service="{service}",type="{output_type}"}} {count}')
+    lines += [
+        '# HELP extension_phase_seconds Time spent in each phase of handling a message.',
+        '# TYPE extension_phase_seconds histogram'
+    ]
+    for entry in metrics:
+        service = entry.settings.service_name
+        for phase in PHASES:
+            labels = f'service="{service}",phase="{phase}"'
+            for bound, count in zip(BUCKETS, entry.buckets[phase]):
+                lines.append(f'extension_phase_seconds_bucket{{{labels},le="{bound}"}} {count}')
+            lines.append(f'extension_phase_seconds_bucket{{{labels},le="+Inf"}} {entry.counts[phase]}')
+            lines.append(f'extension_phase_seconds_sum{{{labels}}} {entry.sums[phase]:.6f}')
+            lines.append(f'extension_phase_seconds_count{{{labels}}} {entry.counts[phase]}')
+    return '\n'.join(lines) + '\n'
+
+class MetricsServer:
+    """Serves /metrics for the given Metrics over a tiny asyncio HTTP server."""
+
+    def __init__(self, port, metrics):
+        self.port = port
+        self.metrics = metrics
+        self.server = None
+
+    async def handle_request(self, reader, writer):
+        try:
+            request_line = await reader.readline()
+            while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                pass
+            path = request_line.split()[1] if len(request_line.split()) > 1 else b'/'
+            if path.split(b'?')[0] == b'/metrics':
+                status, body = '200 OK', render_metrics(self.metrics).encode()
+            else:
+                status, body = '404 Not Found', b'Not Found\n'
+            writer.write(
+                f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4\r\n"
+                f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+            )
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle_request, port=self.port)
+        logger.info(f"Serving Prometheus metrics on port {self.port}")
+
+    async def close(self):
+        self.server.close()
+        await self.server.wait_closed()
@@ -0,0 +1,96 @@
+import os
+import time
+import uuid
+import zlib
+import asyncio
+import logging
+
+from .codec import decode, encode
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+def compress(data):
+    # zstd is optional: extensions that never produce large outputs do not need to install it
+    if zstandard is not None:
+        return zstandard.ZstdCompressor(level=3).compress(data), 'zstd'
+    return zlib.compress(data, 6), 'zlib'
+
+def decompress(data, encoding):
+    if encoding == 'zstd':
+        if zstandard is None:
+            raise RuntimeError("The zstandard package is required to read zstd-compressed outputs")
+        return zstandard.ZstdDecompressor().decompress(data)
+    if encoding == 'zlib':
+        return zlib.decompress(data)
+    raise ValueError(f"Unsupported output encoding: {encoding}")
+
+def strip_debug(result, fields, inputs, include_debug):
+    """Drops the extension's debug fields from a result unless the inputs opted in with `"debug": true`."""
+    if not fields or not isinstance(result, dict):
+        return result
+    if isinstance(inputs, dict) and 'debug' in inputs:
+        include_debug = inputs['debug'] is True or str(inputs['debug']).lower() == 'true'
+    if include_debug:
+        return result
+    return {key: value for key, value in result.items() if key not in fields}
+
+def remove_expired(directory, ttl):
+    now = time.time()
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        try:
+            if now - os.path.getmtime(path) > ttl:
+                os.remove(path)
+        except OSError:
+            pass
+
+def write_file(directory, name, data, ttl):
+    os.makedirs(directory, exist_ok=True)
+    remove_expired(directory, ttl)
+    path = os.path.join(directory, name)
+    with open(path, 'wb') as file:
+        file.write(data)
+    return path
+
+async def offload_output(redis, output, settings):
+    """Stores the envelope's `output` compressed and returns the envelope with an `outputRef` instead."""
+    data = encode(output['output'])
+    compressed, encoding = await asyncio.to_thread(compress, data)
+    name = ':'.join(filter(None, [output['workflowInstanceId'], uuid.uuid4().hex]))
+    # Kept at least as long as the stored result that refers to it
+    ttl = max(settings.offload_ttl, settings.result_ttl)
+    reference = {
+        "store": settings.offload_store,
+        "encoding": encoding,
+        "size": len(data),
+        "compressedSize": len(compressed),
+        "ttl": ttl
+    }
+    if settings.offload_store == 'file':
+        reference["path"] = await asyncio.to_thread(
+            write_file, settings.offload_dir, f"{name.replace(':', '-')}.{encoding}", compressed, ttl
+        )
+    else:
+        reference["key"] = f"{settings.channel_out}:output:{name}"
+        await redis.set(reference["key"], compressed, ex=ttl)
+
+    logger.info(f"Offloaded {len(data)} byte output ({len(compressed)} bytes {encoding}) to {settings.offload_store}")
+    offloaded = {key: value for key, value in output.items() if key != 'output'}
+    offloaded["outputRef"] = reference
+    return offloaded
+
+async def load_output(redis, reference):
+    """Resolves an `outputRef` back into the output, for consumers of the output channel."""
+    if reference['store'] == 'file':
+        with open(reference['path'], 'rb') as file:
+            compressed = file.read()
+    else:
+        compressed = await redis.get(reference['key'])
+        if compressed is None:
+            raise KeyError(f"Output {reference['key']} has expired or does not exist")
+    return decode(decompress(compressed, reference['encoding']))
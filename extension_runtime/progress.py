@@ -0,0 +1,81 @@
+import time
+import asyncio
+import logging
+import contextvars
+
+from .codec import encode
+
+logger = logging.getLogger(__name__)
+
+# The progress publisher of the message being handled, None for batches and cached outputs
+current_progress = contextvars.ContextVar('current_progress', default=None)
+
+class Progress:
+    """Publishes a message's partial output to REDIS_CHANNEL_OUT as `progress` envelopes.
+
+    Text written within `interval` seconds of the last envelope is coalesced into
+    the next one, so a fast token stream costs a few publishes a second rather
+    than one per token. write() may be called from the event loop or from a
+    handler's thread.
+    """
+
+    def __init__(self, redis, channel, workflow_ids, traceparent, interval):
+        self.redis = redis
+        self.channel = channel
+        self.workflow_ids = workflow_ids
+        self.traceparent = traceparent
+        self.interval = interval
+        self.loop = asyncio.get_running_loop()
+        self.lock = asyncio.Lock()
+        self.buffer = []
+        self.sequence = 0
+        self.last = 0.0
+        self.flushing = None
+        self.closed = False
+
+    def write(self, text):
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is not self.loop:
+            self.loop.call_soon_threadsafe(self.write, text)
+            return
+        if not text or self.closed:
+            return
+        self.buffer.append(text)
+        if self.flushing is None:
+            self.flushing = self.loop.create_task(self.flush_later())
+
+    async def flush_later(self):
+        wait = self.last + self.interval - time.monotonic()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        self.flushing = None
+        await self.flush()
+
+    async def flush(self):
+        # The lock keeps envelopes in order when a flush is still publishing as the next one starts
+        async with self.lock:
+            if not self.buffer:
+                return
+            text, self.buffer = ''.join(self.buffer), []
+            self.last = time.monotonic()
+            self.sequence += 1
+            output = {"type": "progress", **{key: value for key, value in self.workflow_ids.items() if value is not None}}
+            output["output"] = {"text": text, "sequence": self.sequence}
+            output["traceparent"] = self.traceparent
+            try:
+                await self.redis.publish(self.channel, encode(output))
+            except Exception as e:
+                # Progress is best effort, the final output still carries everything
+                logger.warning(f"Failed to publish progress: {str(e)}")
+
+    async def close(self):
+        """Publishes what is left, so every progress envelope goes out before the final output."""
+        self.closed = True
+        # Still waiting out the interval; a flush that has started publishing holds the lock instead
+        pending, self.flushing = self.flushing, None
+        if pending is not None:
+            pending.cancel()
+        await self.flush()
@@ -0,0 +1,262 @@
+import os
+import time
+import random
+import asyncio
+import logging
+from contextlib import asynccontextmanager, contextmanager
+
+from redis import Redis
+
+from .cache import fingerprint
+
+logger = logging.getLogger(__name__)
+
+# Two token buckets per API key and model, one for requests and one for tokens per
+# minute, refilled continuously. Redis' clock is used so pods with skewed clocks agree.
+# A limit of 0 is unknown and not enforced until a provider's headers report it.
+# mode 'acquire': takes 1 request and ARGV[2] tokens, or returns the ms to wait for them.
+# mode 'update': ARGV[2..7] are the limits and remaining capacity reported by the
+# provider, a Retry-After in ms and a token correction; '' leaves a value alone.
+BUCKET_SCRIPT = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + tonumber(time[2]) / 1000
+local state = redis.call('HMGET', KEYS[1], 'rpm_limit', 'tpm_limit', 'rpm', 'tpm', 'ts', 'blocked_until')
+local rpm_limit = tonumber(state[1]) or tonumber(ARGV[8])
+local tpm_limit = tonumber(state[2]) or tonumber(ARGV[9])
+local elapsed = math.max(0, now - (tonumber(state[5]) or now)) / 60000
+local rpm = math.min(rpm_limit, (tonumber(state[3]) or rpm_limit) + elapsed * rpm_limit)
+local tpm = math.min(tpm_limit, (tonumber(state[4]) or tpm_limit) + elapsed * tpm_limit)
+local blocked_until = tonumber(state[6]) or 0
+local wait = 0
+
+if ARGV[1] == 'acquire' then
+    local cost = tonumber(ARGV[2])
+    if blocked_until > now then
+        wait = blocked_until - now
+    end
+    if rpm_limit > 0 and rpm < 1 then
+        wait = math.max(wait, (1 - rpm) / rpm_limit * 60000)
+    end
+    -- A request larger than the whole bucket only waits for a full one
+    local needed = math.min(cost, tpm_limit)
+    if tpm_limit > 0 and tpm < needed then
+        wait = math.max(wait, (needed - tpm) / tpm_limit * 60000)
+    end
+    if wait == 0 then
+        rpm = rpm - 1
+        tpm = tpm - cost
+    end
+else
+    if ARGV[2] ~= '' then rpm_limit = tonumber(ARGV[2]) end
+    if ARGV[3] ~= '' then rpm = tonumber(ARGV[3]) end
+    if ARGV[4] ~= '' then tpm_limit = tonumber(ARGV[4]) end
+    if ARGV[5] ~= '' then
+        tpm = tonumber(ARGV[5])
+    elseif ARGV[7] ~= '' then
+        tpm = tpm - tonumber(ARGV[7])
+    end
+    if ARGV[6] ~= '' then
+        blocked_until = math.max(blocked_until, now + tonumber(ARGV[6]))
+    end
+end
+
+redis.call('HSET', KEYS[1], 'rpm_limit', rpm_limit, 'tpm_limit', tpm_limit, 'rpm', math.max(rpm, -rpm_limit),
+    'tpm', math.max(tpm, -tpm_limit), 'ts', now, 'blocked_until', blocked_until)
+redis.call('PEXPIRE', KEYS[1], ARGV[10])
+return math.ceil(wait)
+"""
+
+# Header names of the rate limit headers Anthropic and OpenAI send with every response
+HEADERS = {
+    'rpm_limit': ('anthropic-ratelimit-requests-limit', 'x-ratelimit-limit-requests'),
+    'rpm_remaining': ('anthropic-ratelimit-requests-remaining', 'x-ratelimit-remaining-requests'),
+    'tpm_limit': ('anthropic-ratelimit-tokens-limit', 'x-ratelimit-limit-tokens'),
+    'tpm_remaining': ('anthropic-ratelimit-tokens-remaining', 'x-ratelimit-remaining-tokens')
+}
+
+# Learned limits are forgotten after this long without requests
+STATE_TTL_MS = 600000
+
+def parse_headers(headers):
+    """Returns the limits and remaining capacity in a provider's response headers."""
+    values = {}
+    if not headers:
+        return values
+    for field, names in HEADERS.items():
+        for name in names:
+            value = headers.get(name)
+            if value is not None:
+                try:
+                    values[field] = int(float(value))
+                except ValueError:
+                    pass
+                break
+    retry_after_ms = headers.get('retry-after-ms')
+    retry_after = headers.get('retry-after')
+    try:
+        if retry_after_ms is not None:
+            values['retry_after_ms'] = int(float(retry_after_ms))
+        elif retry_after is not None:
+            values['retry_after_ms'] = int(float(retry_after) * 1000)
+    except ValueError:
+        # An HTTP date; the bucket refills on its own by then
+        pass
+    return values
+
+def estimate_tokens(text, max_tokens=0):
+    """A rough count reserved before the call: about 4 characters per token plus the output budget."""
+    return len(text) // 4 + max_tokens
+
+def error_headers(error):
+    # The Anthropic and OpenAI SDKs attach the HTTP response to their API errors
+    return getattr(getattr(error, 'response', None), 'headers', None)
+
+class Lease:
+    """Capacity taken for one call; `record` what the provider reported about it."""
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.headers = None
+        self.used_tokens = None
+
+    def record(self, headers=None, used_tokens=None):
+        self.headers = headers
+        self.used_tokens = used_tokens
+
+    @property
+    def reported(self):
+        return self.headers is not None or self.used_tokens is not None
+
+    def update_args(self):
+        values = parse_headers(self.headers)
+        correction = self.used_tokens - self.tokens if self.used_tokens is not None else None
+        return [
+            'update',
+            *(values.get(field, '') for field in ('rpm_limit', 'rpm_remaining', 'tpm_limit', 'tpm_remaining', 'retry_after_ms')),
+            '' if correction is None else correction
+        ]
+
+class RateLimiter:
+    """Shares the request and token rate of each API key and model across all pods.
+
+    Extensions wrap every call to an LLM provider in `limit` (or `limit_async`),
+    which waits until the key has capacity and afterwards feeds the provider's
+    rate limit headers back into the buckets, so the limits are learned from the
+    provider itself. EXTENSION_RATE_LIMIT_RPM/TPM set limits to enforce before then.
+    """
+
+    def __init__(self, settings, redis=None):
+        self.settings = settings
+        self.async_redis = redis
+        self.async_script = redis.register_script(BUCKET_SCRIPT) if redis is not None else None
+        self.sync_redis = None
+        self.sync_script = None
+        self.pid = None
+
+    def key(self, api_key, model):
+        return f"extension:ratelimit:{fingerprint(api_key)}:{model}"
+
+    def args(self, args):
+        return args + [self.settings.rate_limit_rpm, self.settings.rate_limit_tpm, STATE_TTL_MS]
+
+    def script(self):
+        # Sync handlers run on threads or in forked workers, which need their own connection
+        if self.sync_script is None or self.pid != os.getpid():
+            self.sync_redis = Redis.from_url(
+                self.settings.redis_host_url,
+                username=self.settings.redis_username,
+                password=self.settings.redis_password
+            )
+            self.sync_script = self.sync_redis.register_script(BUCKET_SCRIPT)
+            self.pid = os.getpid()
+        return self.sync_script
+
+    def delay(self, wait_ms):
+        # Jittered so pods that were blocked together do not all retry at once
+        return wait_ms / 1000 * random.uniform(1.0, 1.2)
+
+    @contextmanager
+    def limit(self, api_key, model, tokens=0):
+        key, lease = self.key(api_key, model), Lease(tokens)
+        try:
+            while (wait_ms := int(self.script()(keys=[key], args=self.args(['acquire', tokens, '', '', '', '', ''])))) > 0:
+                logger.info(f"Rate limited on {model}, waiting {wait_ms} ms")
+                time.sleep(self.delay(wait_ms))
+        except Exception as e:
+            logger.warning(f"Rate limiter unavailable, calling without it: {str(e)}")
+        try:
+            yield lease
+        except Exception as e:
+            lease.record(error_headers(e))
+            raise
+        finally:
+            try:
+                if lease.reported:
+                    self.script()(keys=[key], args=self.args(lease.update_args()))
+            except Exception as e:
+                logger.warning(f"Failed to update rate limits: {str(e)}")
+
+    @asynccontextmanager
+    async def limit_async(self, api_key, model, tokens=0):
+        key, lease = self.key(api_key, model), Lease(tokens)
+        try:
+            while (wait_ms := int(await self.async_script(keys=[key], args=self.args(['acquire', tokens, '', '', '', '', ''])))) > 0:
+                logger.info(f"Rate limited on {model}, waiting {wait_ms} ms")
+                await asyncio.sleep(self.delay(wait_ms))
+        except Exception as e:
+            logger.warning(f"Rate limiter unavailable, calling without it: {str(e)}")
+        try:
+            yield lease
+        except Exception as e:
+            lease.record(error_headers(e))
+            raise
+        finally:
+            try:
+                if lease.reported:
+                    await self.async_script(keys=[key], args=self.args(lease.update_args()))
+            except Exception as e:
+                logger.warning(f"Failed to update rate limits: {str(e)}")
+
+# Installed by the runtime at startup; None when rate limiting is disabled
+limiter = None
+
+def install(settings, redis):
+    global limiter
+    limiter = RateLimiter(settings, redis) if settings.rate_limit else None
+
+@contextmanager
+def limit(api_key, model, tokens=0):
+    """Waits for capacity for one call with `api_key` to `model`; see RateLimiter."""
+    if limiter is None:
+        yield Lease(tokens)
+        return
+    with limiter.limit(api_key, model, tokens) as lease:
+        yield lease
+
+@asynccontextmanager
+async def limit_async(api_key, model, tokens=0):
+    if limiter is None:
+        yield Lease(tokens)
+        return
+    async with limiter.limit_async(api_key, model, tokens) as lease:
+        yield lease
+
+def langchain_rate_limiter(api_key, model):
+    """A LangChain `rate_limiter` that takes one request from the shared bucket before every model call.
+
+    LangChain does not pass response headers to rate limiters, so these calls only
+    follow limits learned from calls made through `limit` or set in the environment.
+    """
+    from langchain_core.rate_limiters import BaseRateLimiter
+
+    class SharedRateLimiter(BaseRateLimiter):
+        def acquire(self, *, blocking=True):
+            with limit(api_key, model):
+                pass
+            return True
+
+        async def aacquire(self, *, blocking=True):
+            # The runtime's async client belongs to its own event loop, which may not be this one
+            return await asyncio.to_thread(self.acquire)
+
+    return SharedRateLimiter()
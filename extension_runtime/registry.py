@@ -0,0 +1,37 @@
+import os
+import re
+import sys
+import runpy
+from dataclasses import dataclass
+from typing import Callable
+
+# Set while an extension's main.py runs under the host, so its run() call registers instead of serving
+collecting = None
+
+@dataclass
+class Registration:
+    name: str
+    handler: Callable
+    options: dict
+
+def env_prefix(name):
+    """Prefix of the extension's channel variables in the host, e.g. GITHUB_ADDISSUECOMMENT_."""
+    return re.sub(r'[^A-Z0-9]+', '_', name.upper()).strip('_') + '_'
+
+def load_extension(directory):
+    """Runs the extension's main.py and returns what it passed to run()."""
+    global collecting
+    directory = os.path.abspath(directory)
+    collecting = []
+    # main.py may import modules next to it
+    sys.path.insert(0, directory)
+    try:
+        runpy.run_path(os.path.join(directory, 'main.py'), run_name='__main__')
+        registered = collecting
+    finally:
+        collecting = None
+        sys.path.remove(directory)
+    if len(registered) != 1:
+        raise ValueError(f"{directory}/main.py must call run() exactly once, it called it {len(registered)} times")
+    options = registered[0]
+    return Registration(os.path.basename(directory), options.pop('handler'), options)
@@ -0,0 +1,168 @@
+import time
+import asyncio
+import hashlib
+import logging
+import sqlite3
+import threading
+from collections import Counter, OrderedDict
+
+from .cache import canonical_encoder, fingerprint
+from .codec import decode, encode
+
+logger = logging.getLogger(__name__)
+
+# Part of every key: bump it when the stored completions change shape
+VERSION = '1'
+
+class MemoryTier:
+    """LRU of encoded completions, bounded by their total size in bytes."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+
+    def get(self, key):
+        payload = self.entries.get(key)
+        if payload is not None:
+            self.entries.move_to_end(key)
+        return payload
+
+    def set(self, key, payload):
+        if len(payload) > self.max_bytes:
+            return
+        if key in self.entries:
+            self.size -= len(self.entries.pop(key))
+        self.entries[key] = payload
+        self.size += len(payload)
+        while self.size > self.max_bytes:
+            _, evicted = self.entries.popitem(last=False)
+            self.size -= len(evicted)
+
+class DiskTier:
+    """SQLite file of encoded completions that outlives the process, for persistent mode.
+
+    Entries expire after `ttl` seconds; beyond `max_bytes`, the least recently
+    used are deleted. Connected on first use, so a forked zygote does not share
+    the connection.
+    """
+
+    def __init__(self, path, ttl, max_bytes):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.connection = None
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def connect(self):
+        if self.connection is None:
+            self.connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self.connection.execute('PRAGMA journal_mode=WAL')
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS responses '
+                '(key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, created REAL NOT NULL, used REAL NOT NULL)'
+            )
+            self.connection.execute('CREATE INDEX IF NOT EXISTS responses_used ON responses (used)')
+            self.connection.execute('DELETE FROM responses WHERE created < ?', (time.time() - self.ttl,))
+            self.size = self.connection.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+        return self.connection
+
+    def get(self, key):
+        with self.lock:
+            connection = self.connect()
+            row = connection.execute('SELECT value, created FROM responses WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return None
+            if row[1] < time.time() - self.ttl:
+                self.delete(connection, key)
+                return None
+            connection.execute('UPDATE responses SET used = ? WHERE key = ?', (time.time(), key))
+            return row[0]
+
+    def set(self, key, payload):
+        with self.lock:
+            connection = self.connect()
+            self.delete(connection, key)
+            now = time.time()
+            connection.execute(
+                'INSERT INTO responses (key, value, size, created, used) VALUES (?, ?, ?, ?, ?)',
+                (key, payload, len(payload), now, now)
+            )
+            self.size += len(payload)
+            while self.size > self.max_bytes:
+                oldest = connection.execute('SELECT key FROM responses ORDER BY used LIMIT 100').fetchall()
+                if not oldest:
+                    break
+                for (evicted,) in oldest:
+                    self.delete(connection, evicted)
+                    if self.size <= self.max_bytes:
+                        break
+
+    def delete(self, connection, key):
+        # No DELETE ... RETURNING: the SQLite of the python:3.9-slim images predates it
+        row = connection.execute('SELECT size FROM responses WHERE key = ?', (key,)).fetchone()
+        if row is not None:
+            connection.execute('DELETE FROM responses WHERE key = ?', (key,))
+            self.size -= row[0]
+
+class ResponseCache:
+    """Completions of deterministic LLM calls: an in-process LRU in front of an optional SQLite file.
+
+    The key covers everything that decides the response: provider, model, system
+    prompt, messages, max_tokens and temperature, plus the API key's fingerprint
+    unless EXTENSION_CACHE_SHARE_ACROSS_KEYS is set.
+    """
+
+    def __init__(self, settings):
+        self.settings = settings
+        self.memory = MemoryTier(settings.response_cache_max_bytes)
+        self.disk = DiskTier(
+            settings.response_cache_path, settings.response_cache_ttl, settings.response_cache_disk_max_bytes
+        ) if settings.response_cache_path else None
+        self.counts = Counter()
+
+    def key(self, provider, model, api_key, request):
+        scope = '' if self.settings.cache_share_across_keys else fingerprint(api_key)
+        # JSON gives 0 and 0.0 alike, so both are hashed the same
+        temperature = float(request.temperature) if request.temperature is not None else None
+        return hashlib.sha256(canonical_encoder.encode([
+            VERSION, provider, model, scope, request.system, request.messages, int(request.max_tokens), temperature
+        ])).hexdigest()
+
+    async def get(self, key, type):
+        payload = self.memory.get(key)
+        tier = 'memory'
+        if payload is None and self.disk is not None:
+            tier = 'disk'
+            try:
+                payload = await asyncio.to_thread(self.disk.get, key)
+            except Exception as e:
+                logger.warning(f"Response cache lookup failed: {str(e)}")
+                payload = None
+            if payload is not None:
+                self.memory.set(key, payload)
+        if payload is None:
+            self.counts['misses'] += 1
+            return None
+        self.counts[f'{tier}_hits'] += 1
+        completion = decode(payload, type)
+        completion.cached = tier
+        return completion
+
+    async def set(self, key, completion):
+        payload = encode(completion)
+        self.memory.set(key, payload)
+        if self.disk is not None:
+            try:
+                await asyncio.to_thread(self.disk.set, key, payload)
+            except Exception as e:
+                logger.warning(f"Response cache write failed: {str(e)}")
+
+    def stats(self):
+        return {
+            "memory_hits": self.counts['memory_hits'],
+            "disk_hits": self.counts['disk_hits'],
+            "misses": self.counts['misses'],
+            "memory_bytes": self.memory.size
+        }
@@ -0,0 +1,28 @@
+import logging
+
+from .codec import decode
+
+logger = logging.getLogger(__name__)
+
+def result_key(channel_out, workflow_instance_id, workflow_extension_id):
+    return f"{channel_out}:result:{workflow_instance_id}:{workflow_extension_id}"
+
+async def store_result(redis, output, payload, settings):
+    """Keeps the output message under a TTL'd key so it can be fetched again after a missed publish.
+
+    Written before the publish: once a subscriber could have seen the message, it
+    can also be read back. Messages without a workflow instance cannot be looked
+    up and are not stored.
+    """
+    if not settings.result_ttl or not output.get('workflowInstanceId'):
+        return
+    key = result_key(settings.channel_out, output['workflowInstanceId'], output['workflowExtensionId'])
+    try:
+        await redis.set(key, payload, ex=settings.result_ttl)
+    except Exception as e:
+        logger.warning(f"Failed to store result under {key}: {str(e)}")
+
+async def load_result(redis, channel_out, workflow_instance_id, workflow_extension_id):
+    """Returns the last output message published for the workflow step, or None once it has expired."""
+    payload = await redis.get(result_key(channel_out, workflow_instance_id, workflow_extension_id))
+    return decode(payload) if payload is not None else None
@@ -0,0 +1,157 @@
+import os
+import re
+import math
+import logging
+
+from .codec import DecodeError
+
+logger = logging.getLogger(__name__)
+
+# The repository's convention is a README.md next to main.py; a few folders spell it READEME.md
+README_NAMES = ('README.md', 'READEME.md')
+YAML_BLOCK = re.compile(r'```ya?ml[^\n]*\n(.*?)```', re.DOTALL)
+
+class InvalidInputs(DecodeError):
+    """Raised when inputs do not match the extension's definition; `errors` maps each input key to its problem."""
+
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__("Invalid inputs: " + '; '.join(f"'{key}' {error}" for key, error in errors.items()))
+
+def to_string(value):
+    if isinstance(value, str):
+        return value
+    # Engines and webhooks send IDs as numbers as often as strings
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value)
+    raise ValueError("must be a string")
+
+def to_number(value):
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return value
+    if isinstance(value, str):
+        try:
+            return int(value)
+        except ValueError:
+            pass
+        try:
+            number = float(value)
+        except ValueError:
+            raise ValueError("must be a number")
+        if math.isfinite(number):
+            return number
+    raise ValueError("must be a number")
+
+def to_boolean(value):
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, str) and value.strip().lower() in ('true', 'false'):
+        return value.strip().lower() == 'true'
+    raise ValueError("must be true or false")
+
+def to_array(value):
+    if isinstance(value, list):
+        return value
+    raise ValueError("must be an array")
+
+def to_object(value):
+    if isinstance(value, dict):
+        return value
+    raise ValueError("must be an object")
+
+COERCERS = {
+    'string': to_string,
+    'number': to_number,
+    'boolean': to_boolean,
+    'array': to_array,
+    'object': to_object
+}
+
+def compile_inputs(definitions):
+    """Compiles the `configuration.inputs` of a definition into a single validate(inputs) function.
+
+    Values are coerced to their declared type ("25" to 25, "true" to True). A
+    required input that is missing, null or empty is an error; an optional one
+    that is null is removed, so the handler's default applies. Inputs that are
+    not in the definition are passed through.
+    """
+    fields = []
+    for definition in definitions:
+        key = definition.get('key') or definition['id']
+        field_type = definition.get('type')
+        if field_type not in COERCERS:
+            logger.warning(f"Input '{key}' has unknown type {field_type!r}, it is not validated")
+            coerce = None
+        else:
+            coerce = COERCERS[field_type]
+        fields.append((key, coerce, bool(definition.get('required'))))
+
+    def validate(inputs):
+        if not isinstance(inputs, dict):
+            raise InvalidInputs({"inputs": "must be an object"})
+        validated = dict(inputs)
+        errors = {}
+        for key, coerce, required in fields:
+            value = inputs.get(key)
+            if value is None or value == '':
+                if required:
+                    errors[key] = "is required"
+                elif value is None:
+                    validated.pop(key, None)
+                continue
+            if coerce is not None:
+                try:
+                    validated[key] = coerce(value)
+                except ValueError as e:
+                    errors[key] = str(e)
+        if errors:
+            raise InvalidInputs(errors)
+        return validated
+
+    return validate
+
+def find_readme(directory):
+    for name in README_NAMES:
+        path = os.path.join(directory, name)
+        if os.path.exists(path):
+            return path
+    return None
+
+def load_definition(path):
+    """The `configuration.inputs` of the first YAML block in the README that has them, or None."""
+    with open(path) as file:
+        blocks = YAML_BLOCK.findall(file.read())
+    if not blocks:
+        return None
+    # Only extensions that have a definition need PyYAML
+    import yaml
+
+    for block in blocks:
+        try:
+            definition = yaml.safe_load(block)
+        except yaml.YAMLError as e:
+            raise ValueError(f"Invalid extension definition in {path}: {str(e)}")
+        inputs = (definition or {}).get('configuration', {}).get('inputs') if isinstance(definition, dict) else None
+        if inputs:
+            return inputs
+    return None
+
+def load_validator(handler):
+    """Compiles the input validator of the extension whose main.py defines `handler`, once at startup.
+
+    Returns None when the extension has no definition, or PyYAML is not
+    installed to read it.
+    """
+    main_file = getattr(handler, '__globals__', {}).get('__file__')
+    readme = find_readme(os.path.dirname(os.path.abspath(main_file))) if main_file else None
+    if readme is None:
+        return None
+    try:
+        definitions = load_definition(readme)
+    except ImportError:
+        logger.warning(f"PyYAML is not installed, inputs are not validated against {readme}")
+        return None
+    if not definitions:
+        return None
+    logger.info(f"Validating inputs against the {len(definitions)} inputs defined in {readme}")
+    return compile_inputs(definitions)
@@ -0,0 +1,36 @@
+import time
+import asyncio
+import logging
+import importlib
+
+logger = logging.getLogger(__name__)
+
+# Taken when the runtime is first imported, i.e. right at the top of the extension's main.py
+STARTED = time.perf_counter()
+
+def elapsed_ms():
+    return round((time.perf_counter() - STARTED) * 1000, 1)
+
+def import_modules(modules):
+    for module in modules:
+        importlib.import_module(module)
+
+async def preload_modules(modules, warmup=None):
+    """Imports heavy modules on a worker thread once READY has been published.
+
+    Extensions import their heavy libraries inside the functions that use them, so
+    READY goes out after only the Redis import. Preloading then overlaps the import
+    cost with the engine preparing the input; a message that arrives early simply
+    waits on the import lock for the module it needs.
+    """
+    if not modules and warmup is None:
+        return
+    started = time.perf_counter()
+    loop = asyncio.get_running_loop()
+    try:
+        await loop.run_in_executor(None, import_modules, modules)
+        if warmup is not None:
+            await loop.run_in_executor(None, warmup)
+        logger.info(f"Preloaded {', '.join(modules) or 'nothing'} in {round((time.perf_counter() - started) * 1000, 1)} ms")
+    except Exception as e:
+        logger.warning(f"Failed to preload {', '.join(modules)}: {str(e)}")
@@ -0,0 +1,188 @@
+import os
+import re
+import json
+import time
+import hashlib
+import asyncio
+import logging
+import threading
+import contextvars
+import urllib.request
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# OTLP span kinds
+KIND_INTERNAL = 1
+KIND_CLIENT = 3
+KIND_PRODUCER = 4
+KIND_CONSUMER = 5
+
+TRACEPARENT = re.compile(r'^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$')
+
+current_span = contextvars.ContextVar('current_span', default=None)
+
+def parse_traceparent(traceparent):
+    """Returns (trace_id, parent_span_id, sampled) from a W3C traceparent, or None."""
+    match = TRACEPARENT.match(traceparent.strip().lower()) if isinstance(traceparent, str) else None
+    if not match or match.group(1) == '0' * 32 or match.group(2) == '0' * 16:
+        return None
+    return match.group(1), match.group(2), int(match.group(3), 16) & 1 == 1
+
+def attribute(key, value):
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+class Span:
+    """A span of the message being processed; finished spans are collected on the root."""
+
+    def __init__(self, name, trace_id, parent_id=None, kind=KIND_INTERNAL, attributes=None,
+                 start_ns=None, finished=None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.kind = kind
+        self.attributes = dict(attributes or {})
+        self.start_ns = start_ns or time.time_ns()
+        self.end_ns = None
+        self.error = None
+        self.finished = finished if finished is not None else []
+        self.root = self
+        self.sampled = True
+
+    def child(self, name, kind=KIND_INTERNAL, attributes=None, start_ns=None):
+        child = Span(name, self.trace_id, self.span_id, kind, attributes, start_ns, self.finished)
+        child.root = self.root
+        return child
+
+    def finish(self, error=None, end_ns=None):
+        self.error = error if error is not None else self.error
+        self.end_ns = end_ns or time.time_ns()
+        self.finished.append(self)
+
+    def to_otlp(self):
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [attribute(key, value) for key, value in self.attributes.items() if value is not None],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1}
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+@contextmanager
+def span(name, kind=KIND_INTERNAL, **attributes):
+    """Records a child of the current span; does nothing outside of a message."""
+    parent = current_span.get()
+    if parent is None:
+        yield None
+        return
+    child = parent.child(name, kind, attributes)
+    token = current_span.set(child)
+    try:
+        yield child
+    except BaseException as e:
+        child.error = str(e) or type(e).__name__
+        raise
+    finally:
+        current_span.reset(token)
+        child.finish()
+
+class Tracer:
+    """Continues the trace of the input envelope and exports the spans of every message.
+
+    Spans are exported as OTLP/JSON, either appended to EXTENSION_TRACE_FILE (one
+    ExportTraceServiceRequest per line, as read by the collector's otlpjsonfile
+    receiver) or posted to an OTLP/HTTP collector at EXTENSION_TRACE_ENDPOINT.
+    """
+
+    def __init__(self, settings):
+        self.settings = settings
+        self.service_name = settings.service_name
+        self.lock = threading.Lock()
+
+    @property
+    def exporting(self):
+        return bool(self.settings.trace_file or self.settings.trace_endpoint)
+
+    def start(self, traceparent, workflow_ids, start_ns=None):
+        context = parse_traceparent(traceparent)
+        if context:
+            trace_id, parent_id, sampled = context
+        elif workflow_ids['workflowInstanceId']:
+            # Without a traceparent, every step of a workflow instance still lands in one trace
+            trace_id = hashlib.sha256(workflow_ids['workflowInstanceId'].encode()).hexdigest()[:32]
+            parent_id, sampled = None, True
+        else:
+            trace_id, parent_id, sampled = os.urandom(16).hex(), None, True
+        root = Span(f"process {self.service_name}", trace_id, parent_id, KIND_CONSUMER, {
+            "workflow.id": workflow_ids['workflowId'],
+            "workflow.instance_id": workflow_ids['workflowInstanceId'],
+            "workflow.extension_id": workflow_ids['workflowExtensionId'],
+            "messaging.system": "redis",
+            "messaging.source.name": self.settings.channel_in
+        }, start_ns)
+        root.sampled = sampled
+        return root
+
+    def traceparent(self, root):
+        return f"00-{root.trace_id}-{root.span_id}-{'01' if root.sampled else '00'}"
+
+    def resource_spans(self, spans):
+        return {"resourceSpans": [{
+            "resource": {"attributes": [attribute("service.name", self.service_name)]},
+            "scopeSpans": [{
+                "scope": {"name": "extension_runtime"},
+                "spans": [span.to_otlp() for span in spans]
+            }]
+        }]}
+
+    def write(self, payload):
+        if self.settings.trace_file:
+            with self.lock, open(self.settings.trace_file, 'a') as file:
+                file.write(payload + '\n')
+        if self.settings.trace_endpoint:
+            request = urllib.request.Request(
+                f"{self.settings.trace_endpoint.rstrip('/')}/v1/traces",
+                data=payload.encode(),
+                headers={"Content-Type": "application/json"},
+                method='POST'
+            )
+            with urllib.request.urlopen(request, timeout=5):
+                pass
+
+    async def export(self, root):
+        if not self.exporting or not root.sampled:
+            return
+        try:
+            payload = json.dumps(self.resource_spans(root.finished))
+            await asyncio.to_thread(self.write, payload)
+        except Exception as e:
+            logger.warning(f"Failed to export spans: {str(e)}")
+
+def install_log_context():
+    """Adds `trace_id` and `workflow_instance_id` to every log record, for formats that want them."""
+    factory = logging.getLogRecordFactory()
+    if getattr(factory, 'extension_log_context', False):
+        return
+
+    def record_factory(*args, **kwargs):
+        record = factory(*args, **kwargs)
+        active = current_span.get()
+        record.trace_id = active.trace_id if active else ''
+        record.workflow_instance_id = (active.root.attributes.get('workflow.instance_id') or '') if active else ''
+        return record
+
+    record_factory.extension_log_context = True
+    logging.setLogRecordFactory(record_factory)
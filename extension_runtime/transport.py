@@ -0,0 +1,161 @@
+import time
+import asyncio
+import logging
+from redis.exceptions import ResponseError
+
+logger = logging.getLogger(__name__)
+
+class PubSubTransport:
+    """Receives input messages from REDIS_CHANNEL_IN with SUBSCRIBE."""
+
+    def __init__(self, redis, settings):
+        self.redis = redis
+        self.channel = settings.channel_in
+        self.pubsub = None
+
+    async def start(self):
+        self.pubsub = self.redis.pubsub()
+        await self.pubsub.subscribe(self.channel)
+        logger.info(f"Subscribed to input channel: {self.channel}")
+
+    async def messages(self):
+        async for message in self.pubsub.listen():
+            if message['type'] == 'message':
+                yield None, message['data']
+
+    async def ack(self, message_id):
+        # Pub/sub has no delivery tracking
+        pass
+
+    def release(self, message_id):
+        pass
+
+    async def close(self):
+        if self.pubsub is not None:
+            await self.pubsub.unsubscribe(self.channel)
+            await self.pubsub.close()
+
+class StreamTransport:
+    """Reads input messages from a Redis stream named REDIS_CHANNEL_IN through a consumer group.
+
+    Every pod of an extension joins the same group, so each entry is delivered to
+    exactly one pod. Entries stay pending until acknowledged after the output is
+    published; entries left pending by a crashed pod are reclaimed with XAUTOCLAIM
+    once they have been idle for `claim_idle_ms`. While a message is being
+    processed its idle time is reset periodically so long-running LLM steps are
+    not stolen by another pod.
+    """
+
+    def __init__(self, redis, settings):
+        self.redis = redis
+        self.stream = settings.channel_in
+        self.group = settings.stream_group
+        self.consumer = settings.stream_consumer
+        self.claim_idle_ms = settings.stream_claim_idle_ms
+        self.max_deliveries = settings.stream_max_deliveries
+        self.block_ms = 5000
+        self.in_flight = set()
+        self.next_reclaim = 0
+        self.heartbeat_task = None
+
+    async def start(self):
+        try:
+            await self.redis.xgroup_create(self.stream, self.group, id='0', mkstream=True)
+        except ResponseError as e:
+            if 'BUSYGROUP' not in str(e):
+                raise
+        self.heartbeat_task = asyncio.create_task(self.heartbeat())
+        logger.info(f"Consuming stream {self.stream} as {self.group}/{self.consumer}")
+
+    async def messages(self):
+        while True:
+            if time.monotonic() >= self.next_reclaim:
+                entry = await self.reclaim()
+                if entry is not None:
+                    yield entry
+                    continue
+                self.next_reclaim = time.monotonic() + self.claim_idle_ms / 1000
+
+            response = await self.redis.xreadgroup(
+                self.group, self.consumer, {self.stream: '>'}, count=1, block=self.block_ms
+            )
+            for _, entries in response or []:
+                for entry_id, fields in entries:
+                    yield self.track(entry_id, fields)
+
+    async def reclaim(self):
+        # Claim one entry that another (presumably dead) consumer left pending
+        while True:
+            response = await self.redis.xautoclaim(
+                self.stream, self.group, self.consumer, self.claim_idle_ms, start_id='0-0', count=1
+            )
+            entries = response[1]
+            if not entries:
+                return None
+            entry_id, fields = entries[0]
+            if fields is None:
+                # Entry was trimmed from the stream while pending
+                await self.redis.xack(self.stream, self.group, entry_id)
+                continue
+            if await self.exceeded_deliveries(entry_id, fields):
+                continue
+            logger.warning(f"Reclaimed pending entry {entry_id} from stream {self.stream}")
+            return self.track(entry_id, fields)
+
+    async def exceeded_deliveries(self, entry_id, fields):
+        pending = await self.redis.xpending_range(self.stream, self.group, min=entry_id, max=entry_id, count=1)
+        if not pending or pending[0]['times_delivered'] <= self.max_deliveries:
+            return False
+        # A message that keeps killing pods is parked instead of being retried forever
+        logger.error(f"Entry {entry_id} exceeded {self.max_deliveries} deliveries, moving it to {self.stream}:dead")
+        await self.redis.xadd(f"{self.stream}:dead", fields)
+        await self.redis.xack(self.stream, self.group, entry_id)
+        return True
+
+    def track(self, entry_id, fields):
+        self.in_flight.add(entry_id)
+        return entry_id, fields.get(b'data', fields.get('data'))
+
+    async def heartbeat(self):
+        interval = max(self.claim_idle_ms / 3000, 0.1)
+        while True:
+            await asyncio.sleep(interval)
+            if not self.in_flight:
+                continue
+            try:
+                # Re-claiming our own entries resets their idle time
+                await self.redis.xclaim(
+                    self.stream, self.group, self.consumer, 0, list(self.in_flight), justid=True
+                )
+            except Exception as e:
+                logger.warning(f"Failed to refresh pending entries: {str(e)}")
+
+    async def ack(self, message_id):
+        try:
+            await self.redis.xack(self.stream, self.group, message_id)
+        finally:
+            self.in_flight.discard(message_id)
+
+    def release(self, message_id):
+        """Stops refreshing an entry whose output could not be published.
+
+        It stays pending, so once it has been idle for `claim_idle_ms` another
+        consumer reclaims it (or it is dead-lettered after `max_deliveries`).
+        """
+        self.in_flight.discard(message_id)
+
+    async def close(self):
+        if self.heartbeat_task is not None:
+            self.heartbeat_task.cancel()
+            try:
+                await self.heartbeat_task
+            except asyncio.CancelledError:
+                pass
+
+TRANSPORTS = {
+    'pubsub': PubSubTransport,
+    'streams': StreamTransport
+}
+
+def create_transport(redis, settings):
+    return TRANSPORTS[settings.transport](redis, settings)
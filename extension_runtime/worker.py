@@ -0,0 +1,379 @@
+import time
+import asyncio
+import logging
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import msgspec
+from redis.asyncio import Redis
+
+from . import llm, logs, ratelimit, registry
+from .batch import split_batch, build_batch_output
+from .cache import ResultCache
+from .codec import DecodeError, Message, decode_envelope, encode
+from .config import Settings
+from .deadline import DeadlineExceeded, current_deadline, resolve_deadline, until_deadline
+from .instrument import instrument_http
+from .metrics import Metrics, Timings, current_timings
+from .offload import offload_output, strip_debug
+from .progress import Progress, current_progress
+from .results import store_result
+from .schema import InvalidInputs, load_validator
+from .startup import elapsed_ms, preload_modules
+from .tracing import KIND_PRODUCER, Tracer, current_span, install_log_context, span
+from .transport import create_transport
+from .zygote import ZygoteExecutor
+
+logger = logging.getLogger(__name__)
+
+def connect_to_redis(settings):
+    return Redis.from_url(
+        settings.redis_host_url,
+        username=settings.redis_username,
+        password=settings.redis_password
+    )
+
+def get_workflow_ids(envelope, settings):
+    # In persistent mode every message carries its own workflow identifiers
+    return {
+        "workflowId": getattr(envelope, 'workflowId', None) or settings.workflow_id,
+        "workflowInstanceId": getattr(envelope, 'workflowInstanceId', None) or settings.workflow_instance_id,
+        "workflowExtensionId": getattr(envelope, 'workflowExtensionId', None) or settings.workflow_extension_id
+    }
+
+def build_output(workflow_ids, result=None, error=None, failed=False):
+    output = {"type": "failed" if failed or error is not None else "completed"}
+    if workflow_ids["workflowId"]:
+        output["workflowId"] = workflow_ids["workflowId"]
+    output["workflowInstanceId"] = workflow_ids["workflowInstanceId"]
+    output["workflowExtensionId"] = workflow_ids["workflowExtensionId"]
+    if error is not None:
+        output["error"] = error
+    else:
+        output["output"] = result
+    return output
+
+def run_in_process(function, argument, deadline, log_context):
+    # What ZygoteExecutor does for its workers: contextvars do not cross into a process pool
+    current_deadline.set(deadline)
+    with logs.message_context(context=log_context):
+        return function(argument)
+
+class Dispatcher:
+    """Runs process_message for many input messages at once, bounded by a semaphore."""
+
+    def __init__(self, handler, redis, transport, settings, failed_when=None, batch_handler=None,
+                 preload=(), warmup=None, debug_fields=(), cacheable=None):
+        self.handler = handler
+        self.debug_fields = set(debug_fields)
+        self.batch_handler = batch_handler
+        self.redis = redis
+        self.transport = transport
+        self.settings = settings
+        self.failed_when = failed_when
+        self.semaphore = asyncio.Semaphore(settings.max_concurrency)
+        self.metrics = Metrics(settings)
+        self.tracer = Tracer(settings)
+        # Only extensions that declared themselves cacheable, and only when enabled for the deployment
+        self.cache = ResultCache(redis, settings, cacheable) if cacheable and settings.cache else None
+        self.tasks = set()
+        # Compiled once from the extension's YAML definition, so bad inputs never reach the handler
+        self.validate = load_validator(handler) if settings.validate_inputs else None
+        self.executor = None
+        handlers = [handler] + ([batch_handler] if batch_handler else [])
+        if not all(asyncio.iscoroutinefunction(function) for function in handlers):
+            # Sync handlers (requests, crewai, PyGithub) must not block the event loop
+            if settings.executor == 'fork':
+                self.executor = ZygoteExecutor(handlers, preload=preload, warmup=warmup)
+            elif settings.executor == 'process':
+                self.executor = ProcessPoolExecutor(max_workers=settings.max_concurrency)
+            else:
+                self.executor = ThreadPoolExecutor(max_workers=settings.max_concurrency)
+
+    async def call(self, function, argument):
+        if asyncio.iscoroutinefunction(function):
+            return await function(argument)
+        loop = asyncio.get_running_loop()
+        if isinstance(self.executor, ZygoteExecutor):
+            future = self.executor.submit(function, argument)
+            try:
+                return await asyncio.wrap_future(future)
+            except asyncio.CancelledError:
+                # Unlike a thread, a forked worker can really be stopped at the deadline
+                self.executor.kill(future)
+                raise
+        if isinstance(self.executor, ThreadPoolExecutor):
+            # Carry the message's timings into the thread so its HTTP calls are attributed to it
+            return await loop.run_in_executor(self.executor, contextvars.copy_context().run, function, argument)
+        return await loop.run_in_executor(
+            self.executor, run_in_process, function, argument, current_deadline.get(), logs.capture()
+        )
+
+    async def call_batch(self, messages):
+        # Invalid items fail on their own; the handler only gets the valid ones
+        rejected = {}
+        if self.validate is not None:
+            for index, message in enumerate(messages):
+                try:
+                    message.envelope.inputs = self.validate(message.envelope.inputs)
+                except InvalidInputs as e:
+                    rejected[index] = e
+        valid = [message for index, message in enumerate(messages) if index not in rejected]
+        if not valid:
+            outcomes = []
+        elif self.batch_handler is not None:
+            # The extension handles the items together (shared clients, one auth handshake)
+            outcomes = await self.call(self.batch_handler, valid)
+        else:
+            semaphore = asyncio.Semaphore(self.settings.batch_concurrency)
+
+            async def call_item(message):
+                async with semaphore:
+                    return await self.call(self.handler, message)
+
+            outcomes = await asyncio.gather(*(call_item(message) for message in valid), return_exceptions=True)
+        outcomes = iter(outcomes)
+        outcomes = [rejected[index] if index in rejected else next(outcomes) for index in range(len(messages))]
+        outcomes = [
+            outcome if isinstance(outcome, BaseException) else self.strip_debug(outcome, message)
+            for outcome, message in zip(outcomes, messages)
+        ]
+        return build_batch_output(outcomes, self.failed_when)
+
+    def strip_debug(self, result, message):
+        return strip_debug(result, self.debug_fields, decode_envelope(message).inputs, self.settings.include_debug)
+
+    async def handle(self, message_id, message, timings):
+        current_timings.set(timings)
+        instrument_http()
+        received_ns = time.time_ns()
+        try:
+            # Decoded and validated once; the handler gets it along with the raw message
+            with timings.phase('decode'):
+                envelope = decode_envelope(message)
+                message = Message(message if isinstance(message, str) else message.decode(), envelope)
+        except (DecodeError, UnicodeDecodeError) as e:
+            envelope = None
+            error = str(e)
+        workflow_ids = get_workflow_ids(envelope, self.settings)
+        # The message's span continues the trace of the envelope; HTTP calls become its children
+        root = self.tracer.start(getattr(envelope, 'traceparent', None), workflow_ids, received_ns)
+        current_span.set(root)
+        root.child('decode', start_ns=received_ns).finish(end_ns=time.time_ns())
+        logger.info(f"Processing message for instance {workflow_ids['workflowInstanceId']} (trace {root.trace_id})")
+
+        handler_started = time.perf_counter()
+        handler_span = root.child('handler')
+        current_span.set(handler_span)
+        deadline = resolve_deadline(envelope, self.settings)
+        current_deadline.set(deadline)
+        cache_key = cached = progress = None
+        expired = False
+        # The envelope's log levels and the verbose sample apply to everything the handler logs
+        with logs.message_context(envelope):
+            try:
+                if envelope is None:
+                    output = build_output(workflow_ids, error=error)
+                elif deadline is not None and deadline <= time.monotonic():
+                    raise DeadlineExceeded("Deadline had passed before the message was processed")
+                elif (batch := split_batch(envelope)) is not None:
+                    # Per-item failures are reported inside the results, the batch itself completed
+                    output = build_output(workflow_ids, result=await until_deadline(self.call_batch(batch), deadline))
+                else:
+                    if self.validate is not None:
+                        # Before the cache lookup, so "5" and 5 share a cache entry
+                        envelope.inputs = self.validate(envelope.inputs)
+                    if self.cache is not None and isinstance(envelope.inputs, dict) and not self.cache.bypassed(envelope.inputs):
+                        cache_key = self.cache.key(envelope.inputs)
+                        cached = await self.cache.get(cache_key)
+                    if cached is not None:
+                        # Already encoded when it was stored, so it goes out as is
+                        output = build_output(workflow_ids, result=msgspec.Raw(cached))
+                        output['cached'] = True
+                    else:
+                        # Handlers that stream publish their partial output through it, see progress.py
+                        progress = Progress(
+                            self.redis, self.settings.channel_out, workflow_ids,
+                            self.tracer.traceparent(root), self.settings.progress_interval_ms / 1000
+                        )
+                        current_progress.set(progress)
+                        result = self.strip_debug(await until_deadline(self.call(self.handler, message), deadline), message)
+                        failed = self.failed_when(result) if self.failed_when else False
+                        output = build_output(workflow_ids, result=result, failed=failed)
+            except DeadlineExceeded as e:
+                # Async handlers were cancelled, forked workers killed; a thread runs on in the background
+                expired = True
+                elapsed_ms = round((time.perf_counter() - timings.received) * 1000)
+                logger.error(f"{str(e)}, publishing failed output")
+                output = build_output(workflow_ids, error=f"Deadline exceeded {elapsed_ms} ms after the message arrived")
+            except InvalidInputs as e:
+                # Only input keys are named, never their values
+                logger.warning(f"Rejected message: {str(e)}")
+                output = build_output(workflow_ids, error=str(e))
+                output['invalidInputs'] = e.errors
+            except Exception as e:
+                logger.error(f"Error processing message: {str(e)}", exc_info=True)
+                output = build_output(workflow_ids, error=str(e))
+        if progress is not None:
+            await progress.close()
+        current_span.set(root)
+        handler_span.attributes['extension.cache_hit'] = cached is not None if cache_key else None
+        handler_span.finish(error=output.get('error'))
+        if envelope is not None:
+            timings.add('handler', time.perf_counter() - handler_started)
+        output['traceparent'] = self.tracer.traceparent(root)
+        if self.settings.output_timings or expired:
+            # Encoding and publishing happen after this point, so they are only in the metrics.
+            # An expired message always reports how far it got
+            output['timings'] = timings.as_dict()
+
+        encode_started = time.perf_counter()
+        try:
+            payload = encode(output)
+        except Exception as e:
+            output = build_output(workflow_ids, error=f"Output is not JSON serializable: {str(e)}")
+            payload = encode(output)
+        if 'output' in output and 0 < self.settings.offload_threshold < len(payload):
+            # Large outputs go to a TTL'd key; only a reference is pushed through pub/sub
+            try:
+                output = await offload_output(self.redis, output, self.settings)
+                payload = encode(output)
+            except Exception as e:
+                logger.error(f"Failed to offload output, publishing it inline: {str(e)}")
+        timings.add('encode', time.perf_counter() - encode_started)
+
+        try:
+            with timings.phase('publish'):
+                with span('redis set', **{"messaging.system": "redis"}):
+                    await store_result(self.redis, output, payload, self.settings)
+                with span('redis publish', KIND_PRODUCER, **{
+                    "messaging.system": "redis", "messaging.destination.name": self.settings.channel_out
+                }):
+                    await self.redis.publish(self.settings.channel_out, payload)
+            timings.finish()
+            logger.info(f"Published {output['type']} output to channel: {self.settings.channel_out} ({timings.as_dict()['total_ms']} ms)")
+            # Only acknowledge once the output is out, so a crash before this point redelivers the input
+            if message_id is not None:
+                with span('redis ack', **{"messaging.system": "redis"}):
+                    await self.transport.ack(message_id)
+        except BaseException:
+            # Left pending but no longer kept fresh, so another consumer can reclaim it
+            if message_id is not None:
+                self.transport.release(message_id)
+            raise
+        if cache_key and cached is None and output['type'] == 'completed' and self.cache.keeps(result):
+            # Stored after publishing so the cache never adds to the latency of a miss
+            try:
+                await self.cache.set(cache_key, encode(self.cache.storable(result)))
+            except Exception as e:
+                logger.warning(f"Failed to cache result: {str(e)}")
+        root.attributes['extension.output_type'] = output['type']
+        root.finish(error=output.get('error'))
+        await self.metrics.record(self.redis, timings, output['type'])
+        await self.tracer.export(root)
+
+    async def submit(self, message_id, message, wait=0.0):
+        timings = Timings(wait)
+        # Waiting for a free slot before reading the next message gives us backpressure
+        with timings.phase('queue'):
+            await self.semaphore.acquire()
+        task = asyncio.create_task(self.handle(message_id, message, timings))
+        self.tasks.add(task)
+        task.add_done_callback(self._release)
+
+    def _release(self, task):
+        self.tasks.discard(task)
+        self.semaphore.release()
+        if not task.cancelled() and task.exception() is not None:
+            error = task.exception()
+            logger.error(f"Failed to complete message: {str(error)}", exc_info=error)
+
+    async def drain(self):
+        if self.tasks:
+            await asyncio.gather(*self.tasks, return_exceptions=True)
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+
+async def consume(dispatcher, transport, persistent):
+    waiting = time.perf_counter()
+    async for message_id, message in transport.messages():
+        await dispatcher.submit(message_id, message, wait=time.perf_counter() - waiting)
+        if not persistent:
+            break
+        waiting = time.perf_counter()
+
+async def serve(handler, failed_when=None, batch_handler=None, preload=(), warmup=None, debug_fields=(),
+                cacheable=None, settings=None):
+    settings = settings or Settings.from_env()
+    redis = connect_to_redis(settings)
+    transport = create_transport(redis, settings)
+    # Before the zygote forks, so its workers inherit them (and connect on first use)
+    ratelimit.install(settings, redis)
+    llm.install(settings)
+    # Created first: in fork mode this forks the zygote while the process is still single-threaded
+    dispatcher = Dispatcher(
+        handler, redis, transport, settings,
+        failed_when=failed_when, batch_handler=batch_handler, preload=preload, warmup=warmup,
+        debug_fields=debug_fields, cacheable=cacheable
+    )
+
+    await dispatcher.metrics.start()
+    install_log_context()
+    logs.start()
+    # Start listening before announcing readiness so the engine cannot publish into the void
+    started = time.perf_counter()
+    await transport.start()
+    dispatcher.metrics.startup['redis_connect'] = time.perf_counter() - started
+    await redis.publish(settings.channel_ready, '')
+    dispatcher.metrics.startup['ready'] = elapsed_ms() / 1000
+    logger.info(f"Published READY {elapsed_ms()} ms after startup")
+    if isinstance(dispatcher.executor, ZygoteExecutor):
+        # The zygote preloads for its workers; the runtime itself never runs the handler
+        preload, warmup = (), None
+    preload_task = asyncio.create_task(preload_modules(preload, warmup))
+
+    try:
+        await consume(dispatcher, transport, settings.persistent)
+    finally:
+        preload_task.cancel()
+        await dispatcher.drain()
+        await dispatcher.metrics.close()
+        await transport.close()
+        await redis.close()
+
+def run(handler, failed_when=None, batch_handler=None, preload=(), warmup=None, debug_fields=(), cacheable=None):
+    """Entry point used by every extension's main.py.
+
+    `handler` is the extension's process_message and may be either a coroutine
+    function or a plain function; plain functions run on a thread or process pool.
+    `failed_when` lets extensions that report errors inside their result (rather
+    than by raising) mark the output envelope as failed. `batch_handler` optionally
+    processes all items of a batch envelope together; it receives the per-item
+    messages and returns the results (or exceptions) in the same order.
+    `preload` lists heavy modules the handler imports lazily; they are imported in
+    the background once READY has been published. `warmup` is then called once,
+    e.g. to build throwaway clients so their classes are fully initialized; with
+    EXTENSION_EXECUTOR=fork both happen in the zygote before any worker is forked.
+    `debug_fields` names result keys that are only published when the input sets
+    `"debug": true` (or EXTENSION_INCLUDE_DEBUG=true). `cacheable` is a Cacheable
+    declaring that identical inputs may be answered from the result cache when
+    EXTENSION_CACHE=true; extensions with side effects leave it unset.
+
+    When the extension is loaded by the multi-extension host, the arguments are
+    recorded in the host's registry instead.
+    """
+    if registry.collecting is not None:
+        registry.collecting.append(dict(
+            handler=handler, failed_when=failed_when, batch_handler=batch_handler,
+            preload=preload, warmup=warmup, debug_fields=debug_fields, cacheable=cacheable
+        ))
+        return
+    settings = Settings.from_env()
+    # Replaces the logging an extension set up on import with the runtime's non-blocking writer
+    logs.install(settings)
+    try:
+        asyncio.run(serve(
+            handler, failed_when=failed_when, batch_handler=batch_handler,
+            preload=preload, warmup=warmup, debug_fields=debug_fields, cacheable=cacheable, settings=settings
+        ))
+    finally:
+        logs.stop()
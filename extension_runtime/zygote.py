@@ -0,0 +1,221 @@
+import os
+import gc
+import sys
+import pickle
+import random
+import signal
+import logging
+import itertools
+import threading
+import selectors
+import multiprocessing
+from concurrent.futures import Executor, Future
+
+from . import logs
+from .deadline import current_deadline
+from .startup import import_modules
+
+logger = logging.getLogger(__name__)
+
+def run_worker(function, args, deadline, log_context, writer):
+    # CLOCK_MONOTONIC is system-wide, so the runtime's deadline holds in the worker too
+    current_deadline.set(deadline)
+    try:
+        with logs.message_context(context=log_context):
+            outcome = (True, function(*args))
+    except BaseException as e:
+        outcome = (False, e)
+    try:
+        payload = pickle.dumps(outcome)
+    except Exception as e:
+        # Results and exceptions cross a process boundary, so they must be picklable
+        payload = pickle.dumps((False, RuntimeError(f"Worker result could not be pickled: {str(e)}")))
+    writer.send_bytes(payload)
+
+def fork_worker(function, args, deadline, log_context, requests, results, selector):
+    reader, writer = multiprocessing.Pipe(duplex=False)
+    pid = os.fork()
+    if pid == 0:
+        exit_code = 0
+        try:
+            # The worker only talks through its own pipe; holding on to the others would
+            # keep them open after the zygote or the runtime is gone
+            requests.close()
+            results.close()
+            reader.close()
+            for key in list(selector.get_map().values()):
+                if key.fileobj is not requests:
+                    key.fileobj.close()
+            random.seed()
+            run_worker(function, args, deadline, log_context, writer)
+        except BaseException:
+            exit_code = 1
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit(exit_code)
+    writer.close()
+    return pid, reader
+
+def collect_worker(request_id, pid, reader, results):
+    try:
+        payload = reader.recv_bytes()
+    except EOFError:
+        payload = None
+    reader.close()
+    _, status = os.waitpid(pid, 0)
+    if payload is None:
+        exit_code = os.waitstatus_to_exitcode(status)
+        payload = pickle.dumps((False, RuntimeError(f"Worker process {pid} exited with code {exit_code} without a result")))
+    results.send((request_id, payload))
+
+def kill_worker(request_id, selector):
+    for key in selector.get_map().values():
+        if key.data is not None and key.data[0] == request_id:
+            # Its pipe then reports EOF and collect_worker fails the request with the exit code
+            try:
+                os.kill(key.data[1], signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+
+def serve_zygote(functions, requests, results, preload, warmup):
+    """Main loop of the zygote: preload once, then fork one worker per request.
+
+    The zygote is single-threaded so forking it is safe, and every worker starts
+    from the same warmed-up, frozen heap. It exits once the runtime closes the
+    request pipe and the remaining workers are done.
+    """
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.set_wakeup_fd(-1)
+    try:
+        import_modules(preload)
+        if warmup is not None:
+            warmup()
+        logger.info(f"Zygote {os.getpid()} ready")
+    except Exception as e:
+        logger.warning(f"Zygote preload failed: {str(e)}")
+    # Keep the garbage collector from writing to (and so copying) the inherited pages
+    gc.freeze()
+
+    selector = selectors.DefaultSelector()
+    selector.register(requests, selectors.EVENT_READ)
+    while selector.get_map():
+        for key, _ in selector.select():
+            if key.fileobj is requests:
+                try:
+                    request = requests.recv()
+                except EOFError:
+                    selector.unregister(requests)
+                    continue
+                if request[0] == 'kill':
+                    kill_worker(request[1], selector)
+                    continue
+                request_id, function_id, function, args, deadline, log_context = request
+                pid, reader = fork_worker(
+                    functions.get(function_id, function), args, deadline, log_context, requests, results, selector
+                )
+                selector.register(reader, selectors.EVENT_READ, (request_id, pid))
+            else:
+                selector.unregister(key.fileobj)
+                collect_worker(*key.data, key.fileobj, results)
+
+class ZygoteExecutor(Executor):
+    """Runs each call in a fresh process forked from a preloaded zygote.
+
+    The zygote is forked from the runtime before the event loop starts other
+    threads. It imports `preload`, runs `warmup` and then forks a copy-on-write
+    worker per call, so every call is isolated (a crash only fails that message)
+    while sharing the already imported libraries.
+    """
+
+    def __init__(self, functions, preload=(), warmup=None):
+        self.function_ids = {function: index for index, function in enumerate(functions)}
+        request_reader, self.requests = multiprocessing.Pipe(duplex=False)
+        self.results, result_writer = multiprocessing.Pipe(duplex=False)
+        self.pid = os.fork()
+        if self.pid == 0:
+            exit_code = 0
+            try:
+                self.requests.close()
+                self.results.close()
+                serve_zygote(dict(enumerate(functions)), request_reader, result_writer, preload, warmup)
+            except BaseException:
+                logger.error("Zygote failed", exc_info=True)
+                exit_code = 1
+            finally:
+                sys.stdout.flush()
+                sys.stderr.flush()
+                os._exit(exit_code)
+        request_reader.close()
+        result_writer.close()
+
+        self.futures = {}
+        self.lock = threading.Lock()
+        self.ids = itertools.count()
+        self.reader = threading.Thread(target=self.read_results, name='zygote-results', daemon=True)
+        self.reader.start()
+        logger.info(f"Started zygote process {self.pid}")
+
+    def submit(self, fn, /, *args, **kwargs):
+        if kwargs:
+            raise TypeError("ZygoteExecutor does not support keyword arguments")
+        future = Future()
+        # The call starts right away in the zygote, so it can no longer be cancelled
+        future.set_running_or_notify_cancel()
+        with self.lock:
+            request_id = next(self.ids)
+            self.futures[request_id] = future
+            function_id = self.function_ids.get(fn)
+            # Registered functions are already in the zygote's memory; others go by reference
+            try:
+                self.requests.send((
+                    request_id, function_id, None if function_id is not None else fn, args,
+                    current_deadline.get(), logs.capture()
+                ))
+            except (OSError, ValueError) as e:
+                self.futures.pop(request_id)
+                raise RuntimeError(f"Zygote process {self.pid} is not running: {str(e)}")
+        return future
+
+    def kill(self, future):
+        """Kills the worker running `future`, e.g. once the message's deadline has passed."""
+        with self.lock:
+            request_id = next((key for key, value in self.futures.items() if value is future), None)
+            if request_id is None:
+                return
+            try:
+                self.requests.send(('kill', request_id))
+            except (OSError, ValueError):
+                pass
+
+    def read_results(self):
+        while True:
+            try:
+                request_id, payload = self.results.recv()
+            except (EOFError, OSError):
+                break
+            with self.lock:
+                future = self.futures.pop(request_id, None)
+            if future is None:
+                continue
+            try:
+                succeeded, value = pickle.loads(payload)
+            except Exception as e:
+                succeeded, value = False, RuntimeError(f"Worker result could not be unpickled: {str(e)}")
+            if succeeded:
+                future.set_result(value)
+            else:
+                future.set_exception(value)
+
+        with self.lock:
+            pending, self.futures = self.futures, {}
+        for future in pending.values():
+            future.set_exception(RuntimeError(f"Zygote process {self.pid} exited"))
+
+    def shutdown(self, wait=True, *, cancel_futures=False):
+        # Closing the request pipe tells the zygote to exit once its workers are done
+        with self.lock:
+            self.requests.close()
+        if wait:
+            os.waitpid(self.pid, 0)
+            self.reader.join()
@@ -0,0 +1,33 @@
+import os
+import runpy
+
+import pytest
+
+# Settings.from_env() needs the variables the workflow engine provides
+for name, value in {
+    'REDIS_HOST_URL': 'localhost',
+    'REDIS_CHANNEL_IN': 'test-in',
+    'REDIS_CHANNEL_OUT': 'test-out',
+    'REDIS_CHANNEL_READY': 'test-ready',
+    'WORKFLOW_INSTANCE_ID': 'test-instance',
+    'WORKFLOW_EXTENSION_ID': 'test-extension'
+}.items():
+    os.environ.setdefault(name, value)
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def load_main(extension):
+    """The globals of an extension's main.py, run as a module so it does not start serving."""
+    return runpy.run_path(os.path.join(REPO_ROOT, extension, 'main.py'), run_name=f"{extension}.main")
+
+@pytest.fixture
+def settings():
+    from extension_runtime.config import Settings
+
+    return Settings.from_env()
+
+@pytest.fixture
+def redis():
+    import fakeredis
+
+    return fakeredis.FakeAsyncRedis()
@@ -0,0 +1,38 @@
+import json
+
+from extension_runtime.batch import build_batch_output, split_batch
+from extension_runtime.codec import decode_envelope, decode_inputs
+
+def test_single_envelope_is_not_a_batch():
+    assert split_batch(decode_envelope('{"inputs": {"a": 1}}')) is None
+
+def test_splits_batch_into_item_messages_with_the_workflow_ids():
+    envelope = decode_envelope(json.dumps({
+        "inputs": [{"a": 1}, {"a": 2}], "workflowInstanceId": "instance", "workflowExtensionId": "extension"
+    }))
+
+    messages = split_batch(envelope)
+
+    assert [decode_inputs(message) for message in messages] == [{"a": 1}, {"a": 2}]
+    # Handlers that parse the raw message themselves see a regular envelope
+    raw = json.loads(messages[1])
+    assert raw["inputs"] == {"a": 2}
+    assert raw["workflowInstanceId"] == "instance"
+    assert raw["workflowExtensionId"] == "extension"
+
+def test_batch_output_reports_each_item_and_the_counts():
+    output = build_batch_output(
+        [{"status": "success"}, ValueError("bad input"), {"status": "error"}],
+        failed_when=lambda result: result["status"] != "success"
+    )
+
+    assert output == {
+        "results": [
+            {"type": "completed", "output": {"status": "success"}},
+            {"type": "failed", "error": "bad input"},
+            {"type": "failed", "output": {"status": "error"}}
+        ],
+        "total": 3,
+        "succeeded": 1,
+        "failed": 2
+    }
@@ -0,0 +1,61 @@
+import asyncio
+import dataclasses
+
+from extension_runtime.cache import Cacheable, ResultCache
+
+def result_cache(settings, **options):
+    return ResultCache(None, settings, Cacheable('claude-api', secret_inputs=['apiKey'], **options))
+
+def test_key_ignores_input_order(settings):
+    cache = result_cache(settings)
+
+    assert cache.key({"prompt": "hi", "maxTokens": 10}) == cache.key({"maxTokens": 10, "prompt": "hi"})
+    assert cache.key({"prompt": "hi"}) != cache.key({"prompt": "hello"})
+    assert cache.key({"prompt": "hi"}).startswith("extension:cache:claude-api:")
+
+def test_key_depends_on_the_version(settings):
+    first = ResultCache(None, settings, Cacheable('claude-api'))
+    second = ResultCache(None, settings, Cacheable('claude-api', version='2'))
+
+    assert first.key({"prompt": "hi"}) != second.key({"prompt": "hi"})
+
+def test_key_is_scoped_to_the_secret_without_containing_it(settings):
+    cache = result_cache(settings)
+
+    key = cache.key({"prompt": "hi", "apiKey": "secret-one"})
+
+    assert 'secret-one' not in key
+    assert key != cache.key({"prompt": "hi", "apiKey": "secret-two"})
+
+def test_key_can_be_shared_across_secrets(settings):
+    cache = result_cache(dataclasses.replace(settings, cache_share_across_keys=True))
+
+    assert cache.key({"prompt": "hi", "apiKey": "secret-one"}) == cache.key({"prompt": "hi", "apiKey": "secret-two"})
+    assert cache.key({"prompt": "hi", "apiKey": "secret-one"}) == cache.key({"prompt": "hi"})
+
+def test_bypass_input(settings):
+    cache = result_cache(settings, bypass_input='bypassCache')
+
+    assert cache.bypassed({"bypassCache": True})
+    assert cache.bypassed({"bypassCache": "true"})
+    assert not cache.bypassed({"bypassCache": False})
+    assert not cache.bypassed({})
+    assert not result_cache(settings).bypassed({"bypassCache": True})
+
+def test_volatile_outputs_are_not_stored(settings):
+    cache = result_cache(settings, volatile_outputs=['latency_ms'])
+
+    stored = cache.storable({"text": "hi", "latency_ms": 120, "results": [{"text": "a", "latency_ms": 80}, "b"]})
+
+    assert stored == {"text": "hi", "results": [{"text": "a"}, "b"]}
+
+def test_evicts_the_oldest_entries_over_the_byte_budget(settings, redis):
+    cache = ResultCache(redis, dataclasses.replace(settings, cache_max_bytes=250), Cacheable('claude-api'))
+
+    async def scenario():
+        keys = [cache.key({"prompt": str(number)}) for number in range(3)]
+        for key in keys:
+            await cache.set(key, b'x' * 100)
+        return [await cache.get(key) for key in keys]
+
+    assert asyncio.run(scenario()) == [None, b'x' * 100, b'x' * 100]
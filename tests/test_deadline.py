@@ -0,0 +1,53 @@
+import time
+import asyncio
+
+import pytest
+
+from extension_runtime.deadline import DeadlineExceeded, current_deadline, remaining, until_deadline
+
+def test_returns_the_result_before_the_deadline():
+    async def answer():
+        await asyncio.sleep(0.01)
+        return 42
+
+    assert asyncio.run(until_deadline(answer(), time.monotonic() + 1)) == 42
+    assert asyncio.run(until_deadline(answer(), None)) == 42
+
+def test_cancels_the_awaitable_at_the_deadline():
+    cancelled = []
+
+    async def slow():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(until_deadline(slow(), time.monotonic() + 0.05))
+    assert cancelled == [True]
+
+def test_passed_deadline_fails_at_once():
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(until_deadline(asyncio.sleep(10), time.monotonic() - 1))
+
+def test_handler_timeouts_are_not_mistaken_for_the_deadline():
+    async def timing_out():
+        raise asyncio.TimeoutError()
+
+    with pytest.raises(asyncio.TimeoutError) as raised:
+        asyncio.run(until_deadline(timing_out(), time.monotonic() + 10))
+    assert not isinstance(raised.value, DeadlineExceeded)
+
+def test_remaining_is_bounded_by_the_deadline():
+    async def scenario():
+        assert remaining(30) == 30
+        assert remaining() is None
+        current_deadline.set(time.monotonic() + 5)
+        assert 4 < remaining(30) <= 5
+        assert remaining(1) == 1
+        current_deadline.set(time.monotonic() - 1)
+        # Never 0, which some clients read as no timeout
+        assert remaining(30) == 0.001
+
+    asyncio.run(scenario())
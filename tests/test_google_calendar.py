@@ -0,0 +1,38 @@
+import json
+from types import SimpleNamespace
+
+import googleapiclient.discovery
+
+from conftest import load_main
+
+INPUTS = {
+    "summary": "Sync", "start_time": "2024-01-01T10:00:00Z", "end_time": "2024-01-01T11:00:00Z",
+    "auth_token": "token"
+}
+
+def fake_build(calls):
+    def build(service, version, **kwargs):
+        calls.append(kwargs)
+        insert = lambda calendarId, body: SimpleNamespace(execute=lambda: {"id": "event-1", **body})
+        return SimpleNamespace(events=lambda: SimpleNamespace(insert=insert))
+    return build
+
+def test_creates_event_with_api_key(monkeypatch):
+    calls = []
+    monkeypatch.setattr(googleapiclient.discovery, 'build', fake_build(calls))
+    main = load_main('GoogleCalendar-CreateEvent')
+
+    result = main['process_message'](json.dumps({"inputs": INPUTS}))
+
+    assert result == {'status': 'success', 'event_id': 'event-1'}
+    assert calls == [{'developerKey': 'token'}]
+
+def test_creates_event_with_oauth_token(monkeypatch):
+    calls = []
+    monkeypatch.setattr(googleapiclient.discovery, 'build', fake_build(calls))
+    main = load_main('GoogleCalendar-CreateEvent')
+
+    result = main['process_message'](json.dumps({"inputs": {**INPUTS, "is_oauth": "true"}}))
+
+    assert result['status'] == 'success'
+    assert calls[0]['credentials'].token == 'token'
@@ -0,0 +1,50 @@
+import asyncio
+import dataclasses
+
+import pytest
+
+from extension_runtime.offload import load_output, offload_output, strip_debug
+
+OUTPUT = {
+    "type": "completed", "workflowInstanceId": "instance", "workflowExtensionId": "extension",
+    "output": {"listings": [{"address": f"{number} Main St", "price": number * 1000} for number in range(2000)]}
+}
+
+def test_round_trips_through_redis(settings, redis):
+    async def scenario():
+        offloaded = await offload_output(redis, OUTPUT, settings)
+        return offloaded, await load_output(redis, offloaded["outputRef"])
+
+    offloaded, output = asyncio.run(scenario())
+
+    assert 'output' not in offloaded
+    assert offloaded["workflowInstanceId"] == "instance"
+    reference = offloaded["outputRef"]
+    assert reference["key"].startswith(f"{settings.channel_out}:output:instance:")
+    assert reference["compressedSize"] < reference["size"]
+    assert reference["ttl"] == max(settings.offload_ttl, settings.result_ttl)
+    assert output == OUTPUT["output"]
+
+def test_round_trips_through_a_file(settings, redis, tmp_path):
+    settings = dataclasses.replace(settings, offload_store='file', offload_dir=str(tmp_path))
+
+    async def scenario():
+        offloaded = await offload_output(redis, OUTPUT, settings)
+        return offloaded, await load_output(redis, offloaded["outputRef"])
+
+    offloaded, output = asyncio.run(scenario())
+
+    assert offloaded["outputRef"]["path"].startswith(str(tmp_path))
+    assert output == OUTPUT["output"]
+
+def test_expired_output_cannot_be_loaded(redis):
+    reference = {"store": "redis", "key": "test-out:output:gone", "encoding": "zlib"}
+    with pytest.raises(KeyError):
+        asyncio.run(load_output(redis, reference))
+
+def test_debug_fields_are_dropped_unless_asked_for():
+    result = {"answer": 42, "trace": "..."}
+
+    assert strip_debug(result, {"trace"}, {}, False) == {"answer": 42}
+    assert strip_debug(result, {"trace"}, {"debug": "true"}, False) == result
+    assert strip_debug(result, {"trace"}, {"debug": False}, True) == {"answer": 42}
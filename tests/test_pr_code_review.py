@@ -0,0 +1,70 @@
+import pytest
+
+from conftest import load_main
+
+@pytest.fixture(scope='module')
+def main():
+    return load_main('PR-CodeReview')
+
+def file_diff(name, hunks, lines_per_hunk=20, width=60):
+    header = f"diff --git a/{name} b/{name}\nindex 0000000..1111111 100644\n--- a/{name}\n+++ b/{name}\n"
+    body = ''.join(
+        f"@@ -{hunk * 100},{lines_per_hunk} +{hunk * 100},{lines_per_hunk} @@\n"
+        + ''.join(f"+{name} hunk {hunk} line {line} ".ljust(width, 'x') + "\n" for line in range(lines_per_hunk))
+        for hunk in range(hunks)
+    )
+    return header + body
+
+def test_small_diff_is_one_chunk(main):
+    diff = file_diff('a.py', 2) + file_diff('b.py', 1)
+
+    assert main['split_diff'](diff, 6000) == [(['a.py', 'b.py'], diff)]
+
+def test_small_files_are_grouped_and_chunks_stay_within_budget(main):
+    diff = ''.join(file_diff(f"file{number}.py", 2) for number in range(20))
+    budget = 2000
+
+    chunks = main['split_diff'](diff, budget)
+
+    assert len(chunks) > 1
+    assert all(len(text) <= budget * main['CHARS_PER_TOKEN'] for _, text in chunks)
+    assert ''.join(text for _, text in chunks) == diff
+    # Files are never split when they fit, so each one is in exactly one chunk
+    assert [name for files, _ in chunks for name in files] == [f"file{number}.py" for number in range(20)]
+    assert any(len(files) > 1 for files, _ in chunks)
+
+def test_large_file_is_split_between_hunks_with_its_header(main):
+    section = file_diff('big.py', 10)
+    header = section[:section.index('@@ ')]
+    budget = len(section) // 3
+
+    pieces = main['split_file'](section, budget)
+
+    assert len(pieces) > 1
+    assert all(piece.startswith(header) and piece[len(header):].startswith('@@ ') for piece in pieces)
+    assert all(len(piece) <= budget for piece in pieces)
+    assert ''.join(piece[len(header):] for piece in pieces) == section[len(header):]
+
+def test_oversized_hunk_is_split_between_lines(main):
+    section = file_diff('huge.py', 1, lines_per_hunk=200)
+    header = section[:section.index('@@ ')]
+
+    pieces = main['split_file'](section, 2000)
+
+    assert len(pieces) > 1
+    assert all(piece.startswith(header) and piece.endswith('\n') for piece in pieces)
+    assert ''.join(piece[len(header):] for piece in pieces) == section[len(header):]
+
+def test_file_that_fits_is_kept_whole(main):
+    section = file_diff('a.py', 3)
+
+    assert main['split_file'](section, len(section)) == [section]
+
+def test_large_file_is_reported_under_its_name_in_every_chunk(main):
+    diff = file_diff('small.py', 1) + file_diff('big.py', 30)
+
+    chunks = main['split_diff'](diff, 1000)
+
+    assert chunks[0][0][0] == 'small.py'
+    assert len(chunks) > 2
+    assert all(files == ['big.py'] for files, _ in chunks[1:])
@@ -0,0 +1,84 @@
+import asyncio
+import dataclasses
+
+from extension_runtime.ratelimit import RateLimiter, parse_headers
+
+def acquire(limiter, tokens=0):
+    return limiter.async_script(keys=['bucket'], args=limiter.args(['acquire', tokens, '', '', '', '', '']))
+
+def update(limiter, rpm_limit='', rpm='', tpm_limit='', tpm='', retry_after_ms='', correction=''):
+    return limiter.async_script(
+        keys=['bucket'], args=limiter.args(['update', rpm_limit, rpm, tpm_limit, tpm, retry_after_ms, correction])
+    )
+
+def test_unknown_limits_are_not_enforced(settings, redis):
+    limiter = RateLimiter(settings, redis)
+
+    async def scenario():
+        return [await acquire(limiter, 100000) for _ in range(50)]
+
+    assert set(asyncio.run(scenario())) == {0}
+
+def test_waits_for_the_request_bucket(settings, redis):
+    limiter = RateLimiter(dataclasses.replace(settings, rate_limit_rpm=2), redis)
+
+    async def scenario():
+        return [await acquire(limiter) for _ in range(3)]
+
+    first, second, third = asyncio.run(scenario())
+    assert (first, second) == (0, 0)
+    # One request refills in 60000 / 2 ms
+    assert 29000 < third <= 30000
+
+def test_waits_for_the_token_bucket(settings, redis):
+    limiter = RateLimiter(dataclasses.replace(settings, rate_limit_tpm=1000), redis)
+
+    async def scenario():
+        return await acquire(limiter, 800), await acquire(limiter, 400), await acquire(limiter, 5000)
+
+    first, second, oversized = asyncio.run(scenario())
+    assert first == 0
+    # 200 tokens are left, 200 more refill in 12 s
+    assert 11000 < second <= 12000
+    # A request larger than the bucket only waits for a full one
+    assert 47000 < oversized <= 48000
+
+def test_learns_limits_and_retry_after_from_the_provider(settings, redis):
+    limiter = RateLimiter(settings, redis)
+
+    async def scenario():
+        await update(limiter, rpm_limit=100, rpm=0, tpm_limit=10000, tpm=10000)
+        exhausted = await acquire(limiter)
+        await update(limiter, rpm=100, retry_after_ms=5000)
+        blocked = await acquire(limiter)
+        return exhausted, blocked
+
+    exhausted, blocked = asyncio.run(scenario())
+    assert 0 < exhausted <= 600
+    assert 4900 < blocked <= 5000
+
+def test_limit_async_feeds_reported_headers_back(settings, redis):
+    limiter = RateLimiter(settings, redis)
+    headers = {
+        'anthropic-ratelimit-requests-limit': '50', 'anthropic-ratelimit-requests-remaining': '0',
+        'anthropic-ratelimit-tokens-limit': '40000', 'anthropic-ratelimit-tokens-remaining': '39000'
+    }
+
+    async def scenario():
+        async with limiter.limit_async('key', 'claude-3-5-sonnet-20240620', tokens=100) as lease:
+            lease.record(headers, used_tokens=120)
+        return await redis.hgetall(limiter.key('key', 'claude-3-5-sonnet-20240620'))
+
+    state = asyncio.run(scenario())
+    assert float(state[b'rpm_limit']) == 50
+    assert float(state[b'tpm_limit']) == 40000
+    assert float(state[b'rpm']) < 1
+
+def test_parses_provider_headers():
+    assert parse_headers({
+        'x-ratelimit-limit-requests': '10000', 'x-ratelimit-remaining-requests': '9999',
+        'x-ratelimit-limit-tokens': '2000000', 'x-ratelimit-remaining-tokens': '1999000', 'retry-after': '1.5'
+    }) == {
+        'rpm_limit': 10000, 'rpm_remaining': 9999, 'tpm_limit': 2000000, 'tpm_remaining': 1999000, 'retry_after_ms': 1500
+    }
+    assert parse_headers({'retry-after': 'Wed, 21 Oct 2015 07:28:00 GMT'}) == {}
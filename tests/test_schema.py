@@ -0,0 +1,64 @@
+import pytest
+
+from extension_runtime.schema import InvalidInputs, compile_inputs, load_definition
+
+DEFINITIONS = [
+    {"id": "video_id", "type": "string", "required": True},
+    {"key": "max_comments", "type": "number", "required": False},
+    {"key": "is_oauth", "type": "boolean", "required": False},
+    {"key": "tags", "type": "array", "required": False}
+]
+
+def test_coerces_values_to_their_declared_types():
+    validate = compile_inputs(DEFINITIONS)
+
+    assert validate({"video_id": 42, "max_comments": "25", "is_oauth": "TRUE", "tags": ["a"]}) == {
+        "video_id": "42", "max_comments": 25, "is_oauth": True, "tags": ["a"]
+    }
+    assert validate({"video_id": "v", "max_comments": "2.5"})["max_comments"] == 2.5
+
+def test_removes_null_optional_inputs_and_passes_unknown_ones_through():
+    validate = compile_inputs(DEFINITIONS)
+
+    assert validate({"video_id": "v", "max_comments": None, "extra": 1}) == {"video_id": "v", "extra": 1}
+
+def test_reports_every_problem():
+    validate = compile_inputs(DEFINITIONS)
+
+    with pytest.raises(InvalidInputs) as raised:
+        validate({"video_id": "", "max_comments": "many", "is_oauth": "yes", "tags": "a"})
+
+    assert raised.value.errors == {
+        "video_id": "is required",
+        "max_comments": "must be a number",
+        "is_oauth": "must be true or false",
+        "tags": "must be an array"
+    }
+    assert str(raised.value).startswith("Invalid inputs: 'video_id' is required; ")
+
+def test_rejects_inputs_that_are_not_an_object():
+    with pytest.raises(InvalidInputs) as raised:
+        compile_inputs(DEFINITIONS)(["video_id"])
+    assert raised.value.errors == {"inputs": "must be an object"}
+
+def test_rejects_non_finite_numbers_and_booleans_as_numbers():
+    validate = compile_inputs(DEFINITIONS)
+
+    for value in ("nan", "inf", True):
+        with pytest.raises(InvalidInputs):
+            validate({"video_id": "v", "max_comments": value})
+
+def test_reads_the_inputs_of_the_first_definition_block(tmp_path):
+    readme = tmp_path / "README.md"
+    readme.write_text(
+        "# Example\n\n```yaml\nname: not a definition\n```\n\n"
+        "```yaml\nconfiguration:\n  inputs:\n    - key: prompt\n      type: string\n      required: true\n```\n"
+    )
+
+    assert load_definition(str(readme)) == [{"key": "prompt", "type": "string", "required": True}]
+
+def test_readme_without_yaml_has_no_definition(tmp_path):
+    readme = tmp_path / "README.md"
+    readme.write_text("# Example\n\nNo definition here.\n")
+
+    assert load_definition(str(readme)) is None
@@ -0,0 +1,89 @@
+import asyncio
+import dataclasses
+
+import pytest
+
+from extension_runtime.transport import StreamTransport
+
+def stream_settings(settings, **overrides):
+    return dataclasses.replace(settings, transport='streams', **overrides)
+
+async def read_one(transport):
+    async for entry in transport.messages():
+        return entry
+
+def test_reclaims_entry_left_pending_by_another_consumer(settings, redis):
+    async def scenario():
+        crashed = StreamTransport(redis, stream_settings(settings, stream_consumer='crashed', stream_claim_idle_ms=0))
+        survivor = StreamTransport(redis, stream_settings(settings, stream_consumer='survivor', stream_claim_idle_ms=0))
+        await crashed.start()
+        await survivor.start()
+        entry_id = await redis.xadd(settings.channel_in, {'data': '{"inputs": {}}'})
+        await read_one(crashed)
+
+        message_id, data = await read_one(survivor)
+
+        assert (message_id, data) == (entry_id, b'{"inputs": {}}')
+        assert survivor.in_flight == {entry_id}
+        pending = await redis.xpending_range(settings.channel_in, settings.stream_group, min='-', max='+', count=10)
+        assert [entry['consumer'] for entry in pending] == [b'survivor']
+        await crashed.close()
+        await survivor.close()
+
+    asyncio.run(scenario())
+
+def test_moves_entry_to_dead_letter_stream_after_max_deliveries(settings, redis):
+    async def scenario():
+        overrides = dict(stream_claim_idle_ms=0, stream_max_deliveries=1)
+        crashed = StreamTransport(redis, stream_settings(settings, stream_consumer='crashed', **overrides))
+        survivor = StreamTransport(redis, stream_settings(settings, stream_consumer='survivor', **overrides))
+        await crashed.start()
+        await survivor.start()
+        await redis.xadd(settings.channel_in, {'data': 'poison'})
+        await read_one(crashed)
+
+        # The second delivery is one too many
+        assert await survivor.reclaim() is None
+
+        dead = await redis.xrange(f"{settings.channel_in}:dead")
+        assert [fields for _, fields in dead] == [{b'data': b'poison'}]
+        assert (await redis.xpending(settings.channel_in, settings.stream_group))['pending'] == 0
+        await crashed.close()
+        await survivor.close()
+
+    asyncio.run(scenario())
+
+def test_heartbeat_keeps_entries_in_flight_fresh(settings, redis):
+    async def scenario():
+        transport = StreamTransport(redis, stream_settings(settings, stream_claim_idle_ms=300))
+        await transport.start()
+        await redis.xadd(settings.channel_in, {'data': '{}'})
+        message_id, _ = await read_one(transport)
+
+        await asyncio.sleep(0.5)
+        pending = await redis.xpending_range(settings.channel_in, settings.stream_group, min='-', max='+', count=1)
+        assert pending[0]['time_since_delivered'] < 300
+
+        # Released entries are left to go idle, so another consumer can reclaim them
+        transport.release(message_id)
+        await asyncio.sleep(0.5)
+        pending = await redis.xpending_range(settings.channel_in, settings.stream_group, min='-', max='+', count=1)
+        assert pending[0]['time_since_delivered'] >= 300
+        await transport.close()
+
+    asyncio.run(scenario())
+
+def test_ack_forgets_entry_even_when_xack_fails(settings, redis):
+    async def scenario():
+        transport = StreamTransport(redis, stream_settings(settings))
+        transport.in_flight.add(b'1-0')
+
+        async def failing_xack(*args):
+            raise ConnectionError("Redis is gone")
+        redis.xack = failing_xack
+
+        with pytest.raises(ConnectionError):
+            await transport.ack(b'1-0')
+        assert transport.in_flight == set()
+
+    asyncio.run(scenario())
@@ -0,0 +1,75 @@
+import json
+import asyncio
+
+import pytest
+
+from extension_runtime.metrics import Timings
+from extension_runtime.worker import Dispatcher
+
+class RecordingTransport:
+    def __init__(self, events):
+        self.events = events
+
+    async def ack(self, message_id):
+        self.events.append(('ack', message_id))
+
+    def release(self, message_id):
+        self.events.append(('release', message_id))
+
+async def echo(message):
+    return {"echo": message.envelope.inputs}
+
+def dispatcher_for(redis, settings, events, handler=echo):
+    original_publish = redis.publish
+
+    async def publish(channel, payload):
+        events.append(('publish', json.loads(payload)))
+        return await original_publish(channel, payload)
+    redis.publish = publish
+    return Dispatcher(handler, redis, RecordingTransport(events), settings)
+
+def test_acks_after_publishing_the_output(settings, redis):
+    events = []
+
+    async def scenario():
+        dispatcher = dispatcher_for(redis, settings, events)
+        await dispatcher.handle(b'1-0', b'{"inputs": {"text": "hi"}}', Timings())
+
+    asyncio.run(scenario())
+
+    assert [event for event, _ in events] == ['publish', 'ack']
+    assert events[0][1]['type'] == 'completed'
+    assert events[0][1]['output'] == {"echo": {"text": "hi"}}
+    assert events[1][1] == b'1-0'
+
+def test_acks_failed_outputs_too(settings, redis):
+    events = []
+
+    async def failing(message):
+        raise ValueError("bad input")
+
+    async def scenario():
+        dispatcher = dispatcher_for(redis, settings, events, handler=failing)
+        await dispatcher.handle(b'1-0', b'{"inputs": {}}', Timings())
+
+    asyncio.run(scenario())
+
+    assert [event for event, _ in events] == ['publish', 'ack']
+    assert events[0][1]['type'] == 'failed'
+    assert events[0][1]['error'] == 'bad input'
+
+def test_releases_instead_of_acking_when_publishing_fails(settings, redis):
+    events = []
+
+    async def scenario():
+        dispatcher = dispatcher_for(redis, settings, events)
+
+        async def failing_publish(channel, payload):
+            raise ConnectionError("Redis is gone")
+        redis.publish = failing_publish
+        with pytest.raises(ConnectionError):
+            await dispatcher.handle(b'1-0', b'{"inputs": {}}', Timings())
+
+    asyncio.run(scenario())
+
+    assert events == [('release', b'1-0')]